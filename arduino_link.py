@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from collections import deque
+
+import arduino_protocol as protocol
+from drawbars_pos_reader import DrawbarsAsyncReader
+from drawbars_state import DrawbarsState, NUM_DRAWBARS, MIDI_MAX
+
+logger = logging.getLogger(__name__)
+
+# seconds to wait for the Arduino to accept the binary protocol before keeping the text one;
+# opening the port resets the Arduino, whose bootloader runs for up to 2 seconds
+NEGOTIATION_TIMEOUT = 3.0
+# seconds between two binary protocol proposals, so that one reaches the sketch once it runs
+HELLO_INTERVAL = 0.5
+
+
+class ArduinoLink(DrawbarsAsyncReader):
+    """
+    Full-duplex link with the Arduino over its single serial port.
+    Received lines feed the drawbars state; outgoing commands are queued
+    and written through the asyncio transport, honouring its flow control.
+    The binary protocol of arduino_protocol is proposed at connection;
+    the link keeps using the text protocol if the Arduino does not accept it.
+    """
+    def __init__(self, state: DrawbarsState, loop, max_queued=64):
+        """
+        :param state: drawbars model updated with each received line
+        :param loop: event loop the serial transport runs in
+        :param max_queued: outgoing queue bound; the oldest commands are dropped beyond it
+        """
+        super().__init__(state)
+        self.loop = loop
+        self.outgoing = deque(maxlen=max_queued)
+        self.paused = False
+        self.dropped_commands = 0
+        self.binary = False
+        self.negotiating = False
+        self.framing = False  # True once a frame start byte was received while negotiating
+        self.proposal = None  # timer handle of the next binary protocol proposal
+        self.decoder = protocol.FrameDecoder(self.on_frame)
+        self.record = None  # called with every received chunk, e.g. event_trace.TraceRecorder.serial
+        self.on_lost = None  # called with the exception, or None, when the serial link is lost, e.g. to reconnect
+        self.losses = 0
+
+    def connection_made(self, tport):
+        super().connection_made(tport)
+        self._reset_negotiation()
+        self.negotiating = True
+        self._propose(self.loop.time() + NEGOTIATION_TIMEOUT)
+        self._drain()
+
+    def _propose(self, deadline):
+        """
+        Sends the binary protocol proposal until the Arduino answers or the deadline passes.
+        """
+        if not self.negotiating or self.transport is None:
+            return
+        if self.loop.time() >= deadline:
+            self._negotiation_timeout()
+            return
+        self.transport.write(protocol.hello_line())
+        self.proposal = self.loop.call_later(min(HELLO_INTERVAL, deadline - self.loop.time()), self._propose, deadline)
+
+    def _reset_negotiation(self):
+        """
+        Cancels the pending proposal, so that the deadline of a previous connection never ends a new negotiation.
+        """
+        if self.proposal is not None:
+            self.proposal.cancel()
+            self.proposal = None
+        self.binary = self.negotiating = self.framing = False
+        self.decoder.buf.clear()
+
+    def _negotiation_timeout(self):
+        self.negotiating = False
+        if self.framing:
+            # no valid acknowledgement: the start byte was noise, what followed goes back to the text reader
+            self.framing = False
+            pending = bytes(self.decoder.buf).replace(bytes((protocol.FRAME_START,)), b'')
+            self.decoder.buf.clear()
+            super().data_received(pending)
+        logger.info('Arduino did not answer the binary protocol proposal, using the text protocol')
+
+    def data_received(self, data):
+        """
+        Dispatches received bytes to the frame decoder or to the text line reader.
+        While negotiating, a frame start byte (never sent in text mode) announces the acknowledgement:
+        the following bytes go to the frame decoder until it is decoded, even across several reads.
+        """
+        if self.record is not None:
+            self.record(data)
+        if self.binary or self.framing:
+            self.decoder.feed(data)
+            return
+        if self.negotiating:
+            start = data.find(protocol.FRAME_START)
+            if start >= 0:
+                super().data_received(data[:start])
+                self.framing = True
+                self.decoder.feed(data[start:])
+                return
+        super().data_received(data)
+
+    def connection_lost(self, exc):
+        """
+        The serial link is gone, e.g. after a USB glitch or an Arduino reset. The event loop runs the whole
+        panel, so it goes on: commands are queued until on_lost gets a new connection made.
+        """
+        logger.warning('Arduino serial link lost: %r', exc)
+        self.transport = None
+        self.paused = False
+        self._reset_negotiation()
+        # partial line of the lost connection
+        self.buf.clear()
+        self.scan = 0
+        self.resync = False
+        self.losses += 1
+        if self.on_lost is not None:
+            self.on_lost(exc)
+
+    def on_frame(self, frame_type, payload):
+        """
+        Handles a frame decoded from the Arduino.
+        """
+        if frame_type == protocol.DRAWBARS:
+            feed = self.state.feed
+            for i in range(0, len(payload) - 1, 2):
+                drawbar, value = payload[i], payload[i + 1]
+                if drawbar < NUM_DRAWBARS and value <= MIDI_MAX:
+                    feed(drawbar, value)
+        elif frame_type == protocol.HELLO_ACK and self.negotiating:
+            if self.proposal is not None:  # none when a trace is replayed
+                self.proposal.cancel()
+                self.proposal = None
+            self.negotiating = False
+            self.framing = False
+            self.binary = payload[0] == protocol.PROTOCOL_VERSION if len(payload) else False
+            logger.info('Arduino protocol: %s', 'binary' if self.binary else 'text')
+
+    def send_command(self, frame_type, *args):
+        """
+        Queues a command, encoded in the protocol in use when it is written.
+        :param frame_type: arduino_protocol.SYNC, REGISTRATION or LEDS_OFF
+        :param args: command arguments
+        """
+        self.send((frame_type, args))
+
+    def send(self, data):
+        """
+        Queues a command to the Arduino; never blocks and can be called from any thread.
+        :param data: bytes to write, or (frame type, arguments) encoded when written
+        """
+        self.loop.call_soon_threadsafe(self._enqueue, data)
+
+    def _enqueue(self, data):
+        if len(self.outgoing) == self.outgoing.maxlen:
+            self.dropped_commands += 1
+        self.outgoing.append(data)
+        self._drain()
+
+    def _drain(self):
+        while self.outgoing and not self.paused and self.transport is not None:
+            data = self.outgoing.popleft()
+            if isinstance(data, tuple):
+                data = protocol.encode_command(self.binary, data[0], *data[1])
+            self.transport.write(data)
+
+    async def flush(self, timeout=1.0):
+        """
+        Waits until every queued command was handed to the serial port.
+        :param timeout: maximum wait in seconds
+        :return: True if everything was written
+        """
+        deadline = self.loop.time() + timeout
+        while self.outgoing or (self.transport is not None and self.transport.get_write_buffer_size()):
+            if self.loop.time() > deadline:
+                return False
+            await asyncio.sleep(0.005)
+        return True
+
+    def pause_writing(self):
+        logger.debug('serial write buffer full: %d bytes', self.transport.get_write_buffer_size())
+        self.paused = True
+
+    def resume_writing(self):
+        logger.debug('serial write buffer drained: %d bytes', self.transport.get_write_buffer_size())
+        self.paused = False
+        self._drain()
@@ -0,0 +1,136 @@
+"""
+Messages exchanged between the Raspberry PI and the drawbars Arduino.
+
+Text protocol (legacy, always understood by the Arduino firmware):
+    Pi -> Arduino: b'0\\n' sync, b'1\\n' / b'2\\n' registration LED, b'3\\n' all LEDs off
+    Arduino -> Pi: b'<cc> <value>\\n' for each drawbar move
+
+Binary protocol, negotiated at connection:
+    the Pi sends the text line b'V<version>\\n'; an Arduino firmware supporting the binary
+    protocol answers with a HELLO_ACK frame and both sides then only exchange frames:
+
+    START | LENGTH | TYPE | PAYLOAD (LENGTH bytes) | CRC-8 of LENGTH, TYPE and PAYLOAD
+"""
+
+PROTOCOL_VERSION = 1
+
+FRAME_START = 0xA5
+MAX_PAYLOAD = 32
+
+# frame types
+HELLO_ACK = 0x02  # Arduino -> Pi, payload: protocol version
+DRAWBARS = 0x10  # Arduino -> Pi, payload: (drawbar index, MIDI value) pairs
+SYNC = 0x20  # Pi -> Arduino, no payload
+REGISTRATION = 0x21  # Pi -> Arduino, payload: registration number (1 or 2) whose LED is lit
+LEDS_OFF = 0x22  # Pi -> Arduino, no payload
+
+TEXT_COMMANDS = {
+    SYNC: lambda: b'0\n',
+    REGISTRATION: lambda registration: b'%d\n' % registration,
+    LEDS_OFF: lambda: b'3\n',
+}
+
+
+def hello_line():
+    """
+    :return: the text line proposing the binary protocol
+    """
+    return b'V%d\n' % PROTOCOL_VERSION
+
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data, crc=0):
+    """
+    CRC-8 with polynomial x^8 + x^2 + x + 1 (0x07).
+    :param data: bytes-like object
+    :param crc: initial value
+    :return: CRC of data
+    """
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_frame(frame_type, payload=b''):
+    """
+    :param frame_type: one of the frame types
+    :param payload: bytes-like object of at most MAX_PAYLOAD bytes
+    :return: frame bytes
+    """
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError('frame payload too long: %d bytes' % len(payload))
+    body = bytes((len(payload), frame_type)) + bytes(payload)
+    return bytes((FRAME_START,)) + body + bytes((crc8(body),))
+
+
+def encode_command(binary, frame_type, *args):
+    """
+    Encodes a Pi -> Arduino command in the negotiated protocol.
+    :param binary: True for the binary protocol, False for text
+    :param frame_type: SYNC, REGISTRATION or LEDS_OFF
+    :param args: command arguments
+    :return: bytes to write
+    """
+    if binary:
+        return encode_frame(frame_type, bytes(args))
+    return TEXT_COMMANDS[frame_type](*args)
+
+
+class FrameDecoder:
+    """
+    Extracts frames from a byte stream. Bytes preceding a start byte are skipped;
+    a frame with an invalid length or CRC is dropped and decoding resumes at the next start byte.
+    """
+    def __init__(self, on_frame):
+        """
+        :param on_frame: called as on_frame(frame_type, payload) for each valid frame;
+                         payload is a memoryview which is only valid during the call
+        """
+        self.on_frame = on_frame
+        self.buf = bytearray()
+        self.frames = 0
+        self.errors = 0
+
+    def feed(self, data):
+        """
+        :param data: bytes received from the Arduino
+        """
+        buf = self.buf
+        buf += data
+        start = 0
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(FRAME_START, start)
+                if start < 0:
+                    start = len(buf)
+                    break
+                if len(buf) - start < 4:
+                    break
+                length = buf[start + 1]
+                end = start + 4 + length
+                if length > MAX_PAYLOAD:
+                    self.errors += 1
+                    start += 1
+                    continue
+                if len(buf) < end:
+                    break
+                if crc8(view[start + 1:end - 1]) != buf[end - 1]:
+                    self.errors += 1
+                    start += 1
+                    continue
+                self.frames += 1
+                self.on_frame(buf[start + 2], view[start + 3:end - 1])
+                start = end
+        del buf[:start]
@@ -0,0 +1,111 @@
+"""
+Compares the drawbars reader line framing with the former implementation,
+which concatenated immutable bytes and split the whole buffer on each chunk.
+
+    python benchmarks/bench_drawbars_reader.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbars_pos_reader import DrawbarsAsyncReader  # noqa: E402
+from drawbars_state import DrawbarsState  # noqa: E402
+
+
+class LegacyDrawbarsReader:
+    """
+    data_received() as it was before the bytearray framing.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.buf = bytes()
+
+    def data_received(self, data):
+        self.buf += data
+        if b'\n' in self.buf:
+            lines = self.buf.split(b'\n')
+            self.buf = lines[-1]
+            for draw_bar in lines[:-1]:
+                self.state.feed_line(draw_bar)
+
+
+class NullState:
+    """
+    Ignores lines, so that only the framing is measured.
+    """
+    def feed_line(self, line):
+        return False
+
+
+def burst(sweeps):
+    """
+    :return: bytes of all nine drawbars pulled from 0 to 127, sweeps times
+    """
+    lines = []
+    for sweep in range(sweeps):
+        for value in range(128):
+            for drawbar in range(9):
+                lines.append(b'%d %d\n' % (70 + drawbar, value if sweep % 2 == 0 else 127 - value))
+    return b''.join(lines)
+
+
+def noise(length):
+    """
+    :return: bytes without newline, as received when the Arduino baud rate is wrong
+    """
+    return bytes((i * 37 + 11) % 256 for i in range(length)).replace(b'\n', b'?')
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def run(reader_class, state, data_chunks, total_bytes, total_messages):
+    reader = reader_class(state)
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for chunk in data_chunks:
+        reader.data_received(chunk)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    return {
+        'messages_per_s': total_messages / elapsed,
+        'ns_per_byte': 1e9 * elapsed / total_bytes,
+        'cpu_ns_per_byte': 1e9 * cpu / total_bytes,
+    }
+
+
+def bench(sweeps=50, chunk_sizes=(1, 16, 256, 4096), noise_length=0):
+    """
+    :param noise_length: number of garbage bytes received before the drawbar sweeps
+    :return: {chunk size: {implementation: results}}
+    """
+    data = noise(noise_length) + b'\n' + burst(sweeps)
+    messages = data.count(b'\n')
+    results = {}
+    for size in chunk_sizes:
+        data_chunks = chunks(data, size)
+        results[size] = {
+            'legacy': run(LegacyDrawbarsReader, DrawbarsState(), data_chunks, len(data), messages),
+            'current': run(DrawbarsAsyncReader, DrawbarsState(), data_chunks, len(data), messages),
+            'legacy framing': run(LegacyDrawbarsReader, NullState(), data_chunks, len(data), messages),
+            'current framing': run(DrawbarsAsyncReader, NullState(), data_chunks, len(data), messages),
+        }
+    return results
+
+
+def main():
+    for title, results in (('drawbar sweeps', bench()),
+                           ('256 KB of line noise, then drawbar sweeps', bench(sweeps=5, chunk_sizes=(16, 256),
+                                                                              noise_length=256 * 1024))):
+        print(title)
+        for size, implementations in results.items():
+            for name, result in implementations.items():
+                print('  chunk %5d B  %-16s %10.0f msg/s  %7.1f ns/B  %7.1f CPU ns/B' % (
+                    size, name, result['messages_per_s'], result['ns_per_byte'], result['cpu_ns_per_byte']))
+
+
+if __name__ == '__main__':
+    main()
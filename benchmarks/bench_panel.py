@@ -0,0 +1,285 @@
+"""
+Benchmarks of the control panel hot paths, run on simulated devices:
+
+- lcd_println: a full line written with Lcd.set_cursor() and Lcd.println()
+- menu_redraw: Menu.handle_menu() drawing another element on both rows
+- volume_bar: a volume bar update, as drawn for each detent of the volume knob
+- drawbars_reader: DrawbarsAsyncReader.data_received() fed with drawbar sweeps
+- drawbar_filter: drawbar changes reaching the MIDI and LCD consumers for noisy readings, idle and moving
+- state_bus: all the drawbars moved at once, published and received on the loopback multicast state bus,
+  on a private port
+
+I2C transactions and bytes per operation are deterministic and are the figures that matter;
+wall times depend on the computer. Results are compared with a JSON baseline:
+
+    python benchmarks/bench_panel.py                 # compare with benchmarks/baselines.json
+    python benchmarks/bench_panel.py --save          # record the current results as the baseline
+    python benchmarks/bench_panel.py --threshold 0.2
+
+The exit status is 1 if a metric regressed by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_drawbars_reader import burst, chunks  # noqa: E402
+from drawbar_filter import DrawbarFilter  # noqa: E402
+from drawbars_pos_reader import DrawbarsAsyncReader  # noqa: E402
+from drawbars_state import DrawbarsState  # noqa: E402
+from i2c_lcd import Lcd  # noqa: E402
+from lcd_framebuffer import LcdFrameBuffer  # noqa: E402
+from simulation import SimulatedSMBus  # noqa: E402
+import state_bus  # noqa: E402
+from telemetry import LatencyStats  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# metrics for which a higher value is better; lower is better for the others
+HIGHER_IS_BETTER = {'messages_per_s'}
+# metrics only compared with the time threshold, which is looser since they depend on the load of the computer
+TIMING_METRICS = {'us_per_op', 'messages_per_s', 'latency_us_p50'}
+
+
+class SyncWriter:
+    """
+    Runs draw requests immediately, in place of the LcdWriter thread, so that each operation
+    can be measured on its own.
+    """
+    def __init__(self, screen: LcdFrameBuffer):
+        self.screen = screen
+
+    def submit(self, draw, priority=None, key=None, since=None):
+        draw(self.screen)
+        self.screen.flush()
+        return True
+
+
+def measure(bus, operation, ops):
+    """
+    :param bus: SimulatedSMBus the operation writes to
+    :param operation: callable taking the operation index
+    :param ops: number of operations
+    :return: per operation results
+    """
+    bus.reset_counters()
+    start = time.perf_counter()
+    for i in range(ops):
+        operation(i)
+    elapsed = time.perf_counter() - start
+    return {
+        'transactions_per_op': bus.transactions / ops,
+        'bytes_per_op': bus.bytes / ops,
+        'us_per_op': 1e6 * elapsed / ops,
+    }
+
+
+def bench_lcd_println(lcd, ops=2000):
+    lines = ('0123456789ABCDEF', 'FEDCBA9876543210')
+
+    def operation(i):
+        lcd.set_cursor(i % 2, 0)
+        lcd.println(lines[i % 2])
+
+    return measure(lcd.bus, operation, ops)
+
+
+def bench_menu_redraw(lcd, ops=2000):
+    import rpi_up_ctrl_panel as panel
+
+    screen = LcdFrameBuffer(lcd)
+    menu = panel.Menu(SyncWriter(screen))
+    elements = [menu.top_element('<    System    >', 'STRING', 'Raspberry Pi 4B '),
+                menu.top_element('<   Network    >', 'STRING', 'wlan0 connected ')]
+    loop = asyncio.new_event_loop()
+
+    def operation(i):
+        menu.element = elements[i % 2]
+        loop.run_until_complete(menu.handle_menu())
+
+    try:
+        return measure(lcd.bus, operation, ops)
+    finally:
+        loop.close()
+
+
+def bench_volume_bar(lcd, ops=2000):
+    import rpi_up_ctrl_panel as panel
+
+    panel.writer = SyncWriter(LcdFrameBuffer(lcd))
+
+    def operation(i):
+        # the knob sweeps up and down, one detent per operation
+        value = i % (2 * panel.MAX_VOLUME)
+        panel.draw_bar(min(value, 2 * panel.MAX_VOLUME - value), panel.MAX_VOLUME)
+
+    return measure(lcd.bus, operation, ops)
+
+
+def bench_drawbars_reader(sweeps=20, chunk_size=256):
+    data = burst(sweeps)
+    data_chunks = chunks(data, chunk_size)
+    messages = data.count(b'\n')
+    reader = DrawbarsAsyncReader(DrawbarsState())
+    start = time.perf_counter()
+    for chunk in data_chunks:
+        reader.data_received(chunk)
+    elapsed = time.perf_counter() - start
+    return {
+        'messages_per_s': messages / elapsed,
+        'us_per_op': 1e6 * elapsed / len(data_chunks),
+    }
+
+
+def noisy_readings(moving, count=3000, seed=1):
+    """
+    :param moving: if True, the drawbar is pulled in and out, else it rests at mid-course
+    :return: MIDI values read by the Arduino with a few units of ADC noise, always the same for a seed
+    """
+    noise = random.Random(seed)
+    readings = []
+    for i in range(count):
+        value = int(127 * abs(i % 400 - 200) / 200) if moving else 60
+        readings.append(max(0, min(127, value + noise.choice((-2, -1, -1, 0, 0, 0, 1, 1, 2)))))
+    return readings
+
+
+def bench_drawbar_filter():
+    results = {}
+    for moving, scenario in ((False, 'idle'), (True, 'moving')):
+        for variant, drawbar_filter in (('unfiltered', None), ('filtered', DrawbarFilter()),
+                                        ('quantized', DrawbarFilter(quantize=True))):
+            state = DrawbarsState()
+            state.filter = drawbar_filter
+            changes = [0]
+            state.subscribe(lambda registration, drawbar, value: changes.__setitem__(0, changes[0] + 1))
+            readings = noisy_readings(moving)
+            for value in readings:
+                state.feed(0, value)
+            results['%s_%s_changes_per_reading' % (scenario, variant)] = changes[0] / len(readings)
+    return results
+
+
+def unused_udp_port():
+    """
+    :return: a UDP port nothing is bound to, so that no running panel shares the bus with the benchmark
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def state_bus_bursts(bursts, interval):
+    loop = asyncio.get_running_loop()
+    port = unused_udp_port()
+    publisher = state_bus.StatePublisher(loop, port=port, interface='127.0.0.1', snapshot_interval=3600)
+    subscriber = state_bus.StateSubscriber(loop, port=port, interface='127.0.0.1')
+    try:
+        await publisher.start()
+        await subscriber.start()
+        await asyncio.sleep(0.05)  # the snapshots answering the join
+        messages, sent, received = publisher.messages, publisher.bytes_sent, subscriber.messages
+        subscriber.latency = LatencyStats()
+        for i in range(bursts):
+            for drawbar in range(9):
+                publisher.set(state_bus.drawbar_key(0, drawbar), (i + drawbar) % 128)
+            await asyncio.sleep(interval)
+        await asyncio.sleep(0.05)
+        return (publisher.messages - messages, publisher.bytes_sent - sent, subscriber.messages - received,
+                subscriber.latency.percentile(50))
+    finally:
+        publisher.close()
+        subscriber.close()
+
+
+def bench_state_bus(bursts=200, interval=0.005):
+    messages, sent, received, latency = asyncio.run(state_bus_bursts(bursts, interval))
+    if received != messages:
+        print('state_bus: %d of %d datagrams received' % (received, messages))
+    return {
+        'messages_per_op': messages / bursts,
+        'bytes_per_op': sent / bursts,
+        'latency_us_p50': 1e6 * latency,
+    }
+
+
+def run_all():
+    """
+    :return: {benchmark name: {metric: value}}; benchmarks which cannot run here are reported and left out
+    """
+    lcd = Lcd(bus=SimulatedSMBus(), addr=0x3c)
+    benchmarks = (('lcd_println', lambda: bench_lcd_println(lcd)),
+                  ('menu_redraw', lambda: bench_menu_redraw(lcd)),
+                  ('volume_bar', lambda: bench_volume_bar(lcd)),
+                  ('drawbars_reader', bench_drawbars_reader),
+                  ('drawbar_filter', bench_drawbar_filter),
+                  ('state_bus', bench_state_bus))
+    results = {}
+    for name, benchmark in benchmarks:
+        try:
+            results[name] = benchmark()
+        except (ImportError, OSError) as exc:
+            print('%-16s skipped: %s' % (name, exc))
+    return results
+
+
+def compare(results, baseline, threshold, time_threshold):
+    """
+    :return: list of (benchmark, metric, baseline value, current value) which regressed
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            limit = time_threshold if metric in TIMING_METRICS else threshold
+            change = (value - reference) / reference
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > limit:
+                regressions.append((name, metric, reference, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the control panel hot paths.')
+    parser.add_argument('--baseline', default=BASELINES, help='JSON baseline file')
+    parser.add_argument('--save', action='store_true', help='record the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help='tolerated relative increase of I2C transactions and bytes (default: none)')
+    parser.add_argument('--time-threshold', type=float, default=0.5,
+                        help='tolerated relative degradation of timings (default: 0.5)')
+    args = parser.parse_args()
+
+    results = run_all()
+    for name, metrics in results.items():
+        print('%-16s %s' % (name, '  '.join('%s %.6g' % item for item in sorted(metrics.items()))))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to ' + args.baseline)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print('no baseline, run with --save to record one')
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.time_threshold)
+    for name, metric, reference, value in regressions:
+        print('REGRESSION %s %s: %.6g -> %.6g' % (name, metric, reference, value))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+from drawbars_state import NUM_DRAWBARS, MIDI_MAX, DRAWBAR_POSITIONS, drawbar_position
+
+
+class DrawbarFilter:
+    """
+    Per-drawbar filter of the Arduino readings, between line parsing and the drawbars state.
+    Readings are smoothed by an exponential moving average whose weight grows with the distance
+    to the new reading: jitter is averaged out while a drawbar pulled fast is followed at once.
+    A new value is only emitted when the average leaves a deadband around the last emitted value,
+    or, when quantizing, when it crosses a drawbar position boundary by more than a hysteresis margin.
+    """
+    def __init__(self, deadband=3, smoothing=True, min_weight=0.2, fast_delta=16, quantize=False, hysteresis=0.2):
+        """
+        :param deadband: smallest change emitted, in MIDI units; ignored when quantizing
+        :param smoothing: if False, readings are not averaged
+        :param min_weight: weight of a new reading close to the average, 0-1; lower smooths more
+        :param fast_delta: distance to the average, in MIDI units, from which a reading is taken as is
+        :param quantize: if True, values are snapped to the MIDI values of the 0-8 drawbar positions
+        :param hysteresis: margin beyond a position boundary needed to move, in drawbar positions
+        """
+        self.deadband = deadband
+        self.smoothing = smoothing
+        self.min_weight = min_weight
+        self.fast_delta = fast_delta
+        self.quantize = quantize
+        self.hysteresis = hysteresis
+        self.average = [-1.0] * NUM_DRAWBARS  # -1 until the first reading
+        self.emitted = [-1] * NUM_DRAWBARS
+        self.raw_events = 0
+        self.emitted_events = 0
+
+    def feed(self, drawbar, value):
+        """
+        :param drawbar: drawbar index 0-8
+        :param value: MIDI value read by the Arduino, 0-127
+        :return: value to store, or None if the reading is filtered out
+        """
+        self.raw_events += 1
+        average = self.average[drawbar]
+        if average < 0 or not self.smoothing or value in (0, MIDI_MAX):
+            # a reading at an end is taken as is: the Arduino sends one line per move, so the average
+            # of a drawbar pulled slowly to an end would otherwise stay short of it
+            average = float(value)
+        else:
+            weight = min(1.0, self.min_weight + (1.0 - self.min_weight) * abs(value - average) / self.fast_delta)
+            average += weight * (value - average)
+        self.average[drawbar] = average
+
+        emitted = self.emitted[drawbar]
+        if self.quantize:
+            position = average * DRAWBAR_POSITIONS / MIDI_MAX
+            current = drawbar_position(emitted) if emitted >= 0 else -1
+            if current >= 0 and abs(position - current) < 0.5 + self.hysteresis:
+                return None
+            new = (int(position + 0.5) * MIDI_MAX + DRAWBAR_POSITIONS // 2) // DRAWBAR_POSITIONS
+        else:
+            new = int(average + 0.5)
+            # the ends are always reachable, even within the deadband
+            if emitted >= 0 and abs(average - emitted) < self.deadband and new not in (0, MIDI_MAX):
+                return None
+        if new == emitted:
+            return None
+        self.emitted[drawbar] = new
+        self.emitted_events += 1
+        return new
+
+    def reset(self, drawbar=None):
+        """
+        Forgets the readings, e.g. after the Arduino reconnects.
+        :param drawbar: drawbar index, all drawbars if None
+        """
+        for i in range(NUM_DRAWBARS) if drawbar is None else (drawbar,):
+            self.average[i] = -1.0
+            self.emitted[i] = -1
@@ -1,31 +1,70 @@
 import asyncio
+import logging
+
+from drawbars_state import DrawbarsState
+
+logger = logging.getLogger(__name__)
+
+# longest valid line is a few bytes ('78 127'); anything longer is garbage
+MAX_LINE_LENGTH = 32
 
 
 class DrawbarsAsyncReader(asyncio.Protocol):
     """
     Asynchronously reads drawbars information from the Arduino.
     """
-    def __init__(self):
+    def __init__(self, state: DrawbarsState):
+        """
+        :param state: drawbars model updated with each received line
+        """
         self.transport = None
-        self.buf = bytes()
+        self.state = state
+        self.buf = bytearray()
+        self.scan = 0  # buffer offset from which to look for the next newline
+        self.resync = False  # True while skipping the end of an overlong line
+        self.garbage_bytes = 0
 
     def connection_made(self, tport):
         self.transport = tport
-        tport.serial.rts = False  # You can manipulate Serial object via transport
+        try:
+            tport.serial.rts = False  # You can manipulate Serial object via transport
+        except OSError:
+            pass  # not a modem line, e.g. the pseudo-terminal of simulation.SimulatedArduino
 
     def data_received(self, data):
         """
-        Stores characters until a newline is received, then displays drawbars positions.
+        Stores characters until a newline is received, then updates the drawbars state.
+        Only the bytes received in this call are searched for a newline, and all the
+        complete lines are split off the receive buffer at once.
         :param data: stream of MIDI CC messages sent by the Arduino and separated by NL
         """
-        print('data_received : ' + str(data))
-        self.buf += data
-
-        if b'\n' in self.buf:
-            lines = self.buf.split(b'\n')
-            self.buf = lines[-1]  # whatever was left over
-            for draw_bar in lines[:-1]:
-                pass # TODO: display drawbar data
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('data_received: %r', data)
+        buf = self.buf
+        buf += data
+        last = buf.rfind(b'\n', self.scan)
+        if last >= 0:
+            lines = buf[:last].split(b'\n')
+            del buf[:last + 1]
+            if self.resync:
+                # first line is the end of an overlong one
+                self.resync = False
+                self.garbage_bytes += len(lines[0])
+                lines[0] = b''
+            feed_line = self.state.feed_line
+            for line in lines:
+                if len(line) <= MAX_LINE_LENGTH:
+                    feed_line(line)
+                else:
+                    self.garbage_bytes += len(line)
+
+        if len(buf) > MAX_LINE_LENGTH:
+            # no newline for too long: drop the partial line and skip until the next newline
+            logger.debug('dropping %d bytes without newline', len(buf))
+            self.garbage_bytes += len(buf)
+            self.resync = True
+            del buf[:]
+        self.scan = len(buf)
 
     def connection_lost(self, exc):
         self.transport.loop.stop()
@@ -0,0 +1,141 @@
+from array import array
+
+NUM_REGISTRATIONS = 2
+NUM_DRAWBARS = 9  # 16', 5 1/3', 8', 4', 2 2/3', 2', 1 3/5', 1 1/3', 1'
+
+# MIDI CC numbers of the upper manual drawbars in setBfree default mapping (16' first)
+DRAWBAR_CC_FIRST = 70
+DRAWBAR_CC_LAST = DRAWBAR_CC_FIRST + NUM_DRAWBARS - 1
+
+MIDI_MAX = 127
+DRAWBAR_POSITIONS = 8
+
+
+def parse_drawbar_line(line):
+    """
+    Decodes a line sent by the Arduino: MIDI CC number and value as decimal numbers
+    separated by spaces, e.g. b'72 127'. Nothing is allocated but the returned tuple.
+    :param line: bytes-like object, without the newline
+    :return: (drawbar index, MIDI value) or None if the line is not a drawbar CC
+    """
+    controller = value = 0
+    count = 0
+    in_number = False
+    for byte in line:
+        if 48 <= byte <= 57:  # '0'..'9'
+            if not in_number:
+                if count == 2:
+                    return None
+                in_number = True
+                count += 1
+            if count == 1:
+                controller = controller * 10 + byte - 48
+            else:
+                value = value * 10 + byte - 48
+        elif byte in (32, 9, 13):  # ' ', '\t', '\r'
+            in_number = False
+        else:
+            return None
+    if count != 2:
+        return None
+    if not DRAWBAR_CC_FIRST <= controller <= DRAWBAR_CC_LAST or value > MIDI_MAX:
+        return None
+    return controller - DRAWBAR_CC_FIRST, value
+
+
+def drawbar_position(value):
+    """
+    :param value: MIDI value 0-127
+    :return: drawbar position 0-8
+    """
+    return (value * DRAWBAR_POSITIONS + MIDI_MAX // 2) // MIDI_MAX
+
+
+class DrawbarsState:
+    """
+    Upper manual drawbars of both registrations, as MIDI values in one fixed-size array.
+    Changes are tracked in a dirty bit mask and pushed to subscribers;
+    values which do not change are neither stored nor notified.
+    """
+    def __init__(self):
+        self.values = array('B', bytes(NUM_REGISTRATIONS * NUM_DRAWBARS))
+        self.dirty = 0  # bit (registration * NUM_DRAWBARS + drawbar) set when the value changed
+        self.active = 0  # registration the Arduino drawbars are currently assigned to
+        self.subscribers = []
+        self.filter = None  # optional drawbar_filter.DrawbarFilter applied to the Arduino readings
+
+    def subscribe(self, callback):
+        """
+        :param callback: called as callback(registration, drawbar, value) on each actual change
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def select_registration(self, registration):
+        """
+        :param registration: 0 or 1; subsequent drawbar moves update this registration
+        """
+        self.active = registration
+
+    def update(self, drawbar, value, registration=None):
+        """
+        Stores a drawbar value.
+        :param drawbar: drawbar index 0-8
+        :param value: MIDI value 0-127
+        :param registration: defaults to the active registration
+        :return: True if the value changed
+        """
+        if registration is None:
+            registration = self.active
+        index = registration * NUM_DRAWBARS + drawbar
+        if self.values[index] == value:
+            return False
+        self.values[index] = value
+        self.dirty |= 1 << index
+        for callback in self.subscribers:
+            callback(registration, drawbar, value)
+        return True
+
+    def feed(self, drawbar, value):
+        """
+        Updates the active registration with a reading from the Arduino, once filtered.
+        :param drawbar: drawbar index 0-8
+        :param value: MIDI value 0-127
+        :return: True if a drawbar value changed
+        """
+        if self.filter is not None:
+            value = self.filter.feed(drawbar, value)
+            if value is None:
+                return False
+        return self.update(drawbar, value)
+
+    def feed_line(self, line):
+        """
+        Parses a line from the Arduino and updates the active registration.
+        :param line: bytes-like object, without the newline
+        :return: True if a drawbar value changed
+        """
+        parsed = parse_drawbar_line(line)
+        if parsed is None:
+            return False
+        return self.feed(parsed[0], parsed[1])
+
+    def registration(self, registration=None):
+        """
+        :param registration: defaults to the active registration
+        :return: read-only view of the 9 MIDI values of the registration
+        """
+        if registration is None:
+            registration = self.active
+        start = registration * NUM_DRAWBARS
+        return memoryview(self.values)[start:start + NUM_DRAWBARS].toreadonly()
+
+    def take_dirty(self):
+        """
+        :return: the dirty bit mask, which is then cleared
+        """
+        dirty = self.dirty
+        self.dirty = 0
+        return dirty
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class EncoderAccumulator:
+    """
+    Collects the detents of a rotary encoder and delivers them once per frame
+    as a single net delta, in the event loop thread.
+    gpiozero callbacks only add to a counter, so a fast spin never queues callbacks;
+    the spin speed is turned into an acceleration factor.
+    """
+    def __init__(self, rotary, handler, loop, frame=0.02, threshold=40.0, max_factor=3.0, on_detents=None):
+        """
+        Takes over the rotation callbacks of the encoder.
+        :param rotary: gpiozero RotaryEncoder
+        :param handler: called as handler(delta) in the event loop thread, at most once per frame
+        :param loop: event loop
+        :param frame: accumulation period in seconds
+        :param threshold: speed in detents per second above which the delta is accelerated
+        :param max_factor: maximum acceleration factor; 1 disables acceleration
+        :param on_detents: called with the raw detents as they come, in the gpiozero thread, e.g. to trace them
+        """
+        self.handler = handler
+        self.loop = loop
+        self.frame = frame
+        self.threshold = threshold
+        self.max_factor = max_factor
+        self.on_detents = on_detents
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.scheduled = False
+        self.detents = 0
+        self.frames = 0
+        self.first = 0.0  # perf_counter() of the first pending detent
+        self.received = 0.0  # perf_counter() of the first detent of the delta being delivered
+        rotary.when_rotated_clockwise = self.clockwise
+        rotary.when_rotated_counter_clockwise = self.counter_clockwise
+
+    def clockwise(self):
+        self.add(1)
+
+    def counter_clockwise(self):
+        self.add(-1)
+
+    def add(self, detents):
+        """
+        Records detents; can be called from any thread.
+        :param detents: positive clockwise, negative counter-clockwise
+        """
+        if self.on_detents is not None:
+            self.on_detents(detents)
+        with self.lock:
+            self.pending += detents
+            self.detents += abs(detents)
+            if self.scheduled:
+                return
+            self.first = time.perf_counter()
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.frame, self._deliver)
+
+    def accelerate(self, delta):
+        """
+        :param delta: net detents of one frame
+        :return: delta scaled according to the spin speed
+        """
+        speed = abs(delta) / self.frame
+        if speed <= self.threshold or self.max_factor <= 1:
+            return delta
+        factor = min(self.max_factor, speed / self.threshold)
+        return int(round(delta * factor))
+
+    def _deliver(self):
+        with self.lock:
+            delta = self.pending
+            self.pending = 0
+            self.scheduled = False
+            self.received = self.first
+        if delta:
+            self.frames += 1
+            self.handler(self.accelerate(delta))
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+
+TRACE_MAGIC = b'B3TR'
+TRACE_VERSION = 1
+HEADER = struct.Struct('<4sB')  # magic, version; once, at the start of the file
+# microseconds since the previous record of the session, event type, payload length
+RECORD = struct.Struct('<IBB')
+MAX_DELTA = 0xFFFFFFFF
+MAX_PAYLOAD = 0xFF
+
+# event types
+START = 0  # a recording session starts; payload: wall clock time as a little endian double
+WAIT = 1  # nothing happened for MAX_DELTA microseconds
+SERIAL = 2  # bytes received from the Arduino
+DETENTS = 3  # payload: input, signed number of detents
+BUTTON = 4  # payload: input
+
+# input identifiers, stored as their index
+INPUTS = ('volume', 'reverb', 'menu', 'registration_1', 'registration_2', 'menu_push', 'power_held', 'power_released')
+DETENTS_PAYLOAD = struct.Struct('<Bb')
+
+
+class TraceRecorder:
+    """
+    Appends input events to a binary trace file, with their time.monotonic() offsets.
+    Each record is written at once, so a crash loses nothing; several sessions can follow each other in a file.
+    Methods can be called from any thread.
+    """
+    def __init__(self, path):
+        """
+        :param path: trace file, created if needed
+        """
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.lock = threading.Lock()
+        self.records = 0
+        if os.fstat(self.fd).st_size == 0:
+            os.write(self.fd, HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+        self.last = time.monotonic()
+        self.record(START, struct.pack('<d', time.time()))
+
+    def record(self, event_type, payload=b''):
+        """
+        :param event_type: one of the event types above
+        :param payload: at most MAX_PAYLOAD bytes
+        """
+        now = time.monotonic()
+        with self.lock:
+            delta = int((now - self.last) * 1e6)
+            self.last = now
+            data = b''
+            while delta > MAX_DELTA:
+                data += RECORD.pack(MAX_DELTA, WAIT, 0)
+                delta -= MAX_DELTA
+            os.write(self.fd, data + RECORD.pack(delta, event_type, len(payload)) + payload)
+            self.records += 1
+
+    def serial(self, data):
+        """
+        :param data: bytes received from the Arduino
+        """
+        for start in range(0, len(data), MAX_PAYLOAD):
+            self.record(SERIAL, bytes(data[start:start + MAX_PAYLOAD]))
+
+    def detents(self, name, detents):
+        """
+        :param name: encoder, one of INPUTS
+        :param detents: positive clockwise, negative counter-clockwise
+        """
+        self.record(DETENTS, DETENTS_PAYLOAD.pack(INPUTS.index(name), detents))
+
+    def button(self, name):
+        """
+        :param name: button action, one of INPUTS
+        """
+        self.record(BUTTON, bytes((INPUTS.index(name),)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def read_trace(path):
+    """
+    :param path: trace file
+    :return: list of (seconds since the start of its session, event type, payload);
+             the sessions of the file follow each other, each one starting with a START event at 0
+    :raise ValueError: if the file is not a trace
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size or HEADER.unpack_from(data) != (TRACE_MAGIC, TRACE_VERSION):
+        raise ValueError(path + ': not a version %d trace file' % TRACE_VERSION)
+    events = []
+    offset = HEADER.size
+    elapsed = 0
+    while offset + RECORD.size <= len(data):
+        delta, event_type, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        elapsed = 0 if event_type == START else elapsed + delta
+        if event_type != WAIT:
+            events.append((elapsed / 1e6, event_type, payload))
+    return events
+
+
+async def replay(events, handlers, realtime=True):
+    """
+    Feeds recorded events to the panel, in the event loop thread.
+    :param events: list returned by read_trace()
+    :param handlers: {'serial': callable(data), encoder name: callable(detents), button name: callable()};
+                     coroutines returned by the handlers are scheduled as tasks, missing inputs are skipped
+    :param realtime: if True, events are fed at their recorded times, else as fast as possible
+    :return: {'events': fed events, 'seconds': replay duration, 'max_late': worst lateness in real time}
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    session = start
+    fed = 0
+    max_late = 0.0
+    for elapsed, event_type, payload in events:
+        if event_type == START:
+            # sessions are replayed back to back
+            session = loop.time()
+            continue
+        if realtime:
+            delay = session + elapsed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_late = max(max_late, -delay)
+        else:
+            await asyncio.sleep(0)  # let the panel process the previous event
+        if event_type == SERIAL:
+            handler, args = handlers.get('serial'), (payload,)
+        elif event_type == DETENTS:
+            input_id, detents = DETENTS_PAYLOAD.unpack(payload)
+            handler, args = handlers.get(INPUTS[input_id]), (detents,)
+        elif event_type == BUTTON:
+            handler, args = handlers.get(INPUTS[payload[0]]), ()
+        else:
+            continue
+        if handler is None:
+            continue
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            loop.create_task(result)
+        fed += 1
+    return {'events': fed, 'seconds': loop.time() - start, 'max_late': max_late}
@@ -1,6 +1,11 @@
-import smbus
+import errno
 from time import sleep
 
+try:
+    import smbus  # only needed when the Lcd opens a bus by its number
+except ImportError:
+    smbus = None
+
 
 def delay_milli_seconds(time):
     sleep(time / 1000.0)
@@ -52,6 +57,19 @@ LCD_5x8DOTS = 0x00
 LCD_CHR = 1  # Mode - Sending data
 LCD_CMD = 0  # Mode - Sending command
 
+# I2C control bytes: Co (bit 7) set means another control byte follows the next data byte,
+# RS (bit 6) selects data RAM instead of the instruction register
+I2C_CTRL_CMD = 0x00
+I2C_CTRL_DATA = 0x40
+I2C_CTRL_CMD_CONTINUED = 0x80
+
+# SMBus block transfers carry at most 32 bytes after the command (control) byte
+I2C_BLOCK_MAX = 32
+
+# the controller has 8 user-defined characters of 5x8 pixels, codes 0 to 7
+CGRAM_GLYPHS = 8
+GLYPH_ROWS = 8
+
 
 class Lcd:
     """
@@ -60,20 +78,63 @@ class Lcd:
     """
     row_offsets = [0x00, 0x40, 0x14, 0x54]
     
-    def __init__(self, bus=1, addr=0x20, rows=2, cols=16):
+    def __init__(self, bus=1, addr=0x20, rows=2, cols=16, ready_marker=None):
         """
         Initializes the Lcd object.
-        :param bus: I2C bus number
+        :param bus: I2C bus number, or an already opened SMBus-like object, e.g. simulation.SimulatedSMBus
         :param addr: I2C device address
         :param rows: LCD number of rows
         :param cols: LCD number of columns
+        :param ready_marker: file recording that the controller was initialized since boot, e.g. in /run;
+                             when it is valid and the display answers, the long init sequence is skipped
         """
-        self.bus_num = bus
-        self.bus = smbus.SMBus(self.bus_num)
+        if isinstance(bus, int):
+            if smbus is None:
+                raise RuntimeError('opening I2C bus %d requires the smbus module' % bus)
+            self.bus_num = bus
+            self.bus = smbus.SMBus(bus)
+        else:
+            self.bus_num = None
+            self.bus = bus
         self.addr = addr
         self.cols = cols
         self.rows = rows
-        self._init_display()
+        # cleared the first time the bus reports it cannot do I2C block writes
+        self.block_write_supported = hasattr(self.bus, 'write_i2c_block_data')
+        self.resident_glyphs = None  # glyph set currently stored in CGRAM
+        self.transactions = 0  # I2C transactions issued since initialization
+        self.bytes_sent = 0  # control and data bytes sent, address bytes excluded
+        self.warm = ready_marker is not None and self._initialized_before(ready_marker)
+        if self.warm:
+            self.clear()
+        else:
+            self._init_display()
+            if ready_marker is not None:
+                self._mark_ready(ready_marker)
+
+    def _marker_text(self):
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return '%s %d\n' % (f.read().strip(), self.addr)
+
+    def _initialized_before(self, ready_marker):
+        """
+        :return: True if the controller was initialized during this boot and acknowledges its address
+        """
+        try:
+            with open(ready_marker) as f:
+                if f.read() != self._marker_text():
+                    return False
+            self.bus.write_quick(self.addr)
+            return True
+        except OSError:
+            return False
+
+    def _mark_ready(self, ready_marker):
+        try:
+            with open(ready_marker, 'w') as f:
+                f.write(self._marker_text())
+        except OSError as exc:
+            print('LCD ready marker not written, the next start will be a cold one: ' + repr(exc))
 
     def _init_display(self):
         """
@@ -112,8 +173,85 @@ class Lcd:
         Displays a line of text from the current cursor position.
         :param line: string of characters to be displayed
         """
-        for char in line:
-            self.write_byte(ord(char), char_mode=True)
+        data = self.encode(line)
+        for start in range(0, len(data), I2C_BLOCK_MAX):
+            self.write_block(I2C_CTRL_DATA, data[start:start + I2C_BLOCK_MAX])
+
+    def print_at(self, row: int, col: int, text: str):
+        """
+        Moves the cursor and displays text in a single I2C transaction when the bus allows it.
+        The DDRAM address command is sent with the Co bit set so that a data control byte
+        can follow it in the same transfer.
+        :param row: cursor row
+        :param col: cursor column
+        :param text: string of characters to be displayed
+        """
+        data = self.encode(text)
+        head = [LCD_SET_DDRAM_ADDR | (col + self.row_offsets[row]), I2C_CTRL_DATA]
+        first = I2C_BLOCK_MAX - len(head)
+        self.write_block(I2C_CTRL_CMD_CONTINUED, head + data[:first])
+        for start in range(first, len(data), I2C_BLOCK_MAX):
+            self.write_block(I2C_CTRL_DATA, data[start:start + I2C_BLOCK_MAX])
+
+    def load_glyphs(self, glyphs):
+        """
+        Uploads user-defined characters to CGRAM, unless this glyph set is already resident.
+        The address counter then points to CGRAM: use print_at or set_cursor before writing text.
+        :param glyphs: tuple of at most CGRAM_GLYPHS glyphs, each one bytes of GLYPH_ROWS 5-bit rows;
+                       glyph i is displayed by character code i
+        :return: True if the glyphs were uploaded
+        """
+        if glyphs == self.resident_glyphs:
+            return False
+        data = [row for glyph in glyphs for row in glyph]
+        head = [LCD_SET_CGRAM_ADDR, I2C_CTRL_DATA]
+        first = I2C_BLOCK_MAX - len(head)
+        self.write_block(I2C_CTRL_CMD_CONTINUED, head + data[:first])
+        for start in range(first, len(data), I2C_BLOCK_MAX):
+            self.write_block(I2C_CTRL_DATA, data[start:start + I2C_BLOCK_MAX])
+        self.resident_glyphs = glyphs
+        return True
+
+    @staticmethod
+    def encode(text: str):
+        """
+        Converts text into the list of character codes of the controller ROM.
+        :param text: string of characters
+        :return: list of bytes
+        """
+        return [ord(char) & 0xFF for char in text]
+
+    def write_block(self, control, data):
+        """
+        Sends a control byte followed by several bytes in one I2C transaction.
+        Falls back to one transaction per byte if the bus has no block write support.
+        :param control: I2C_CTRL_DATA, I2C_CTRL_CMD or I2C_CTRL_CMD_CONTINUED
+        :param data: list of bytes, at most I2C_BLOCK_MAX long
+        """
+        if not data:
+            return
+        if self.block_write_supported:
+            try:
+                self.bus.write_i2c_block_data(self.addr, control, data)
+                self.transactions += 1
+                self.bytes_sent += 1 + len(data)
+                return
+            except NotImplementedError:
+                self.block_write_supported = False
+            except OSError as exc:
+                # only an adapter without block writes turns them off; other errors, e.g. a NACK,
+                # fall back for this write only
+                if exc.errno in (errno.EOPNOTSUPP, errno.EINVAL):
+                    self.block_write_supported = False
+
+        if control == I2C_CTRL_CMD_CONTINUED:
+            # split the "command + data" transfer back into separate transactions
+            self.write_byte(data[0])
+            data = data[2:]
+            control = I2C_CTRL_DATA
+
+        for byte in data:
+            self.write_byte(byte, char_mode=(control == I2C_CTRL_DATA))
 
     def write_byte(self, data, char_mode=False):
         """
@@ -122,9 +260,11 @@ class Lcd:
         :param char_mode: in character mode if true, else in command mode
         """
         if char_mode:
-            self.bus.write_byte_data(self.addr, 0x40, data)
+            self.bus.write_byte_data(self.addr, I2C_CTRL_DATA, data)
         else:
-            self.bus.write_byte_data(self.addr, 0x00, data)
+            self.bus.write_byte_data(self.addr, I2C_CTRL_CMD, data)
+        self.transactions += 1
+        self.bytes_sent += 2
 
     def clear(self):
         """
@@ -154,9 +294,7 @@ if __name__ == "__main__":
     lcd = Lcd(bus=1, addr=0x3c, rows=2, cols=16)
 
     lcd.clear()
-    lcd.set_cursor(0, 0)
-    lcd.println('0123456789ABCDEF')
-    lcd.set_cursor(1, 0)
-    lcd.println('FEDCBA9876543210')
+    lcd.print_at(0, 0, '0123456789ABCDEF')
+    lcd.print_at(1, 0, 'FEDCBA9876543210')
     sleep(4)
     lcd.clear()
@@ -0,0 +1,106 @@
+from i2c_lcd import Lcd
+
+# a new transaction costs the DDRAM address command and two control bytes,
+# so rewriting a few unchanged characters is cheaper than starting another one
+MERGE_GAP = 3
+
+
+class LcdFrameBuffer:
+    """
+    Shadow copy of the LCD character RAM.
+    Callers draw into memory; flush() sends only the characters that differ
+    from what the display currently shows, one I2C transaction per dirty run.
+    """
+    def __init__(self, lcd: Lcd):
+        """
+        Initializes the frame buffer; the display is assumed to be cleared.
+        :param lcd: Lcd object the frame buffer is flushed to
+        """
+        self.lcd = lcd
+        self.rows = lcd.rows
+        self.cols = lcd.cols
+        self.frame = [bytearray(b' ' * self.cols) for _ in range(self.rows)]
+        self.shadow = [bytearray(b' ' * self.cols) for _ in range(self.rows)]
+        self.glyphs = None  # glyph set the frame needs in CGRAM
+
+    def use_glyphs(self, glyphs):
+        """
+        Selects the user-defined characters (codes 0 to 7) the frame is drawn with.
+        They are uploaded by flush(), only if another glyph set is resident.
+        :param glyphs: glyph set, see lcd_glyphs
+        """
+        self.glyphs = glyphs
+
+    def write(self, row: int, col: int, text: str):
+        """
+        Draws text into the frame buffer; characters beyond the last column are dropped.
+        :param row: first character row
+        :param col: first character column
+        :param text: string of characters to be drawn
+        """
+        data = bytes(Lcd.encode(text[:max(self.cols - col, 0)]))
+        self.frame[row][col:col + len(data)] = data
+
+    def write_line(self, row: int, text: str):
+        """
+        Draws a whole row, padding text with spaces.
+        :param row: character row
+        :param text: string of characters to be drawn
+        """
+        self.write(row, 0, text.ljust(self.cols))
+
+    def clear(self):
+        """
+        Blanks the frame buffer. Nothing is sent to the display until flush().
+        """
+        for line in self.frame:
+            line[:] = b' ' * self.cols
+
+    def invalidate(self):
+        """
+        Forgets what the display shows, so the next flush() rewrites every character.
+        Must be called if the LCD was written without going through this frame buffer.
+        """
+        for row in range(self.rows):
+            for col in range(self.cols):
+                self.shadow[row][col] = self.frame[row][col] ^ 0xFF
+
+    def dirty_runs(self, row: int):
+        """
+        Finds the column ranges of a row which differ from the display.
+        Runs separated by no more than MERGE_GAP unchanged characters are merged.
+        :param row: character row
+        :return: list of (start, end) column ranges, end excluded
+        """
+        frame = self.frame[row]
+        shadow = self.shadow[row]
+        runs = []
+        col = 0
+        while col < self.cols:
+            if frame[col] == shadow[col]:
+                col += 1
+                continue
+            start = col
+            while col < self.cols and frame[col] != shadow[col]:
+                col += 1
+            if runs and start - runs[-1][1] <= MERGE_GAP:
+                runs[-1] = (runs[-1][0], col)
+            else:
+                runs.append((start, col))
+        return runs
+
+    def flush(self):
+        """
+        Sends the dirty runs to the display.
+        :return: number of writes issued (0 if the display is up to date)
+        """
+        writes = 0
+        if self.glyphs is not None and self.lcd.load_glyphs(self.glyphs):
+            writes += 1
+        for row in range(self.rows):
+            frame = self.frame[row]
+            for start, end in self.dirty_runs(row):
+                self.lcd.print_at(row, start, frame[start:end].decode('latin-1'))
+                self.shadow[row][start:end] = frame[start:end]
+                writes += 1
+        return writes
@@ -0,0 +1,44 @@
+from i2c_lcd import GLYPH_ROWS
+
+GLYPH_COLUMNS = 5
+
+
+def _horizontal_glyph(columns):
+    row = (0x1F << (GLYPH_COLUMNS - columns)) & 0x1F
+    return bytes((row,) * GLYPH_ROWS)
+
+
+def _hanging_glyph(rows):
+    return bytes(0x0E if row < rows else 0x00 for row in range(GLYPH_ROWS))
+
+
+# glyph i has its i + 1 leftmost pixel columns lit: bars with 5 steps per character
+HORIZONTAL_BAR = tuple(_horizontal_glyph(columns) for columns in range(1, GLYPH_COLUMNS + 1))
+
+# glyph i has its i + 1 top pixel rows lit: drawbars hang down, 8 positions per character
+DRAWBARS = tuple(_hanging_glyph(rows) for rows in range(1, GLYPH_ROWS + 1))
+
+
+def bar_graph(value, maximum, width=16):
+    """
+    Renders a horizontal bar graph with HORIZONTAL_BAR glyphs, one pixel column per step.
+    :param value: value between 0 and maximum
+    :param maximum: full scale of value
+    :param width: number of characters of the graph
+    :return: text of width characters
+    """
+    pixels = (value * width * GLYPH_COLUMNS + maximum // 2) // maximum
+    full, partial = divmod(pixels, GLYPH_COLUMNS)
+    text = chr(GLYPH_COLUMNS - 1) * full
+    if partial:
+        text += chr(partial - 1)
+    return text.ljust(width)
+
+
+def drawbars_view(positions):
+    """
+    Renders drawbars as vertical bars with DRAWBARS glyphs, one character per drawbar.
+    :param positions: iterable of drawbar positions, 0-8
+    :return: text of one character per drawbar
+    """
+    return ''.join(chr(position - 1) if position else ' ' for position in positions)
@@ -0,0 +1,108 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from lcd_framebuffer import LcdFrameBuffer
+from telemetry import LatencyStats
+
+# draw request priorities, lowest value is served first
+INTERACTIVE = 0  # knob and button feedback
+BACKGROUND = 1  # periodic status refresh
+
+
+class LcdWriter(threading.Thread):
+    """
+    Single thread owning the LCD frame buffer.
+    Other threads submit draw requests, i.e. callables taking the frame buffer as argument.
+    Pending requests sharing a key are coalesced: only the most recent one is drawn.
+    Interactive requests are always served before background ones.
+    """
+    def __init__(self, screen: LcdFrameBuffer, max_pending=16):
+        """
+        Initializes the writer thread; call start() to run it.
+        :param screen: frame buffer the draw requests are executed on
+        :param max_pending: queue bound; the oldest, least urgent request is dropped beyond it
+        """
+        super().__init__(name='LcdWriter', daemon=True)
+        self.screen = screen
+        self.max_pending = max_pending
+        self.pending = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.running = True
+        self.coalesced = 0
+        self.dropped = 0
+        # from the event (or the submission) to the end of the flush showing it, per priority
+        self.latency = {INTERACTIVE: LatencyStats(), BACKGROUND: LatencyStats()}
+
+    def submit(self, draw, priority=BACKGROUND, key=None, since=None):
+        """
+        Queues a draw request; never blocks the caller.
+        :param draw: callable receiving the LcdFrameBuffer
+        :param priority: INTERACTIVE or BACKGROUND
+        :param key: requests with the same key replace each other while pending
+        :param since: time.perf_counter() of the event the request shows, defaults to now
+        """
+        if key is None:
+            key = next(self.sequence)
+        if since is None:
+            since = time.perf_counter()
+        with self.condition:
+            # a newer frame supersedes a stale one whatever its priority
+            for queue in self.pending.values():
+                if key in queue:
+                    # the latency is counted from the oldest event the drawn frame includes
+                    since = min(since, queue.pop(key)[2])
+                    self.coalesced += 1
+                    break
+            else:
+                if self.depth() >= self.max_pending:
+                    self._drop_one()
+            self.pending[priority][key] = (draw, priority, since)
+            self.condition.notify()
+
+    def depth(self):
+        """
+        :return: number of pending draw requests
+        """
+        return sum(len(queue) for queue in self.pending.values())
+
+    def _drop_one(self):
+        for priority in (BACKGROUND, INTERACTIVE):
+            if self.pending[priority]:
+                self.pending[priority].popitem(last=False)
+                self.dropped += 1
+                return
+
+    def _next_request(self):
+        with self.condition:
+            while self.running and not self.depth():
+                self.condition.wait()
+            for priority in (INTERACTIVE, BACKGROUND):
+                if self.pending[priority]:
+                    return self.pending[priority].popitem(last=False)[1]
+            return None
+
+    def run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            draw, priority, since = request
+            try:
+                draw(self.screen)
+                self.screen.flush()
+            except Exception as exc:
+                print('LCD draw request failed: ' + repr(exc))
+            else:
+                self.latency[priority].add(time.perf_counter() - since)
+
+    def stop(self):
+        """
+        Draws the remaining requests, then stops the writer thread.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.join()
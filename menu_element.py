@@ -0,0 +1,77 @@
+import json
+
+# STRING:   Content is displayed as is
+# VOLUME, REVERB, FUNCTION: Content names a function of the control panel returning the text
+# METRIC:   Content names a value sampled by system_metrics.SystemMetrics
+# PYTHON3:  Content is a Python expression, compiled once
+# BASH:     Content is a shell command, run in an executor
+# CATALOG:  Content names a setBfree parameter or program property indexed by setbfree_catalog
+ELEMENT_TYPES = ("STRING", "VOLUME", "REVERB", "FUNCTION", "METRIC", "PYTHON3", "BASH", "CATALOG")
+
+LCD_COLUMNS = 16
+
+
+class MenuElement:
+    """
+    Menu node. The text of the second LCD row is produced by render(),
+    resolved once when the element is created, so that a refresh is a plain call.
+    """
+    __slots__ = ('name', 'element_type', 'content', 'render', 'blocking', 'glyphs', 'sub')
+
+    def __init__(self, name, element_type, content, render, blocking=False, glyphs=None):
+        """
+        :param name: text of the first LCD row
+        :param element_type: one of ELEMENT_TYPES
+        :param content: element definition, interpreted according to element_type
+        :param render: callable without argument returning the text of the second row
+        :param blocking: True if render() must not be called from the event loop
+        :param glyphs: CGRAM glyph set the rendered text uses, see lcd_glyphs; None if it uses none
+        """
+        self.name = name
+        self.element_type = element_type
+        self.content = content
+        self.render = render
+        self.blocking = blocking
+        self.glyphs = glyphs
+        self.sub = []
+
+    def __repr__(self):
+        return 'MenuElement(%r, %r, %r)' % (self.name, self.element_type, self.content)
+
+
+def _check_element(definition, where):
+    if not isinstance(definition, dict):
+        raise ValueError(where + ': a menu element must be an object')
+    for key in ("name", "type"):
+        if not isinstance(definition.get(key), str):
+            raise ValueError(where + ': "' + key + '" must be a string')
+    if len(definition["name"]) > LCD_COLUMNS:
+        raise ValueError(where + ': name longer than %d characters' % LCD_COLUMNS)
+    if definition["type"] not in ELEMENT_TYPES:
+        raise ValueError(where + ': unknown type ' + definition["type"])
+    if not isinstance(definition.get("content", ""), str):
+        raise ValueError(where + ': "content" must be a string')
+
+
+def load_menu_definition(path):
+    """
+    Loads and validates a JSON menu definition:
+    {"menu": [{"name": ..., "type": ..., "content": ..., "sub": [{"name": ..., "type": ..., "content": ...}]}]}
+    :param path: JSON file path
+    :return: list of top element definitions
+    :raise ValueError: if the definition is malformed
+    """
+    with open(path) as f:
+        definition = json.load(f)
+    top_elements = definition.get("menu") if isinstance(definition, dict) else None
+    if not isinstance(top_elements, list) or not top_elements:
+        raise ValueError(path + ': "menu" must be a non empty list')
+    for i, top in enumerate(top_elements):
+        where = '%s: menu[%d]' % (path, i)
+        _check_element(top, where)
+        sub_elements = top.get("sub", [])
+        if not isinstance(sub_elements, list):
+            raise ValueError(where + ': "sub" must be a list')
+        for j, sub in enumerate(sub_elements):
+            _check_element(sub, '%s.sub[%d]' % (where, j))
+    return top_elements
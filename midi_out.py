@@ -0,0 +1,180 @@
+import os
+import time
+
+from drawbars_state import DrawbarsState, NUM_DRAWBARS, DRAWBAR_CC_FIRST
+from telemetry import LatencyStats
+
+MIDI_CONTROL_CHANGE = 0xB0
+ALSA_PORT_NAME = 'B3 upper control panel'
+
+
+class MidiBackend:
+    """
+    Destination of MIDI bytes. send() receives complete messages, possibly several at once.
+    """
+    def send(self, data: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class AlsaSeqBackend(MidiBackend):
+    """
+    ALSA sequencer virtual output port, to be connected to setBfree's input (aconnect or setBfree autoconnect).
+    """
+    def __init__(self, port_name=ALSA_PORT_NAME):
+        try:
+            import rtmidi  # python-rtmidi, imported only when this backend is used
+        except ImportError:
+            raise RuntimeError('the ALSA sequencer MIDI backend requires python-rtmidi')
+        self.midi_out = rtmidi.MidiOut(rtmidi.API_LINUX_ALSA)
+        self.midi_out.open_virtual_port(port_name)
+
+    def send(self, data: bytes):
+        # rtmidi sends one message per call: split the running status burst
+        status = data[0]
+        for i in range(1, len(data), 2):
+            self.midi_out.send_message((status, data[i], data[i + 1]))
+
+    def close(self):
+        self.midi_out.close_port()
+
+
+class RawMidiBackend(MidiBackend):
+    """
+    ALSA raw MIDI device, e.g. a snd-virmidi port which setBfree reads from.
+    """
+    def __init__(self, path):
+        # opened without waiting for a busy device, then written blocking: the flushed changes
+        # are already cleared when send() is called, so no byte may be left unwritten
+        self.fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        os.set_blocking(self.fd, True)
+
+    def send(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view):]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileMidiBackend(MidiBackend):
+    """
+    Appends the raw MIDI bytes to a file.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'ab', buffering=0)
+
+    def send(self, data: bytes):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+class LoopbackMidiBackend(MidiBackend):
+    """
+    Keeps the sent bytes in memory, with their time.perf_counter() timestamps.
+    """
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data: bytes):
+        self.sent.append((time.perf_counter(), bytes(data)))
+
+
+def open_midi_backend(spec):
+    """
+    :param spec: 'alsa', 'raw:<device path>', 'file:<path>' or 'loopback'
+    :return: MidiBackend
+    """
+    kind, _, path = spec.partition(':')
+    if kind == 'alsa':
+        return AlsaSeqBackend(path or ALSA_PORT_NAME)
+    if kind == 'raw':
+        return RawMidiBackend(path)
+    if kind == 'file':
+        return FileMidiBackend(path)
+    if kind == 'loopback':
+        return LoopbackMidiBackend()
+    raise ValueError('unknown MIDI backend: ' + spec)
+
+
+class DrawbarMidiForwarder:
+    """
+    Forwards the drawbar changes of the active registration to setBfree as MIDI CCs.
+    Changes are held for one tick: several moves of a drawbar within a tick are
+    coalesced to the latest value, and all the drawbars changed during the tick
+    are sent in one running status burst.
+    """
+    def __init__(self, state: DrawbarsState, backend: MidiBackend, loop, channel=0, tick=0.003):
+        """
+        :param state: drawbars model to subscribe to
+        :param backend: MIDI destination
+        :param loop: event loop the drawbar changes are notified in
+        :param channel: MIDI channel of the upper manual (0 based)
+        :param tick: coalescing delay in seconds
+        """
+        self.state = state
+        self.backend = backend
+        self.loop = loop
+        self.channel = channel
+        self.tick = tick
+        self.pending = [-1] * NUM_DRAWBARS  # value to send for each drawbar, -1 if none
+        self.received = [0.0] * NUM_DRAWBARS  # perf_counter() of the first pending change
+        self.flush_handle = None
+        self.latency = LatencyStats()
+        self.sent_messages = 0
+        self.coalesced = 0
+        state.subscribe(self.on_drawbar_changed)
+
+    def on_drawbar_changed(self, registration, drawbar, value):
+        if registration != self.state.active:
+            return
+        if self.pending[drawbar] < 0:
+            self.received[drawbar] = time.perf_counter()
+        else:
+            self.coalesced += 1
+        self.pending[drawbar] = value
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.tick, self.flush)
+
+    def flush(self):
+        """
+        Sends the pending drawbar changes.
+        """
+        self.flush_handle = None
+        burst = bytearray((MIDI_CONTROL_CHANGE | self.channel,))
+        first_received = []
+        for drawbar in range(NUM_DRAWBARS):
+            value = self.pending[drawbar]
+            if value >= 0:
+                burst += bytes((DRAWBAR_CC_FIRST + drawbar, value))
+                first_received.append(self.received[drawbar])
+                self.pending[drawbar] = -1
+        if not first_received:
+            return
+        self.backend.send(bytes(burst))
+        sent = time.perf_counter()
+        for received in first_received:
+            self.latency.add(sent - received)
+        self.sent_messages += len(first_received)
+
+    def recall(self, burst):
+        """
+        Sends a whole registration in one write, replacing the pending drawbar changes.
+        :param burst: precomputed MIDI bytes, see presets.Preset
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.pending[:] = [-1] * NUM_DRAWBARS
+        self.backend.send(burst)
+
+    def close(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush()
+        self.state.unsubscribe(self.on_drawbar_changed)
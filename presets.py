@@ -0,0 +1,129 @@
+import os
+import struct
+from array import array
+
+from drawbars_state import DrawbarsState, NUM_REGISTRATIONS, NUM_DRAWBARS, DRAWBAR_CC_FIRST, MIDI_MAX
+from midi_out import MIDI_CONTROL_CHANGE
+
+PRESETS_MAGIC = b'B3PR'
+PRESETS_VERSION = 1
+HEADER = struct.Struct('<4sBB')  # magic, version, number of presets
+RECORD = struct.Struct('<9s')  # 9 drawbars
+
+
+class Preset:
+    """
+    Drawbars of a registration and the MIDI burst recalling them,
+    computed once each time the drawbars change.
+    """
+    __slots__ = ('drawbars', 'burst')
+
+    def __init__(self, drawbars=bytes(NUM_DRAWBARS)):
+        self.drawbars = bytearray(drawbars)
+        self.burst = b''
+
+    def pack(self):
+        return RECORD.pack(bytes(self.drawbars))
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        return cls(RECORD.unpack_from(data, offset)[0])
+
+    def compute_burst(self, channel=0):
+        """
+        Precomputes the running status CC burst setting setBfree to this preset.
+        :param channel: MIDI channel of the upper manual (0 based)
+        """
+        burst = bytearray((MIDI_CONTROL_CHANGE | channel,))
+        for drawbar, value in enumerate(self.drawbars):
+            burst += bytes((DRAWBAR_CC_FIRST + drawbar, value))
+        self.burst = bytes(burst)
+
+
+class PresetStore:
+    """
+    Registrations presets, persisted in one small binary file.
+    Drawbar moves are captured from the drawbars state and saved after a quiet period.
+    """
+    def __init__(self, path, state: DrawbarsState, loop, channel=0, save_delay=2.0):
+        """
+        :param path: presets file path
+        :param state: drawbars model; loaded with the presets drawbars and watched for changes
+        :param loop: event loop used to delay saving
+        :param channel: MIDI channel of the upper manual (0 based)
+        :param save_delay: seconds without change before the presets are saved
+        """
+        self.path = path
+        self.state = state
+        self.loop = loop
+        self.channel = channel
+        self.save_delay = save_delay
+        self.save_handle = None
+        self.presets = self.load()
+        for registration, preset in enumerate(self.presets):
+            preset.compute_burst(channel)
+            start = registration * NUM_DRAWBARS
+            state.values[start:start + NUM_DRAWBARS] = array('B', preset.drawbars)
+        state.subscribe(self.on_drawbar_changed)
+
+    def load(self):
+        """
+        :return: list of NUM_REGISTRATIONS presets, defaults if the file is missing or invalid
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, version, count = HEADER.unpack_from(data)
+            if magic != PRESETS_MAGIC or version != PRESETS_VERSION or count != NUM_REGISTRATIONS:
+                raise ValueError('unsupported presets file')
+            if len(data) != HEADER.size + count * RECORD.size:
+                raise ValueError('presets file size does not match its records')
+            presets = [Preset.unpack(data, HEADER.size + i * RECORD.size) for i in range(count)]
+            # a value above MIDI_MAX would be sent as a MIDI status byte in the recall burst
+            if any(value > MIDI_MAX for preset in presets for value in preset.drawbars):
+                raise ValueError('drawbar value out of range')
+            return presets
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as exc:
+            print('presets file ' + self.path + ' ignored: ' + repr(exc))
+        return [Preset() for _ in range(NUM_REGISTRATIONS)]
+
+    def save(self):
+        """
+        Writes the presets file atomically.
+        """
+        self.save_handle = None
+        data = HEADER.pack(PRESETS_MAGIC, PRESETS_VERSION, len(self.presets)) + b''.join(
+            preset.pack() for preset in self.presets)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, self.path)
+
+    def changed(self, registration):
+        """
+        Recomputes the burst of a modified preset and schedules saving.
+        :param registration: 0 or 1
+        """
+        self.presets[registration].compute_burst(self.channel)
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+        self.save_handle = self.loop.call_later(self.save_delay, self.save)
+
+    def on_drawbar_changed(self, registration, drawbar, value):
+        self.presets[registration].drawbars[drawbar] = value
+        self.changed(registration)
+
+    def burst(self, registration):
+        """
+        :param registration: 0 or 1
+        :return: precomputed MIDI bytes recalling the whole registration
+        """
+        return self.presets[registration].burst
+
+    def close(self):
+        if self.save_handle is not None:
+            self.save_handle.cancel()
+            self.save()
+        self.state.unsubscribe(self.on_drawbar_changed)
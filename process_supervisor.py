@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+# CPUs this program may use, read at import: once isolate() pins the panel, the affinity of this process
+# only tells its own cores, and child processes inherit them
+AVAILABLE_CPUS = frozenset(os.sched_getaffinity(0))
+
+# a process found in one of these states is restarted: zombie, stopped, traced, dead
+UNHEALTHY_STATES = ('Z', 'T', 't', 'X')
+
+
+class ProcessStats:
+    """
+    CPU usage and context switches of a process and all its threads, read from /proc.
+    """
+    def __init__(self, pid):
+        self.pid = pid
+        self.state = '?'
+        self.cpu_percent = 0.0  # of one core, since the previous sample
+        self.voluntary_switches = 0
+        self.involuntary_switches = 0
+        self.previous = None  # (CPU seconds, time.monotonic())
+
+    def sample(self):
+        """
+        Reads the process counters; call it periodically.
+        :raise OSError: if the process does not exist anymore
+        """
+        with open('/proc/%d/stat' % self.pid) as f:
+            # the command name may contain spaces: fields are counted from its closing parenthesis
+            fields = f.read().rpartition(')')[2].split()
+        self.state = fields[0]
+        cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime, all threads
+        now = time.monotonic()
+        if self.previous is not None and now > self.previous[1]:
+            self.cpu_percent = 100.0 * (cpu - self.previous[0]) / (now - self.previous[1])
+        self.previous = (cpu, now)
+
+        voluntary = involuntary = 0
+        for tid in os.listdir('/proc/%d/task' % self.pid):
+            try:
+                with open('/proc/%d/task/%s/status' % (self.pid, tid)) as f:
+                    for line in f:
+                        if line.startswith('voluntary_ctxt_switches'):
+                            voluntary += int(line.split()[1])
+                        elif line.startswith('nonvoluntary_ctxt_switches'):
+                            involuntary += int(line.split()[1])
+            except FileNotFoundError:
+                pass  # the thread ended meanwhile
+        # threads which ended take their counts with them: never let the totals go backwards
+        self.voluntary_switches = max(self.voluntary_switches, voluntary)
+        self.involuntary_switches = max(self.involuntary_switches, involuntary)
+
+
+def isolate(pid, cpus=None, rt_priority=None, nice=None):
+    """
+    Applies CPU affinity and scheduling settings to every thread of a process, as far as permitted.
+    Threads already running under a real-time policy (e.g. JACK clients) keep it; the nice level
+    only matters to the others.
+    :param pid: process id, 0 for this process
+    :param cpus: set of CPU numbers the process may run on; CPUs outside AVAILABLE_CPUS are ignored
+    :param rt_priority: SCHED_FIFO priority 1-99, None to keep the default policy
+    :param nice: nice level, -20 to 19; lowering it needs privileges
+    :return: list of the settings which could not be applied
+    """
+    failed = []
+    pid = pid or os.getpid()
+    if cpus is not None:
+        cpus = set(cpus) & AVAILABLE_CPUS or None
+    # on Linux, affinity, policy and nice level belong to each thread
+    for tid in os.listdir('/proc/%d/task' % pid):
+        tid = int(tid)
+        try:
+            if cpus is not None and os.sched_getaffinity(tid) != cpus:
+                os.sched_setaffinity(tid, cpus)
+            if rt_priority is not None and os.sched_getscheduler(tid) == os.SCHED_OTHER:
+                os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(rt_priority))
+            if nice is not None and os.getpriority(os.PRIO_PROCESS, tid) != nice:
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except ProcessLookupError:
+            pass  # the thread ended meanwhile
+        except PermissionError as exc:
+            failed.append('thread %d: %s' % (tid, exc.strerror))
+    return failed
+
+
+class ProcessSupervisor:
+    """
+    Runs a command, e.g. setBfree, and keeps it running: it is restarted when it exits
+    or is found in an unhealthy state, after a delay growing with successive quick failures.
+    Its CPU affinity and scheduling are applied to all its threads, including those created later.
+    """
+    def __init__(self, command, loop, cpus=None, rt_priority=None, nice=None, check_interval=2.0,
+                 restart_delay=1.0, max_restart_delay=30.0, stable_time=60.0, companions=()):
+        """
+        :param command: program and arguments
+        :param loop: event loop
+        :param cpus: set of CPU numbers the process runs on, see isolate()
+        :param rt_priority: SCHED_FIFO priority, see isolate()
+        :param nice: nice level, see isolate()
+        :param check_interval: seconds between two health checks and statistics samples
+        :param restart_delay: delay before the first restart, in seconds; doubled after each quick failure
+        :param max_restart_delay: longest delay before a restart, in seconds
+        :param stable_time: run time in seconds after which a failure is not a quick failure anymore
+        :param companions: other ProcessStats sampled along, e.g. the supervising process'
+        """
+        self.command = list(command)
+        self.loop = loop
+        self.cpus = cpus
+        self.rt_priority = rt_priority
+        self.nice = nice
+        self.check_interval = check_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_time = stable_time
+        self.companions = companions
+        self.process = None
+        self.stats = None
+        self.restarts = 0
+        self.running = False
+        self.task = None
+
+    def start(self):
+        """
+        Starts supervising in the event loop.
+        """
+        self.running = True
+        self.task = self.loop.create_task(self._supervise())
+
+    async def _supervise(self):
+        delay = self.restart_delay
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.process = await asyncio.create_subprocess_exec(*self.command)
+            except OSError as exc:
+                print('cannot start %s: %r' % (self.command[0], exc))
+            else:
+                self.stats = ProcessStats(self.process.pid)
+                try:
+                    failed = isolate(self.process.pid, self.cpus, self.rt_priority, self.nice)
+                except OSError:
+                    failed = []  # exited meanwhile: _watch() returns its status at once
+                if failed:
+                    print('%s isolation incomplete: %s' % (self.command[0], '; '.join(failed)))
+                returncode = await self._watch()
+                if not self.running:
+                    return
+                print('%s exited with status %s' % (self.command[0], returncode))
+            if time.monotonic() - started >= self.stable_time:
+                delay = self.restart_delay
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, self.max_restart_delay)
+            self.restarts += 1
+
+    async def _watch(self):
+        """
+        Waits for the process to exit, checking its health and sampling its statistics meanwhile.
+        :return: exit status
+        """
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(self.process.wait()), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            for stats in self.companions:
+                stats.sample()
+            try:
+                self.stats.sample()
+                isolate(self.process.pid, self.cpus, self.rt_priority, self.nice)  # threads created meanwhile
+            except OSError:
+                continue  # exited meanwhile: wait() returns at once
+            if self.stats.state in UNHEALTHY_STATES:
+                print('%s is in state %s, killing it' % (self.command[0], self.stats.state))
+                self.process.kill()
+
+    async def stop(self, timeout=3.0):
+        """
+        Terminates the process, killing it if it does not exit within timeout seconds.
+        """
+        self.running = False
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self.task is not None:
+            self.task.cancel()
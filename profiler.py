@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# leaf functions of threads waiting for work; their samples are counted as idle, not written
+IDLE_FUNCTIONS = {
+    ('selectors.py', 'select'),  # event loop waiting for I/O or a timer
+    ('threading.py', 'wait'),  # condition and event waits, e.g. the LCD writer queue
+    ('threading.py', '_wait_for_tstate_lock'),  # thread joins
+    ('thread.py', '_worker'),  # executor workers waiting for a job
+    ('queue.py', 'get'),
+}
+
+
+def timestamped(directory, prefix, extension):
+    """
+    :return: path of a new file in directory, created if needed, named after the current time
+    """
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, '%s-%s.%s' % (prefix, time.strftime('%Y%m%d-%H%M%S'), extension))
+
+
+class StackSampler:
+    """
+    Statistical profiler: a thread reads the Python stacks of all the other threads at a fixed interval
+    and counts them. The profiled code is not instrumented; each sample holds the GIL for the time
+    needed to walk the stacks, tens of microseconds for the panel threads.
+    The result is written in the collapsed stack format of flamegraph.pl and speedscope:
+    one line per stack, thread name first, frames separated by semicolons, then the sample count.
+    """
+    def __init__(self, interval=0.01):
+        """
+        :param interval: seconds between two samples
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.started = 0.0
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        self.stacks = Counter()
+        self.samples = self.idle_samples = 0
+        self.started = time.monotonic()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name='stack sampler', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        labels = {}  # code object: frame label, built once
+        while not self.stopping.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+                    stack.append(label)
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name.replace(' ', '_') for thread in threading.enumerate()}
+                stack.append(names.get(ident, 'thread'))
+                stack.reverse()
+                self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+    def stop(self):
+        """
+        :return: Counter of the sampled stacks, see write_collapsed()
+        """
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        return self.stacks
+
+
+def write_collapsed(stacks, path):
+    """
+    :param stacks: Counter of the collapsed stacks returned by StackSampler.stop()
+    :param path: output file
+    """
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write('%s %d\n' % (stack, count))
+
+
+class MemoryTracker:
+    """
+    Follows memory growth with tracemalloc. Tracing starts with the first snapshot and goes on,
+    at the cost of slower allocations; each following snapshot is compared with the previous one.
+    """
+    def __init__(self, frames=1, top=30):
+        """
+        :param frames: frames kept per allocation; more tell who called, at a higher cost
+        :param top: number of allocation sites written
+        """
+        self.frames = frames
+        self.top = top
+        self.previous = None
+        self.lock = threading.Lock()  # snapshots are taken in executor threads
+
+    def snapshot(self, path):
+        """
+        Takes a snapshot and writes the allocation sites whose size changed most since the previous one,
+        or the largest ones on the first snapshot.
+        :param path: output file
+        """
+        with self.lock:
+            self._snapshot(path)
+
+    def _snapshot(self, path):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w') as f:
+            f.write('traced memory: %.1f KiB, peak %.1f KiB\n' % (current / 1024, peak / 1024))
+            if self.previous is None:
+                f.write('largest allocation sites since tracing started:\n')
+                statistics = snapshot.statistics('lineno')
+            else:
+                f.write('allocation sites whose size changed most since the previous snapshot:\n')
+                statistics = snapshot.compare_to(self.previous, 'lineno')
+            for statistic in statistics[:self.top]:
+                f.write('%s\n' % statistic)
+        self.previous = snapshot
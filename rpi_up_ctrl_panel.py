@@ -19,53 +19,133 @@ Selection of the following setBfree settings:
 - Leslie Filters    :
 """
 import os
-import sys
 import subprocess
 import time
 import asyncio
-import serial
-import serial_asyncio
-
-from gpiozero import LED
-from gpiozero import Button
-from gpiozero import RotaryEncoder
-
-from signal import pause
-from drawbars_pos_reader import DrawbarsAsyncReader
+import argparse
+import functools
+import importlib
+import shlex
+
+from arduino_link import ArduinoLink
+from arduino_protocol import REGISTRATION, LEDS_OFF
+from drawbars_state import DrawbarsState, drawbar_position, NUM_REGISTRATIONS
+from drawbar_filter import DrawbarFilter
+from midi_out import DrawbarMidiForwarder, open_midi_backend
+from presets import PresetStore
+from encoder_input import EncoderAccumulator
+from setbfree_control import SetBfreeControl
+import telemetry
+import event_trace
+import state_bus
+import profiler
+from process_supervisor import ProcessSupervisor, ProcessStats, isolate, AVAILABLE_CPUS
 
 from i2c_lcd import Lcd
-from signal import signal, SIGINT
-from sys import exit
+import lcd_glyphs
+from system_metrics import SystemMetrics
+from setbfree_catalog import SetBfreeCatalog
+from menu_element import MenuElement, load_menu_definition
+from lcd_framebuffer import LcdFrameBuffer
+from lcd_writer import LcdWriter, INTERACTIVE, BACKGROUND
+from signal import SIGINT, SIGUSR1, SIGUSR2
 
 
 DRAWBARS_TTY = '/dev/ttyACM0'
+ARDUINO_RECONNECT_DELAY = 2.0  # seconds between two attempts to open the serial link once it is lost
 
-current_volume_value = 0
+# written once the LCD controller is initialized; /run is emptied at boot, so a restart
+# of this script finds it and skips the long controller init sequence
+LCD_READY_MARKER = '/run/b3_clone_lcd_ready'
+
+# how long the welcome screen stays, unless the menu knob is turned meanwhile
+WELCOME_TIME = 3.0
+
+# after a replay, time for the pending encoder frames and MIDI ticks to be processed
+REPLAY_SETTLE_TIME = 0.1
+
+# where drawbar changes are sent to setBfree, see midi_out.open_midi_backend()
+MIDI_OUTPUT = 'alsa'
 
-# shut down the organ if ON/OFF switch is held OFF (closed) at least 3 seconds
-power_on_off_switch = Button(9, hold_time=3.0)
+# snap the drawbars to their 9 positions, as on the organ; else only the ADC noise is filtered out
+DRAWBAR_QUANTIZE = True
 
-registration_led_1 = LED(6)  # shows registration 1 is active
-registration_led_2 = LED(8)  # shows registration 2 is active
+# optional declarative menu; the built-in menu of add_menu_items() is used if it does not exist
+MENU_DEFINITION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'menu.json')
 
-registration_sel_1 = Button(5)  # registration 1 selection push button
-registration_sel_2 = Button(7)  # registration 2 selection push button
+# latency and counters in the Prometheus text format, served on localhost only, see telemetry.serve()
+METRICS_PORT = 9108
 
-MAX_VOLUME = 16
+# setBfree, when this script supervises it (--supervise); the audio and the panel run on disjoint cores
+# so that menu refreshes and subprocesses never preempt the synth. Settings which are not permitted,
+# e.g. SCHED_FIFO without CAP_SYS_NICE, or CPUs the computer lacks, are skipped.
+SETBFREE_COMMAND = 'setBfree'
+SETBFREE_CPUS = {1, 2, 3}
+SETBFREE_RT_PRIORITY = 10  # SCHED_FIFO, below the JACK process thread
+SETBFREE_NICE = -10  # for the threads left under the default policy
+PANEL_CPUS = {0}
+PANEL_NICE = 5
 
-# volume control of the IQaudio pre-amp; used here to display vol level on LCD
-volume_rotary = RotaryEncoder(23, 24, max_steps=MAX_VOLUME, bounce_time=0.10)
+# the registration, volume, reverb and drawbars are published there for the other panels, see state_bus.py;
+# the interface address selects the network, '0.0.0.0' follows the routes
+STATE_BUS_INTERFACE = '0.0.0.0'
 
-MAX_REVERB = 16
-# sets the setBfree reverb level
-reverb_rotary = RotaryEncoder(25, 26, max_steps=MAX_REVERB, bounce_time=0.10)
+# flame graph stacks and memory growth reports, written on kill -USR1 / kill -USR2 <pid>, see profiler.py
+PROFILE_DIR = '/tmp/b3_clone_profiles'
 
-ARDUINO_SYNC = b'0\n'
+# setBfree configuration and program bank listed in the Tuning, Vibrato, Percussions, Analog Model and
+# Leslie menus; their index is cached until they change
+SETBFREE_CONFIG = '/home/pi/.config/setBfree/default.cfg'
+SETBFREE_PROGRAMS = '/home/pi/.config/setBfree/default.pgm'
+CATALOG_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'setbfree_catalog.cache')
 
-# for synchronous communication with the Arduino (write to Arduino)
-sync_serial = None
+# registrations presets, saved when the drawbars stop moving
+PRESETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'presets.bin')
+
+current_volume_value = 0
+current_reverb_value = 0
+volume_input = None  # volume knob detents, delivered once per frame
+reverb_input = None  # reverb knob detents, delivered once per frame
+
+MAX_VOLUME = 80  # one pixel column of the bar graph per detent
+MAX_REVERB = 80
+INITIAL_VOLUME = MAX_VOLUME // 4  # sent to setBfree on power up: low, but the organ is not muted
+
+# GPIO devices, created by init_gpio() so that importing this module needs no hardware
+power_on_off_switch = None  # shuts down the organ if held OFF (closed) at least 3 seconds
+registration_led_1 = None  # shows registration 1 is active
+registration_led_2 = None  # shows registration 2 is active
+registration_sel_1 = None  # registration 1 selection push button
+registration_sel_2 = None  # registration 2 selection push button
+volume_rotary = None  # sets the setBfree output level and displays it on the LCD
+reverb_rotary = None  # sets the setBfree reverb level
+menu_rotary = None  # LCD menus navigation rotary encoder
+menu_push = None  # LCD menus selection and operation button
+
+# the serial link with the Arduino, for both drawbars reading and commands writing
+arduino = None
+loop = None  # the event loop every callback and task runs in
+menu_task = None  # periodic menu refresh
+metrics = SystemMetrics()  # System and Network menus values, sampled in the background
+catalog = SetBfreeCatalog(SETBFREE_CONFIG, SETBFREE_PROGRAMS, CATALOG_CACHE)  # setBfree settings menus
+drawbars = DrawbarsState()  # upper manual drawbars of both registrations
+midi_backend = None  # MIDI output to setBfree, shared by the drawbars forwarder and the setBfree control
+midi_forwarder = None  # sends drawbar changes to setBfree
+presets = None  # registrations presets and their precomputed MIDI bursts
+setbfree = None  # rate-limited volume and reverb control of setBfree
 lcd = None
+screen = None  # frame buffer of the LCD; only drawn by the writer thread
+writer = None  # the LCD writer thread; every other thread submits draw requests to it
 menu = None
+registry = None  # metrics exposed on METRICS_PORT
+time_to_interactive = None  # seconds from process start to the panel answering its controls
+recorder = None  # input events recorder when started with --record, see event_trace
+supervisor = None  # keeps setBfree running when started with --supervise
+panel_stats = ProcessStats(os.getpid())  # CPU usage and context switches of this script
+publisher = None  # publishes the panel state on the state bus
+stack_sampler = profiler.StackSampler()  # started and stopped by SIGUSR1
+memory_tracker = profiler.MemoryTracker()  # snapshot on SIGUSR2
+profile_dir = PROFILE_DIR
 
 
 class Menu:
@@ -75,8 +155,8 @@ class Menu:
     is under control of a rotary encoder. The push button of the
     rotary encoder is used to select a menu item.
     """
-    def __init__(self, lcd) -> None:
-        self.lcd = lcd
+    def __init__(self, writer: LcdWriter) -> None:
+        self.writer = writer
 
     menu = list()
     top = 0
@@ -85,20 +165,19 @@ class Menu:
     element = None
     isInterrupted = False
     stepScroll = 0
-    menu_rotary = RotaryEncoder(0, 1, bounce_time=0.10)  # LCD menus navigation rotary encoder
-    menu_push = Button(4)  # LCD menus selection and operation button
-
 
-    def menus_forward(self):
-        print('rotating menu forward')
-        self.next_top_element()
-        time.sleep(.3)
-
-
-    def menus_backward(self):
-        print('rotating menu backward')
-        self.prev_top_element()
 
+    def menus_rotated(self, delta):
+        """
+        Moves through the top menu elements by the net number of detents of one frame.
+        :param delta: positive forward, negative backward
+        """
+        print('rotating menu by %d' % delta)
+        if len(self.menu) > 0:
+            self.top = (self.top + delta) % len(self.menu)
+            self.sub = 0
+            self.element = self.menu[self.top]
+        asyncio.ensure_future(self.handle_menu(INTERACTIVE, self.rotary_input.received))
 
     def menus_button_pressed(self):
         print('menus_button_pressed')
@@ -110,29 +189,75 @@ class Menu:
         :param name: 
         :param element_type: 
         :param content: 
-        :return Dictionary {Name: Sub: Element_type: Content}: 
+        :return MenuElement whose first sub-element is itself:
         """
-        sublist = list()
-        subelement = self.sub_element(name, element_type, content)
-        sublist.append(subelement)
-        return {
-            "Name": name,
-            "Sub": sublist,
-            "Type": element_type,
-            "Content": content}
+        element = self.sub_element(name, element_type, content)
+        element.sub.append(self.sub_element(name, element_type, content))
+        return element
 
-    @staticmethod
-    def sub_element(name, element_type, content):
+    def sub_element(self, name, element_type, content):
         """
         :param name: 
         :param element_type: 
         :param content: 
-        :return: Dictionary {Name: Element_type: Content}: 
+        :return: MenuElement
+        """
+        return MenuElement(name, element_type, content, *self.resolve(element_type, content))
+
+    @staticmethod
+    def resolve(element_type, content):
+        """
+        Turns an element content into the callable rendering it, once and for all.
+        :param element_type: one of menu_element.ELEMENT_TYPES
+        :param content: element definition
+        :return: (render callable, True if the callable blocks, CGRAM glyph set the text uses or None)
+        :raise ValueError: if the content refers to an unknown function or metric
+        """
+        if element_type == "STRING":
+            return (lambda: content), False, None
+
+        if element_type in ("VOLUME", "REVERB", "FUNCTION"):
+            function = globals().get(content.rstrip("()"))
+            if not callable(function):
+                raise ValueError('unknown menu function: ' + content)
+            if element_type != "FUNCTION":
+                return function, False, lcd_glyphs.HORIZONTAL_BAR
+            return function, False, getattr(function, 'glyphs', None)
+
+        if element_type == "METRIC":
+            if content not in metrics.intervals:
+                raise ValueError('unknown metric: ' + content)
+            return (lambda: metrics.get(content)), False, None
+
+        if element_type == "PYTHON3":
+            code = compile(content, '<menu>', 'eval')
+            return (lambda: str(eval(code, globals()))), False, None
+
+        if element_type == "BASH":
+            return (lambda: subprocess.getoutput(content)), True, None
+
+        if element_type == "CATALOG":
+            # the files are indexed at start up: rendering is a dictionary lookup
+            return (lambda: catalog.value(content)), False, None
+
+        raise ValueError('unknown menu element type: ' + element_type)
+
+    def load(self, top_elements):
         """
-        return {
-            "Name": name,
-            "Type": element_type,
-            "Content": content}
+        Adds the elements of a menu definition returned by load_menu_definition().
+        All of them are resolved before any is added, so that an invalid definition leaves the menu unchanged.
+        :param top_elements: list of top element definitions
+        :raise ValueError: if an element refers to an unknown function or metric
+        :raise SyntaxError: if a PYTHON3 element is not a valid expression
+        """
+        loaded = []
+        for top in top_elements:
+            top_element = self.top_element(top["name"], top["type"], top.get("content", ""))
+            for sub in top.get("sub", []):
+                self.add_sub_element(top_element, self.sub_element(sub["name"], sub["type"], sub.get("content", "")))
+            loaded.append(top_element)
+        for top_element in loaded:
+            self.add_top_element(top_element)
 
     def return_to_top_element(self):
         global element
@@ -162,8 +287,8 @@ class Menu:
         :param top_element: 
         :param sub_element: 
         """
-        if sub_element not in top_element["Sub"]:
-            top_element["Sub"].append(sub_element)
+        if sub_element not in top_element.sub:
+            top_element.sub.append(sub_element)
 
     def return_element(self):
         """
@@ -182,7 +307,7 @@ class Menu:
         if len(msg) > 16:
             self.stepScroll = len(msg) - 16
             if self.count <= 10 & self.stepScroll <= 0:
-                self.lcd.scrollDisplayLeft()
+                self.writer.screen.lcd.scrollDisplayLeft()
                 self.stepScroll -= 1
             if self.count > 10:
                 print("la")
@@ -195,7 +320,7 @@ class Menu:
             self.top = (self.top + 1) % len(self.menu)
             self.sub = 0
             self.element = self.menu[self.top]
-        self.handle_menu()
+        asyncio.ensure_future(self.handle_menu(INTERACTIVE))
 
     def prev_top_element(self):
         """
@@ -207,19 +332,19 @@ class Menu:
             if self.top < 0:
                 self.top = len(self.menu) - 1
             self.element = self.menu[self.top]
-        self.handle_menu()
+        asyncio.ensure_future(self.handle_menu(INTERACTIVE))
 
     def next_sub_element(self):
         """
         :param lcd: 
         """
         top_el = self.menu[self.top]
-        if len(top_el["Sub"]) > 0:
+        if len(top_el.sub) > 0:
             self.sub += 1
-            if self.sub >= len(top_el["Sub"]):
+            if self.sub >= len(top_el.sub):
                 self.sub = 0
-            self.element = top_el["Sub"][self.sub]
-        self.handle_menu()
+            self.element = top_el.sub[self.sub]
+        asyncio.ensure_future(self.handle_menu(INTERACTIVE))
 
     def prev_sub_element(self):
         """
@@ -227,74 +352,121 @@ class Menu:
         """
         top_el = self.menu[self.top]
 
-        if len(top_el["Sub"]) > 0:
+        if len(top_el.sub) > 0:
             self.sub -= 1
             if self.sub < 0:
-                self.sub = len(top_el["Sub"]) - 1
-            self.element = top_el["Sub"][self.sub]
-        self.handle_menu()
+                self.sub = len(top_el.sub) - 1
+            self.element = top_el.sub[self.sub]
+        asyncio.ensure_future(self.handle_menu(INTERACTIVE))
 
-    def handle_menu(self):
+    async def handle_menu(self, priority=BACKGROUND, since=None):
         """
-        Executes the command associated with the current menu element.
+        Renders the current menu element and queues the resulting screen to the LCD writer.
+        Blocking renderers (shell commands) run in the default executor so the event loop is never blocked.
+        :param priority: INTERACTIVE when called from navigation, else BACKGROUND
+        :param since: time.perf_counter() of the event the screen shows, for the display latency
         """
-        msg = ""
-
-        if self.element["Type"] == "VOLUME" or self.element["Type"] == "REVERB":
-            self.lcd.set_cursor(0, 0)
-            self.lcd.println(self.element["Name"])
-            self.lcd.set_cursor(1, 0)
-            msg = str(eval(self.element["Content"]))
-            return
+        element = self.element
 
-        elif self.element["Type"] == "STRING":
-            self.lcd.set_cursor(0, 0)
-            self.lcd.println(self.element["Name"])
-            self.lcd.set_cursor(1, 0)
-            self.lcd.println(self.element["Content"])
-            return
+        if element.blocking:
+            msg = await asyncio.get_running_loop().run_in_executor(None, element.render)
+            if element is not self.element:
+                return  # the user moved to another element meanwhile
+        else:
+            msg = element.render()
 
-        elif self.element["Type"] == "PYTHON3":
-            msg = str(eval(self.element["Content"]))
+        name = element.name
+        glyphs = element.glyphs
 
-        elif self.element["Type"] == "BASH":
-            msg = subprocess.getoutput(self.element["Content"])
+        def draw(screen):
+            if glyphs is not None:
+                screen.use_glyphs(glyphs)
+            screen.write_line(0, name)
+            screen.write_line(1, msg)
 
-        self.lcd.clear()
-        self.lcd.set_cursor(0, 0)
-        self.lcd.println(self.element["Name"])
-        self.lcd.set_cursor(1, 0)
-        self.lcd.println(msg)
+        self.writer.submit(draw, priority, key='menu', since=since)
 
     def initialize(self):
         """
         Associates menu rotary encoder and switch actions with callbacks.
-        Displays the first menu item.
+        Selects the first menu item.
         """
         global isInterrupted
-        self.menu_rotary.when_rotated_clockwise = self.menus_forward
-        self.menu_rotary.when_rotated_counter_clockwise = self.menus_backward
-        self.menu_push.when_pressed = self.menus_button_pressed
-
-        self.lcd.clear()
+        # no acceleration: every detent moves to the next element
+        self.rotary_input = EncoderAccumulator(menu_rotary, self.menus_rotated, loop, max_factor=1,
+                                               on_detents=detents_tracer('menu'))
+        menu_push.when_pressed = traced('menu_push', threadsafe(self.menus_button_pressed))
 
         self.first_top_element()
 
+    async def refresh(self, period=0.3, delay=0.0):
+        """
+        Periodically redraws the current menu element; runs as an event loop task.
+        :param period: delay between two refreshes in seconds
+        :param delay: delay before the first refresh in seconds
+        """
+        await asyncio.sleep(delay)
         while True:
-            self.handle_menu()
-            time.sleep(0.3)
-    
+            await self.handle_menu()
+            await asyncio.sleep(period)
+
+
+def init_gpio(bounce_time=0.10):
+    """
+    Creates the GPIO devices of the board.
+    gpiozero is imported here: its import and the pins setup take a while, and run in parallel
+    with the LCD initialization.
+
+    Args:
+        bounce_time (float, optional): rotary encoders debounce time in seconds. Defaults to 0.10.
+    """
+    global power_on_off_switch, registration_led_1, registration_led_2, registration_sel_1, registration_sel_2
+    global volume_rotary, reverb_rotary, menu_rotary, menu_push
+    from gpiozero import LED, Button, RotaryEncoder
+
+    power_on_off_switch = Button(9, hold_time=3.0)
+    registration_led_1 = LED(6)
+    registration_led_2 = LED(8)
+    registration_sel_1 = Button(5)
+    registration_sel_2 = Button(7)
+    volume_rotary = RotaryEncoder(23, 24, max_steps=MAX_VOLUME, bounce_time=bounce_time)
+    reverb_rotary = RotaryEncoder(25, 26, max_steps=MAX_REVERB, bounce_time=bounce_time)
+    menu_rotary = RotaryEncoder(0, 1, bounce_time=bounce_time)
+    menu_push = Button(4)
+
+
+def threadsafe(callback):
+    """
+    Wraps a callback so that gpiozero threads run it in the event loop thread.
+    If the callback is a coroutine function, it is scheduled as a task.
+
+    Args:
+        callback: function or coroutine function without argument
+
+    Returns:
+        a function without argument which can be called from any thread
+    """
+    def run():
+        result = callback()
+        if asyncio.iscoroutine(result):
+            loop.create_task(result)
+
+    return lambda: loop.call_soon_threadsafe(run)
+
+
 
 def set_registration_1():
     """
     Called when user presses the Registration 1 button.
     """
     print('set_registration_1')
-    global sync_serial
     registration_led_1.on()
     registration_led_2.off()
+    drawbars.select_registration(0)
+    publisher.set(state_bus.REGISTRATION, 0)
+    midi_forwarder.recall(presets.burst(0))
     # tell the Arduino to set drawbars boards registration LED 1 on
-    sync_serial.write(b'1\n')
+    arduino.send_command(REGISTRATION, 1)
 
 
 def set_registration_2():
@@ -302,19 +474,53 @@ def set_registration_2():
     Called when user presses the Registration 2 button.
     """
     print('set_registration_2')
-    global sync_serial
     registration_led_1.off()
     registration_led_2.on()
+    drawbars.select_registration(1)
+    publisher.set(state_bus.REGISTRATION, 1)
+    midi_forwarder.recall(presets.burst(1))
     # tell the Arduino to set drawbars boards registration LED 2 on
-    sync_serial.write(b'2\n')
+    arduino.send_command(REGISTRATION, 2)
+
+
+def traced(name, callback):
+    """
+    Records the button action before running its callback, when input events are recorded.
+
+    Args:
+        name (str): button action, one of event_trace.INPUTS
+        callback: function without argument, called from a gpiozero thread
+
+    Returns:
+        a function without argument
+    """
+    if recorder is None:
+        return callback
+
+    def run():
+        recorder.button(name)
+        callback()
+
+    return run
+
+
+def detents_tracer(name):
+    """
+    Args:
+        name (str): encoder, one of event_trace.INPUTS
+
+    Returns:
+        a callable recording the detents of the encoder, None when input events are not recorded
+    """
+    return None if recorder is None else functools.partial(recorder.detents, name)
 
 
 def init_registration():
     """
     Initializes registration LEDs state and buttons actions.
     """
-    registration_sel_1.when_pressed = set_registration_1
-    registration_sel_2.when_pressed = set_registration_2
+    registration_sel_1.when_pressed = traced('registration_1', threadsafe(set_registration_1))
+    registration_sel_2.when_pressed = traced('registration_2', threadsafe(set_registration_2))
     set_registration_1()
 
 
@@ -322,26 +528,26 @@ def init_volume():
     """
     Sets the initial volume to a low, still audible value.
     """
-    global current_volume_value
-    volume_rotary.steps = 0
-    volume_rotary.when_rotated_clockwise = volume_up
-    volume_rotary.when_rotated_counter_clockwise = volume_down
-    current_volume_value = 0
+    global current_volume_value, volume_input
+    volume_input = EncoderAccumulator(volume_rotary, volume_rotated, loop, on_detents=detents_tracer('volume'))
+    current_volume_value = INITIAL_VOLUME
+    setbfree.set('volume', current_volume_value, MAX_VOLUME)
+    publisher.set(state_bus.VOLUME, current_volume_value)
 
 
 def init_reverb():
     """
     Sets the initial reverb to 0.
     """
-    global current_reverb_value
-    reverb_rotary.steps = 0
-    reverb_rotary.when_rotated_clockwise = reverb_up
-    reverb_rotary.when_rotated_counter_clockwise = reverb_down
+    global current_reverb_value, reverb_input
+    reverb_input = EncoderAccumulator(reverb_rotary, reverb_rotated, loop, on_detents=detents_tracer('reverb'))
     current_reverb_value = 0
+    setbfree.set('reverb', current_reverb_value, MAX_REVERB)
+    publisher.set(state_bus.REVERB, current_reverb_value)
 
 
 
-def on_power_up():
+async def on_power_up():
     """
     User powers-up the organ.
     - The LCD shows initialization messages, then the top level menu item.
@@ -350,22 +556,35 @@ def on_power_up():
     - The reverb is set to 0.
     """
     print('on_power_up')
-    global menu
-    lcd.clear()
-    lcd.set_cursor(0, 0)
-    lcd.println("Hammond B3 Clone")
-    lcd.set_cursor(1, 0)
-    lcd.println("=== Welcome! ===")
-    time.sleep(3)
+    global menu_task
+
+    if menu_task is not None:
+        menu_task.cancel()
+
+    show_welcome()
 
     init_registration()
     init_volume()
     init_reverb()
 
+    # the controls answer right away; the menu replaces the welcome screen after WELCOME_TIME,
+    # or as soon as the menu knob is turned
     menu.initialize()
+    menu_task = loop.create_task(menu.refresh(delay=WELCOME_TIME))
+
+
+def show_welcome():
+    """
+    Queues the welcome screen; drawing it again while it is displayed sends nothing to the LCD.
+    """
+    def draw(screen):
+        screen.write_line(0, "Hammond B3 Clone")
+        screen.write_line(1, "=== Welcome! ===")
+
+    writer.submit(draw, INTERACTIVE, key='menu')
 
 
-def on_shut_down(rpi_shutdown=True):
+async def on_shut_down(rpi_shutdown=True):
     """
     User shuts down the organ with the ON/OFF switch or Ctrl+C in development.
 
@@ -373,14 +592,23 @@ def on_shut_down(rpi_shutdown=True):
         rpi_shutdown (bool, optional): if True, the RPI is shut down, else we only exit this code. Defaults to True.
     """
     print('on_shut_down')
-    global lcd, sync_serial
+
+    if menu_task is not None:
+        menu_task.cancel()
+    # background tasks, so that none is left pending when the event loop stops
+    metrics.stop()
+    publisher.close()
+
+    def draw(screen):
+        screen.clear()
+        screen.write(0, 0, "===== Bye =====")
 
     # turn LCD off
-    lcd.clear()
-    lcd.set_cursor(0, 0)
-    lcd.println("===== Bye =====")
-    time.sleep(3)
-    lcd.clear()
+    writer.submit(draw, INTERACTIVE, key='menu')
+    await asyncio.sleep(3)
+    writer.submit(lambda screen: screen.clear(), INTERACTIVE, key='menu')
+    await loop.run_in_executor(None, writer.stop)
+    presets.close()
 
     # turn registration buttons LEDs off
     registration_led_1.off()
@@ -388,36 +616,172 @@ def on_shut_down(rpi_shutdown=True):
 
     # turn drawbars boards LEDs off
     # TODO: modify Arduino code to accept this cmd
-    sync_serial.write(b'3\n')
+    arduino.send_command(LEDS_OFF)
+    await arduino.flush()
+
+    # drawbar changes coalesced within the current tick are sent, then the port or device is released
+    midi_forwarder.close()
+    setbfree.close()
+    midi_backend.close()
 
     if rpi_shutdown:
-        os.system("sudo shutdown -h now")
+        await loop.run_in_executor(None, os.system, "sudo shutdown -h now")
     else:
-        exit(0)
+        loop.stop()
 
 
-def handler(signal_received, frame):
+def handler():
     """
-    Handles system or user interrupts.
+    Handles system or user interrupts; installed as an event loop signal handler.
     """
     print('SIGINT or CTRL-C detected. Exiting.')
-    on_shut_down(rpi_shutdown=False)
+    loop.create_task(on_shut_down(rpi_shutdown=False))
+
+
+def profile_handler():
+    """
+    Starts the stack sampler, or stops it and writes the stacks sampled; installed as the SIGUSR1 handler.
+    """
+    if not stack_sampler.running:
+        stack_sampler.start()
+        print('CPU profiling started')
+        return
+
+    try:
+        path = profiler.timestamped(profile_dir, 'cpu', 'folded')
+    except OSError as exc:
+        # the sampler goes on, so that the stacks are written by the next signal once the directory is fixed
+        print('CPU profile not written, profiling goes on: ' + repr(exc))
+        return
+
+    def written(future):
+        if not future.cancelled() and future.exception() is not None:
+            print('CPU profile not written: ' + repr(future.exception()))
+
+    # the sampler stops at once, writing the file blocks
+    seconds = time.monotonic() - stack_sampler.started
+    stacks = stack_sampler.stop()
+    loop.run_in_executor(None, profiler.write_collapsed, stacks, path).add_done_callback(written)
+    print('writing the CPU profile of %.0f s (%d samples, %d idle) to %s' % (
+        seconds, stack_sampler.samples, stack_sampler.idle_samples, path))
+
+
+def memory_handler():
+    """
+    Writes the memory growth since the previous call, tracing allocations from the first one;
+    installed as the SIGUSR2 handler.
+    """
+    def snapshot():
+        try:
+            path = profiler.timestamped(profile_dir, 'memory', 'txt')
+            memory_tracker.snapshot(path)
+        except OSError as exc:
+            print('memory snapshot not written: ' + repr(exc))
+        else:
+            print('memory snapshot written to ' + path)
+
+    # a snapshot takes a while with many objects
+    loop.run_in_executor(None, snapshot)
 
 
 def display_volume_value():
-    global current_volume_value
-    volume_rotary.steps = current_volume_value
-    for col in range(current_volume_value + 1):
-        lcd.set_cursor(1, col)
-        lcd.println('\u00db')
+    return bar_text(current_volume_value, MAX_VOLUME)
 
 
 def display_reverb_value():
-    global current_reverb_value
-    reverb_rotary.steps = current_reverb_value
-    for col in range(current_reverb_value + 1):
-        lcd.set_cursor(1, col)
-        lcd.println('\u00db')
+    return bar_text(current_reverb_value, MAX_REVERB)
+
+
+def display_control_stats():
+    """
+    :return: setBfree control messages per second and median knob to synth latency
+    """
+    p50 = setbfree.latency.percentile(50)
+    latency = '--' if p50 is None else '%.1fms' % (1000 * p50)
+    return '%d/s %s' % (setbfree.message_rate(), latency)
+
+
+def display_drawbars():
+    """
+    :return: drawbars of the active registration drawn as hanging bars, and the registration number
+    """
+    positions = [drawbar_position(value) for value in drawbars.registration()]
+    return lcd_glyphs.drawbars_view(positions) + '  reg.%d' % (drawbars.active + 1)
+
+
+display_drawbars.glyphs = lcd_glyphs.DRAWBARS
+
+
+def display_midi_latency():
+    """
+    :return: median and 95th percentile of the drawbar to MIDI latency, in milliseconds
+    """
+    p50 = midi_forwarder.latency.percentile(50)
+    if p50 is None:
+        return 'no data'
+    return '%.1f/%.1f ms' % (1000 * p50, 1000 * midi_forwarder.latency.percentile(95))
+
+
+def display_processes():
+    """
+    :return: CPU usage of setBfree and of this script, in percent of one core
+    """
+    if supervisor is None or supervisor.stats is None:
+        return 'not supervised'
+    return 'sB %.0f%% pnl %.0f%%' % (supervisor.stats.cpu_percent, panel_stats.cpu_percent)
+
+
+def on_drawbar_changed(registration, drawbar, value):
+    """
+    Redraws the drawbars menu when it is displayed and a drawbar of the active registration moved.
+    """
+    if menu is None:
+        return  # the Arduino link starts before the LCD is ready; the menu shows the drawbars once built
+    if registration == drawbars.active and menu.element is not None and menu.element.render is display_drawbars:
+        loop.create_task(menu.handle_menu(INTERACTIVE, time.perf_counter()))
+
+
+def publish_drawbar(registration, drawbar, value):
+    """
+    Publishes each drawbar change on the state bus; the publisher batches them.
+    """
+    publisher.set(state_bus.drawbar_key(registration, drawbar), value)
+
+
+def publish_state():
+    """
+    Gives the state bus the current values, which the following changes update.
+    """
+    publisher.set(state_bus.REGISTRATION, drawbars.active)
+    publisher.set(state_bus.VOLUME, current_volume_value)
+    publisher.set(state_bus.REVERB, current_reverb_value)
+    for registration in range(NUM_REGISTRATIONS):
+        for drawbar, value in enumerate(drawbars.registration(registration)):
+            publisher.set(state_bus.drawbar_key(registration, drawbar), value)
+
+
+def bar_text(value, maximum):
+    """
+    :return: a bar graph of value, with one pixel column per step, drawn with lcd_glyphs.HORIZONTAL_BAR
+    """
+    return lcd_glyphs.bar_graph(value, maximum)
+
+
+def draw_bar(value, maximum, since=None):
+    """
+    Queues a bar graph of value on the second LCD row.
+    Pending bars are coalesced, so a fast spin only draws the latest value.
+
+    Args:
+        since (float, optional): time.perf_counter() of the knob event, for the display latency
+    """
+    text = bar_text(value, maximum)
+
+    def draw(screen):
+        screen.use_glyphs(lcd_glyphs.HORIZONTAL_BAR)
+        screen.write_line(1, text)
+
+    writer.submit(draw, INTERACTIVE, key='bar', since=since)
 
 
 def add_menu_items(menu: Menu):
@@ -438,27 +802,30 @@ def add_menu_items(menu: Menu):
     top9 = menu.top_element("<    System    >", "STRING", "                ")
     top10 = menu.top_element("<    Network   >", "STRING", "                ")
 
-    sub_volume = menu.sub_element("Volume:         ", "VOLUME",  "display_volume_value()")
+    sub_volume = menu.sub_element("Volume:         ", "VOLUME",  "display_volume_value")
+
+    sub_reverb = menu.sub_element("Reverb:         ", "REVERB",  "display_reverb_value")
+
+    sub_control_stats = menu.sub_element("Ctrl>MIDI rate", "FUNCTION", "display_control_stats")
+
+    sub_drawbars = menu.sub_element("Drawbars:       ", "FUNCTION", "display_drawbars")
+
+    sub_midi_latency = menu.sub_element("Drawb.>MIDI lat.", "FUNCTION", "display_midi_latency")
 
-    sub_reverb = menu.sub_element("Reverb:         ", "REVERB",  "display_reverb_value()")
+    # METRIC contents are names of the values sampled by system_metrics.SystemMetrics
+    sub91 = menu.sub_element("System>CPU", "METRIC", "cpu")
 
-    sub91 = menu.sub_element("System>CPU", "PYTHON3",
-                             "str(eval('exec(\"import psutil\") or psutil.cpu_percent()')) + '%'")
+    sub92 = menu.sub_element("System>CPU-Temp.", "METRIC", "temperature")
 
-    sub92 = menu.sub_element("System>CPU-Temp.", "BASH",
-                            "vcgencmd measure_temp | sed 's/temp=//g'")
+    sub93 = menu.sub_element("System>RAM", "METRIC", "ram")
 
-    sub93 = menu.sub_element("System>RAM", "PYTHON3",
-                             "str(eval('exec(\"import psutil\") or psutil.virtual_memory()[2]')) + '% used'")
+    sub94 = menu.sub_element("System>Processes", "FUNCTION", "display_processes")
 
-    sub101 = menu.sub_element("Net.>Signal Lev", "BASH",
-                             "iwconfig wlan0 | awk -F'[ =]+' '/Signal level/ {print $7}' | cut -d/ -f1")
-                             
-    sub102 = menu.sub_element("Net.>SSID", "BASH",
-                             "iwconfig wlan0 | grep 'ESSID:' | awk '{print $4}' | sed 's/ESSID://g' | sed 's/\"//g'")
+    sub101 = menu.sub_element("Net.>Signal Lev", "METRIC", "signal")
 
-    sub103 = menu.sub_element("Net.>Internet", "BASH",
-                             "ping -q -w 1 -c 1 `ip r | grep default | cut -d ' ' -f 3` > /dev/null && echo ok || echo error")
+    sub102 = menu.sub_element("Net.>SSID", "METRIC", "ssid")
+
+    sub103 = menu.sub_element("Net.>Internet", "METRIC", "internet")
     
     # Adding elements to the menu
     menu.add_top_element(top_volume)
@@ -474,88 +841,421 @@ def add_menu_items(menu: Menu):
 
     menu.add_sub_element(top_volume, sub_volume)
     menu.add_sub_element(top_reverb, sub_reverb)
+    menu.add_sub_element(top_reverb, sub_control_stats)
+    menu.add_sub_element(top3, sub_drawbars)
+    menu.add_sub_element(top3, sub_midi_latency)
+
+    # setBfree settings, one sub-element per parameter found in its configuration and program bank
+    for top, category in ((top4, 'Tuning'), (top5, 'Vibrato'), (top6, 'Percussions'), (top7, 'Analog Model'),
+                          (top8, 'Leslie')):
+        for key, name, _ in catalog.categories[category]:
+            menu.add_sub_element(top, menu.sub_element(name, "CATALOG", key))
 
     menu.add_sub_element(top9, sub91)
     menu.add_sub_element(top9, sub92)
     menu.add_sub_element(top9, sub93)
+    menu.add_sub_element(top9, sub94)
 
     menu.add_sub_element(top10, sub101)
     menu.add_sub_element(top10, sub102)
     menu.add_sub_element(top10, sub103)
 
 
-def volume_up():
+def volume_rotated(delta):
+    """
+    Applies the net, accelerated volume knob rotation of one frame and redraws the bar once.
+    """
     global current_volume_value
-    lcd_column = volume_rotary.steps
-    current_volume_value = volume_rotary.steps
-    lcd.set_cursor(1, lcd_column)
-    lcd.println('\u00db')
+    current_volume_value = max(0, min(MAX_VOLUME, current_volume_value + delta))
+    setbfree.set('volume', current_volume_value, MAX_VOLUME, since=volume_input.received)
+    publisher.set(state_bus.VOLUME, current_volume_value)
+    draw_bar(current_volume_value, MAX_VOLUME, since=volume_input.received)
 
 
-def volume_down():
-    global current_volume_value
-    lcd_column = volume_rotary.steps
-    current_volume_value = volume_rotary.steps
-    lcd.set_cursor(1, lcd_column)
-    lcd.println('\u00db')
+def reverb_rotated(delta):
+    """
+    Applies the net, accelerated reverb knob rotation of one frame and redraws the bar once.
+    """
+    global current_reverb_value
+    current_reverb_value = max(0, min(MAX_REVERB, current_reverb_value + delta))
+    setbfree.set('reverb', current_reverb_value, MAX_REVERB, since=reverb_input.received)
+    publisher.set(state_bus.REVERB, current_reverb_value)
+    draw_bar(current_reverb_value, MAX_REVERB, since=reverb_input.received)
 
-    for _ in range(lcd_column + 1, 16):
-        lcd.println(' ')
 
-def reverb_up():
-    global current_reverb_value
-    lcd_column = reverb_rotary.steps
-    current_reverb_value = reverb_rotary.steps
-    lcd.set_cursor(1, lcd_column)
-    lcd.println('\u00db')
+def register_metrics():
+    """
+    Describes the latency statistics and counters of the panel objects.
+    They are only read when the metrics endpoint is scraped.
 
+    Returns:
+        telemetry.Registry
+    """
+    registry = telemetry.Registry()
+    registry.latency('lcd_latency_seconds', 'Event (or draw request) to LCD flush latency',
+                     writer.latency[INTERACTIVE], 'priority="interactive"')
+    registry.latency('lcd_latency_seconds', 'Event (or draw request) to LCD flush latency',
+                     writer.latency[BACKGROUND], 'priority="background"')
+    registry.latency('drawbar_midi_latency_seconds', 'Drawbar line received to MIDI CC sent latency',
+                     midi_forwarder.latency)
+    registry.latency('setbfree_control_latency_seconds', 'Knob detent to volume or reverb CC sent latency',
+                     setbfree.latency)
+    registry.counter('lcd_i2c_transactions_total', 'I2C transactions sent to the LCD', lambda: lcd.transactions)
+    registry.counter('lcd_i2c_bytes_total', 'Control and data bytes sent to the LCD', lambda: lcd.bytes_sent)
+    registry.counter('lcd_draw_requests_coalesced_total', 'Pending draw requests replaced by a newer one',
+                     lambda: writer.coalesced)
+    registry.counter('lcd_draw_requests_dropped_total', 'Draw requests dropped by the full queue',
+                     lambda: writer.dropped)
+    registry.gauge('lcd_draw_queue_depth', 'Pending draw requests', writer.depth)
+    registry.counter('drawbar_readings_total', 'Drawbar readings received from the Arduino',
+                     lambda: drawbars.filter.raw_events)
+    registry.counter('drawbar_readings_emitted_total', 'Drawbar readings passed by the noise filter',
+                     lambda: drawbars.filter.emitted_events)
+    registry.counter('drawbar_midi_messages_total', 'Drawbar CCs sent to setBfree',
+                     lambda: midi_forwarder.sent_messages)
+    registry.counter('drawbar_changes_coalesced_total', 'Drawbar changes superseded within a MIDI tick',
+                     lambda: midi_forwarder.coalesced)
+    registry.counter('setbfree_control_messages_total', 'Volume and reverb CCs sent to setBfree',
+                     lambda: setbfree.sent_messages)
+    registry.counter('state_bus_changes_total', 'State changes published to the other panels',
+                     lambda: publisher.changes)
+    registry.counter('state_bus_messages_total', 'State bus datagrams sent', lambda: publisher.messages)
+    registry.counter('state_bus_bytes_total', 'State bus bytes sent', lambda: publisher.bytes_sent)
+    registry.counter('state_bus_send_errors_total', 'State bus datagrams which could not be sent',
+                     lambda: publisher.send_errors)
+    registry.counter('arduino_garbage_bytes_total', 'Bytes received from the Arduino and discarded',
+                     lambda: arduino.garbage_bytes)
+    registry.counter('arduino_commands_dropped_total', 'Commands dropped by the full outgoing queue',
+                     lambda: arduino.dropped_commands)
+    registry.counter('arduino_link_losses_total', 'Serial links with the Arduino lost',
+                     lambda: arduino.losses)
+    registry.gauge('arduino_command_queue_depth', 'Commands waiting to be sent to the Arduino',
+                   lambda: len(arduino.outgoing))
+    registry.gauge('startup_seconds', 'Time from process start to the first interactive state',
+                   lambda: time_to_interactive if time_to_interactive is not None else 'NaN')
+    # the knob inputs only exist once the organ is powered up
+    registry.counter('knob_detents_total', 'Rotary encoder detents',
+                     lambda: volume_input.detents if volume_input else 0, 'knob="volume"')
+    registry.counter('knob_detents_total', 'Rotary encoder detents',
+                     lambda: reverb_input.detents if reverb_input else 0, 'knob="reverb"')
+    registry.counter('knob_frames_total', 'Frames delivering knob detents',
+                     lambda: volume_input.frames if volume_input else 0, 'knob="volume"')
+    registry.counter('knob_frames_total', 'Frames delivering knob detents',
+                     lambda: reverb_input.frames if reverb_input else 0, 'knob="reverb"')
+    if supervisor is not None:
+        register_process_metrics(registry)
+    return registry
+
+
+def register_process_metrics(registry):
+    """
+    Describes the CPU usage and context switches of setBfree and of this script, sampled by the supervisor.
 
-def reverb_down():
-    global current_reverb_value
-    lcd_column = reverb_rotary.steps
-    current_reverb_value = reverb_rotary.steps
-    lcd.set_cursor(1, lcd_column)
-    lcd.println('\u00db')
+    Args:
+        registry (telemetry.Registry): registry the metrics are added to
+    """
+    # setBfree stats are replaced on each restart
+    processes = (('setbfree', lambda: supervisor.stats), ('panel', lambda: panel_stats))
+    for process, stats in processes:
+        registry.gauge('process_cpu_percent', 'CPU usage between two samples, in percent of one core',
+                       lambda stats=stats: stats().cpu_percent if stats() else 0, 'process="%s"' % process)
+    for process, stats in processes:
+        for kind in ('voluntary', 'involuntary'):
+            registry.counter('process_context_switches_total', 'Context switches of all the threads',
+                             lambda stats=stats, kind=kind: getattr(stats(), kind + '_switches') if stats() else 0,
+                             'process="%s",kind="%s"' % (process, kind))
+    registry.counter('setbfree_restarts_total', 'setBfree restarts by the supervisor', lambda: supervisor.restarts)
+
+
+async def start_state_bus():
+    """
+    Publishes the panel state; the panel runs without it if the network does not allow multicast.
+    """
+    try:
+        await publisher.start()
+    except OSError as exc:
+        print('state bus unavailable: ' + repr(exc))
 
-    for _ in range(lcd_column + 1, 16):
-        lcd.println(' ')
+
+async def start_metrics_endpoint():
+    """
+    Serves the metrics on localhost; the panel runs without them if the port is taken.
+    """
+    try:
+        await telemetry.serve(registry, port=METRICS_PORT)
+    except OSError as exc:
+        print('metrics endpoint unavailable: ' + repr(exc))
 
 
-def main():
+def seconds_since_process_start():
     """
-    Everything starts here.
+    Returns:
+        time elapsed since the Python process was started, interpreter startup and imports included
     """
-    global lcd, sync_serial, menu
+    with open('/proc/self/stat') as f:
+        # the command name field may contain spaces: count the fields from its closing parenthesis
+        start_ticks = int(f.read().rpartition(')')[2].split()[19])
+    return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
 
-    power_on_off_switch.when_held = on_shut_down
 
-    # initialize the organ if ON/OFF switch is set ON (open)
-    power_on_off_switch.when_deactivated = on_power_up
+async def connect_arduino(tty, delay=0.0):
+    """
+    Opens the serial link with the Arduino; pyserial is imported in an executor thread.
+    Tries again every ARDUINO_RECONNECT_DELAY seconds while the device is missing, e.g. after a USB glitch.
 
-    lcd = Lcd(bus=1, addr=0x3c, rows=2, cols=16)
+    Args:
+        tty (str): serial device path
+        delay (float, optional): seconds to wait before the first attempt
+    """
+    serial_asyncio = await loop.run_in_executor(None, importlib.import_module, 'serial_asyncio')
+    reported = False
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            await serial_asyncio.create_serial_connection(loop, lambda: arduino, tty, baudrate=115200)
+            return
+        except OSError as exc:
+            if not reported:
+                print('Arduino serial link unavailable, retrying: ' + repr(exc))
+                reported = True
+        delay = ARDUINO_RECONNECT_DELAY
 
-    menu = Menu(lcd)
-    add_menu_items(menu)
 
-    drawbars_reader = DrawbarsAsyncReader()
+async def start_up(simulate=False, replaying=False):
+    """
+    Initializes the panel. The LCD controller init sequence and the GPIO setup block for a while,
+    so they run concurrently in executor threads, while the serial link is opened; the welcome screen
+    is shown as soon as the LCD is ready. The time to the first interactive state is reported.
 
-    # for synchronous write to the Arduino
-    sync_serial = serial.Serial(DRAWBARS_TTY, 115200, timeout=1)
-    on_power_up()
+    Args:
+        simulate (bool, optional): if True, runs without hardware on simulated devices, see simulation.py.
+        replaying (bool, optional): if True, the Arduino data comes from a trace instead of the serial link.
+    """
+    global lcd, screen, writer, arduino, menu, midi_forwarder, presets, setbfree, registry, time_to_interactive
+    global publisher, midi_backend
+
+    if simulate:
+        import simulation
+        i2c_bus = simulation.SimulatedSMBus()
+        lcd_ready_marker = None
+        arduino_stand_in = simulation.SimulatedArduino()
+        if not replaying:
+            arduino_stand_in.start_stream()
+        drawbars_tty = arduino_stand_in.port
+        midi_output = 'loopback'
+        state_bus_interface = '127.0.0.1'  # the other panels are simulated on the same computer
+
+        def gpio_setup():
+            simulation.use_mock_pins()
+            init_gpio(bounce_time=None)  # mock pins do not bounce
+    else:
+        i2c_bus = 1
+        lcd_ready_marker = LCD_READY_MARKER
+        drawbars_tty = DRAWBARS_TTY
+        midi_output = MIDI_OUTPUT
+        state_bus_interface = STATE_BUS_INTERFACE
+        gpio_setup = init_gpio
+
+    lcd_ready = loop.run_in_executor(
+        None, lambda: Lcd(bus=i2c_bus, addr=0x3c, rows=2, cols=16, ready_marker=lcd_ready_marker))
+    gpio_ready = loop.run_in_executor(None, gpio_setup)
+    catalog_ready = loop.run_in_executor(None, catalog.load)
+
+    drawbars.filter = DrawbarFilter(quantize=DRAWBAR_QUANTIZE)
+    drawbars.subscribe(on_drawbar_changed)
+    publisher = state_bus.StatePublisher(loop, interface=state_bus_interface)
+    drawbars.subscribe(publish_drawbar)
+    try:
+        midi_backend = open_midi_backend(midi_output)
+    except (RuntimeError, OSError, ValueError) as exc:
+        print('MIDI output unavailable, drawbars are not forwarded to setBfree: ' + repr(exc))
+        midi_backend = open_midi_backend('loopback')
+    midi_forwarder = DrawbarMidiForwarder(drawbars, midi_backend, loop)
+    presets = PresetStore(PRESETS_FILE, drawbars, loop)
+    # the stored drawbars are loaded without notifications: publish them with the rest of the state
+    publish_state()
+    loop.create_task(start_state_bus())
+    setbfree = SetBfreeControl(midi_backend, loop)
+    # one serial port handle for both directions; commands sent before the connection is made are queued
+    arduino = ArduinoLink(drawbars, loop)
+    if recorder is not None:
+        arduino.record = recorder.serial
+    if replaying:
+        # as after a connection, a recorded binary protocol acknowledgement switches the link to it
+        arduino.negotiating = True
+    else:
+        # a lost link never stops the event loop, which runs the whole panel: it is opened again
+        arduino.on_lost = lambda exc: loop.create_task(connect_arduino(drawbars_tty, ARDUINO_RECONNECT_DELAY))
+        loop.create_task(connect_arduino(drawbars_tty))
+
+    lcd = await lcd_ready
+    screen = LcdFrameBuffer(lcd)
+    writer = LcdWriter(screen)
+    writer.start()
+    show_welcome()
+
+    try:
+        await catalog_ready
+    except (OSError, ValueError) as exc:
+        print('setBfree catalog unavailable: ' + repr(exc))
+    menu = Menu(writer)
+    if os.path.exists(MENU_DEFINITION):
+        try:
+            menu.load(load_menu_definition(MENU_DEFINITION))
+        except (OSError, ValueError, SyntaxError) as exc:
+            # the built-in menu rather than no panel at all
+            print('menu definition ' + MENU_DEFINITION + ' ignored: ' + repr(exc))
+            add_menu_items(menu)
+    else:
+        add_menu_items(menu)
+    registry = register_metrics()
+    loop.create_task(start_metrics_endpoint())
+    metrics.start()
+
+    await gpio_ready
+    if simulate:
+        # never shut the development computer down
+        power_on_off_switch.when_held = traced('power_held', threadsafe(lambda: on_shut_down(rpi_shutdown=False)))
+    else:
+        power_on_off_switch.when_held = traced('power_held', threadsafe(on_shut_down))
+    # initialize the organ if ON/OFF switch is set ON (open)
+    power_on_off_switch.when_deactivated = traced('power_released', threadsafe(on_power_up))
+    await on_power_up()
 
-    loop = asyncio.get_event_loop()
-    drawbars_reader_coroutine = serial_asyncio.create_serial_connection(
-        loop, lambda: drawbars_reader, DRAWBARS_TTY, baudrate=115200)
-    asyncio.ensure_future(drawbars_reader_coroutine)
-    loop.run_forever()
+    time_to_interactive = seconds_since_process_start()
+    print('interactive %.2f s after start (LCD %s start)' % (time_to_interactive, 'warm' if lcd.warm else 'cold'))
 
 
-if __name__ == '__main__':
+def replay_handlers():
+    """
+    Returns:
+        the panel entry points of the recorded inputs, see event_trace.replay()
+    """
+    return {
+        'serial': arduino.data_received,
+        'volume': volume_input.add,
+        'reverb': reverb_input.add,
+        'menu': menu.rotary_input.add,
+        'registration_1': set_registration_1,
+        'registration_2': set_registration_2,
+        'menu_push': menu.menus_button_pressed,
+        'power_held': lambda: on_shut_down(rpi_shutdown=False),
+        'power_released': on_power_up,
+    }
+
+
+async def run_replay(path, realtime=True):
+    """
+    Replays a trace on the simulated devices, reports throughput and latencies, then stops the event loop,
+    whether the replay succeeds or not.
+
+    Args:
+        path (str): trace file written with --record
+        realtime (bool, optional): if False, events are fed as fast as possible. Defaults to True.
+    """
+    try:
+        events = event_trace.read_trace(path)
+        transactions = lcd.transactions
+        result = await event_trace.replay(events, replay_handlers(), realtime)
+        # let the encoder frames and the MIDI ticks pending at the end of the trace expire
+        await asyncio.sleep(REPLAY_SETTLE_TIME)
+        await loop.run_in_executor(None, writer.stop)
+        print('replayed %d events in %.2f s (%.0f events/s), at worst %.1f ms late' % (
+            result['events'], result['seconds'], result['events'] / max(result['seconds'], 1e-9),
+            1000 * result['max_late']))
+        print('LCD: %d I2C transactions, interactive latency p50/p95/p99 %s ms' % (
+            lcd.transactions - transactions,
+            '/'.join('%.1f' % (1000 * p) for p in writer.latency[INTERACTIVE].percentiles((50, 95, 99))) or '-'))
+        print('MIDI: %d drawbar messages, %d control messages' % (
+            midi_forwarder.sent_messages, setbfree.sent_messages))
+    finally:
+        # the event loop stops even if the trace cannot be read or replayed
+        metrics.stop()
+        if menu_task is not None:
+            menu_task.cancel()
+        loop.call_soon(loop.stop)
+
+
+def start_supervisor(command):
+    """
+    Moves this script to its cores, then starts setBfree on the other ones and keeps it running.
 
-    # tell Python to run the handler() function when SIGINT or CTRL+C is received
-    signal(SIGINT, handler)
+    Args:
+        command (str): setBfree command line, or a stand-in program to try the supervision out
+    """
+    global supervisor
+
+    # done before the executor and writer threads exist, which inherit the settings
+    failed = isolate(0, PANEL_CPUS, nice=PANEL_NICE)
+    if failed:
+        print('panel isolation incomplete: ' + '; '.join(failed))
+    rt_priority = SETBFREE_RT_PRIORITY
+    if not SETBFREE_CPUS & AVAILABLE_CPUS or not PANEL_CPUS & AVAILABLE_CPUS:
+        # a real-time setBfree sharing the panel cores would starve it
+        print('not enough CPUs to isolate setBfree, it runs without real-time priority')
+        rt_priority = None
+    supervisor = ProcessSupervisor(shlex.split(command), loop, cpus=SETBFREE_CPUS, rt_priority=rt_priority,
+                                   nice=SETBFREE_NICE, companions=(panel_stats,))
+    supervisor.start()
+
+
+def main(simulate=False, record=None, replay=None, fast=False, supervise=None, profile=PROFILE_DIR):
+    """
+    Everything starts here.
+    All the panel logic runs in one event loop: gpiozero callbacks are forwarded to it,
+    the menu is refreshed by a periodic task and the drawbars reader runs concurrently.
 
-    main()
+    Args:
+        simulate (bool, optional): if True, runs without hardware on simulated devices, see simulation.py.
+            Defaults to False.
+        record (str, optional): trace file the input events are appended to. Defaults to None.
+        replay (str, optional): trace file replayed on simulated devices, after which the program exits.
+            Defaults to None.
+        fast (bool, optional): replays as fast as possible instead of in real time. Defaults to False.
+        supervise (str, optional): setBfree command line; if given, setBfree is started and kept running.
+            Defaults to None.
+        profile (str, optional): directory of the CPU profiles and memory reports. Defaults to PROFILE_DIR.
+    """
+    global loop, recorder, profile_dir
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    # tell the event loop to run the handler() function when SIGINT or CTRL+C is received
+    loop.add_signal_handler(SIGINT, handler)
+    # profile the running panel: kill -USR1 <pid> starts and stops sampling, kill -USR2 <pid> reports memory growth
+    profile_dir = profile
+    loop.add_signal_handler(SIGUSR1, profile_handler)
+    loop.add_signal_handler(SIGUSR2, memory_handler)
+
+    if record is not None:
+        recorder = event_trace.TraceRecorder(record)
+    if supervise is not None:
+        start_supervisor(supervise)
+    try:
+        loop.run_until_complete(start_up(simulate or replay is not None, replaying=replay is not None))
+        if replay is not None:
+            loop.create_task(run_replay(replay, realtime=not fast))
+        loop.run_forever()
+    finally:
+        if supervisor is not None:
+            loop.run_until_complete(supervisor.stop())
+        loop.close()
 
-    # keep the program listening for events
-    pause()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Upper control panel of the B3 clone.')
+    parser.add_argument('--simulate', action='store_true', help='run on simulated devices, without hardware')
+    trace = parser.add_mutually_exclusive_group()
+    trace.add_argument('--record', metavar='TRACE', help='append the input events to a trace file')
+    trace.add_argument('--replay', metavar='TRACE', help='replay a trace on simulated devices, then exit')
+    parser.add_argument('--fast', action='store_true', help='replay as fast as possible instead of in real time')
+    parser.add_argument('--supervise', action='store_true',
+                        help='start setBfree on its own cores and restart it if it fails')
+    parser.add_argument('--setbfree', metavar='COMMAND', default=SETBFREE_COMMAND,
+                        help='setBfree command line, or a stand-in program, for --supervise')
+    parser.add_argument('--profile-dir', default=PROFILE_DIR, metavar='DIR',
+                        help='directory of the profiles written on SIGUSR1 and SIGUSR2 (default: %(default)s)')
+    args = parser.parse_args()
+    main(simulate=args.simulate, record=args.record, replay=args.replay, fast=args.fast,
+         supervise=args.setbfree if args.supervise else None, profile=args.profile_dir)
@@ -0,0 +1,207 @@
+import marshal
+import os
+import re
+
+CACHE_VERSION = 1
+
+# menu categories, with the prefixes of the config parameters and program properties they list;
+# a parameter goes to the first category one of its prefixes matches
+CATEGORIES = (
+    ('Tuning', ('osc.tuning', 'osc.temperament', 'transpose')),
+    ('Vibrato', ('scanner.', 'vibrato')),
+    ('Percussions', ('osc.perc.', 'perc')),
+    ('Analog Model', ('xov.', 'overdrive', 'osc.eq.', 'osc.crosstalk', 'osc.attack', 'osc.release')),
+    ('Leslie', ('whirl.', 'rotary', 'leslie')),
+)
+
+# first components dropped from the menu labels, which are 16 characters long
+LABEL_PREFIXES = ('osc.', 'scanner.', 'xov.', 'whirl.')
+LABEL_LENGTH = 16
+
+# program property values setBfree accepts, beyond those found in the program bank
+KNOWN_VALUES = {
+    'vibrato': ('v1', 'v2', 'v3', 'c1', 'c2', 'c3'),
+    'vibratoknob': ('v1', 'v2', 'v3', 'c1', 'c2', 'c3'),
+    'vibratoupper': ('on', 'off'),
+    'vibratolower': ('on', 'off'),
+    'perc': ('on', 'off'),
+    'percvol': ('normal', 'soft'),
+    'percspeed': ('fast', 'slow'),
+    'percharm': ('second', 'third'),
+    'overdrive': ('on', 'off'),
+    'rotaryspeed': ('stop', 'slow', 'fast'),
+}
+
+# a program: number { key = value ... }, values quoted or not, separated by spaces or commas
+_PROGRAM = re.compile(r'(\d+)\s*\{([^}]*)\}')
+_PROPERTY = re.compile(r'([\w.]+)\s*=\s*("[^"]*"|[^\s,}]+)')
+
+
+def parse_config(path):
+    """
+    Reads a setBfree configuration file: key=value lines, # starting comments.
+    :param path: .cfg file
+    :return: {parameter: value}, the last setting of a parameter wins
+    """
+    parameters = {}
+    with open(path, errors='replace') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            key, equal, value = line.partition('=')
+            if equal and key.strip():
+                parameters[key.strip()] = value.strip()
+    return parameters
+
+
+def parse_programs(path):
+    """
+    Reads a setBfree program bank: number { name="..." key=value ... } blocks, # starting comments.
+    :param path: .pgm file
+    :return: list of (program number, name, {property: value})
+    """
+    with open(path, errors='replace') as f:
+        text = ''.join(line.split('#', 1)[0] for line in f)
+    programs = []
+    for match in _PROGRAM.finditer(text):
+        properties = {key: value.strip('"') for key, value in _PROPERTY.findall(match.group(2))}
+        programs.append((int(match.group(1)), properties.pop('name', ''), properties))
+    return programs
+
+
+def category_of(key):
+    """
+    :return: name of the menu category of a parameter or property, None if it is in none
+    """
+    for category, prefixes in CATEGORIES:
+        if key.startswith(prefixes):
+            return category
+    return None
+
+
+def label(key):
+    """
+    :return: menu label of a parameter, e.g. 'horn.brakepos' for 'whirl.horn.brakepos'
+    """
+    for prefix in LABEL_PREFIXES:
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+            break
+    return key[:LABEL_LENGTH]
+
+
+def value_text(value, allowed):
+    """
+    :param value: current value, '' if the parameter is only set by programs
+    :param allowed: allowed values
+    :return: LCD row: the value and its rank among the allowed values, or the allowed values
+    """
+    if not value:
+        return '|'.join(allowed)[:LABEL_LENGTH]
+    if value in allowed and len(allowed) > 1:
+        rank = '%d/%d' % (allowed.index(value) + 1, len(allowed))
+        return value[:LABEL_LENGTH - len(rank) - 1].ljust(LABEL_LENGTH - len(rank)) + rank
+    return value[:LABEL_LENGTH]
+
+
+def build_index(config, programs):
+    """
+    :param config: {parameter: value} returned by parse_config()
+    :param programs: list returned by parse_programs()
+    :return: {'categories': {category: [(key, label, LCD row text)]}};
+             only built-in types, so that marshal can store it
+    """
+    allowed = {}
+    for _, _, properties in programs:
+        for key, value in properties.items():
+            allowed.setdefault(key, {})[value] = None  # ordered set of the values
+    categories = {category: [] for category, _ in CATEGORIES}
+    for key in sorted(set(config) | set(allowed)):
+        category = category_of(key)
+        if category is None:
+            continue
+        values = list(KNOWN_VALUES.get(key, ()))
+        for value in list(allowed.get(key, ())) + ([config[key]] if key in config else []):
+            if value not in values:
+                values.append(value)
+        categories[category].append((key, label(key), value_text(config.get(key, ''), values)))
+    return {'categories': categories}
+
+
+def source_key(paths):
+    """
+    :return: identity of the source files: path, modification time and size; -1 for missing files
+    """
+    key = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            key.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            key.append((path, -1, -1))
+    return tuple(key)
+
+
+class SetBfreeCatalog:
+    """
+    Index of the setBfree configuration parameters and program properties the menus show, by category.
+    Files are parsed once; the index is cached in a marshal file, reused as long as the configuration
+    and program files keep their modification time and size, so that a start reads one small file.
+    The menus only get precomputed strings.
+    """
+    def __init__(self, config_path, programs_path, cache_path=None):
+        """
+        :param config_path: setBfree .cfg file; may not exist
+        :param programs_path: setBfree .pgm program bank; may not exist
+        :param cache_path: index cache file, None to parse on each load
+        """
+        self.config_path = config_path
+        self.programs_path = programs_path
+        self.cache_path = cache_path
+        self.categories = {category: [] for category, _ in CATEGORIES}
+        self.parameters = {}  # key: LCD row text
+        self.from_cache = False
+
+    def load(self):
+        """
+        Loads the index from the cache, or parses the files and rewrites the cache. Blocks: run it in an executor.
+        """
+        key = source_key((self.config_path, self.programs_path))
+        index = self._read_cache(key)
+        self.from_cache = index is not None
+        if index is None:
+            config = parse_config(self.config_path) if key[0][1] >= 0 else {}
+            programs = parse_programs(self.programs_path) if key[1][1] >= 0 else []
+            index = build_index(config, programs)
+            self._write_cache(key, index)
+        self.categories = index['categories']
+        self.parameters = {entry[0]: entry[2] for entries in self.categories.values() for entry in entries}
+
+    def _read_cache(self, key):
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path, 'rb') as f:
+                version, cached_key, index = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != CACHE_VERSION or cached_key != key:
+            return None
+        return index
+
+    def _write_cache(self, key, index):
+        if self.cache_path is None:
+            return
+        temporary = self.cache_path + '.tmp'
+        try:
+            with open(temporary, 'wb') as f:
+                marshal.dump((CACHE_VERSION, key, index), f)
+            os.replace(temporary, self.cache_path)
+        except OSError as exc:
+            print('setBfree catalog cache not written: ' + repr(exc))
+
+    def value(self, key):
+        """
+        :param key: parameter or property name
+        :return: LCD row text of the parameter
+        """
+        return self.parameters.get(key, 'not set')
@@ -0,0 +1,116 @@
+import time
+from collections import deque
+
+from midi_out import MidiBackend, MIDI_CONTROL_CHANGE
+from drawbars_state import MIDI_MAX
+from telemetry import LatencyStats
+
+# setBfree functions must be mapped to these CCs in its configuration file:
+# midi.controller.upper.7=swellpedal1 and midi.controller.upper.91=reverb.mix
+VOLUME_CC = 7
+REVERB_CC = 91
+
+
+class ControlParameter:
+    """
+    A continuous setBfree parameter: the value requested by the knob and the value last sent.
+    """
+    __slots__ = ('controller', 'target', 'sent', 'requested')
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.target = 0
+        self.sent = -1  # unknown until the first message
+        self.requested = 0.0  # perf_counter() of the oldest request not sent yet
+
+
+class SetBfreeControl:
+    """
+    Rate-limited control channel to setBfree.
+    Knob changes only set a target; a tick sends at most one CC per parameter, ramping
+    towards the target by steps of at most max_step so that fast spins produce a bounded
+    number of messages and no audible jumps. Nothing runs while every parameter is settled.
+    """
+    def __init__(self, backend: MidiBackend, loop, channel=0, tick=0.01, max_step=8):
+        """
+        :param backend: MIDI destination
+        :param loop: event loop
+        :param channel: MIDI channel of the upper manual (0 based)
+        :param tick: minimum delay between two messages of a parameter, in seconds
+        :param max_step: maximum change of a parameter per message, in MIDI units
+        """
+        self.backend = backend
+        self.loop = loop
+        self.channel = channel
+        self.tick = tick
+        self.max_step = max_step
+        self.parameters = {'volume': ControlParameter(VOLUME_CC), 'reverb': ControlParameter(REVERB_CC)}
+        self.tick_handle = None
+        self.last_tick = float('-inf')  # loop.time() of the last message
+        self.latency = LatencyStats()  # from a request to the first message moving towards it
+        self.sent_times = deque(maxlen=256)  # (perf_counter(), messages) of the recent bursts
+        self.sent_messages = 0
+
+    def set(self, name, value, maximum=MIDI_MAX, since=None):
+        """
+        Requests a new parameter value.
+        :param name: 'volume' or 'reverb'
+        :param value: value between 0 and maximum
+        :param maximum: full scale of value
+        :param since: time.perf_counter() of the knob event, defaults to now
+        """
+        parameter = self.parameters[name]
+        target = value * MIDI_MAX // maximum
+        if target == parameter.target and parameter.sent >= 0:
+            return
+        if parameter.target == parameter.sent or parameter.sent < 0:
+            parameter.requested = since or time.perf_counter()
+        parameter.target = target
+        if self.tick_handle is None:
+            delay = max(0.0, self.last_tick + self.tick - self.loop.time())
+            self.tick_handle = self.loop.call_later(delay, self._tick)
+
+    def _tick(self):
+        self.tick_handle = None
+        burst = bytearray((MIDI_CONTROL_CHANGE | self.channel,))
+        requested = []
+        moving = False
+        for parameter in self.parameters.values():
+            if parameter.sent == parameter.target:
+                continue
+            if parameter.sent < 0:
+                value = parameter.target
+            elif parameter.target > parameter.sent:
+                value = min(parameter.target, parameter.sent + self.max_step)
+            else:
+                value = max(parameter.target, parameter.sent - self.max_step)
+            if parameter.requested:
+                requested.append(parameter.requested)
+                parameter.requested = 0.0
+            parameter.sent = value
+            burst += bytes((parameter.controller, value))
+            moving = moving or value != parameter.target
+        if len(burst) > 1:
+            self.last_tick = self.loop.time()
+            self.backend.send(bytes(burst))
+            now = time.perf_counter()
+            for request in requested:
+                self.latency.add(now - request)
+            messages = (len(burst) - 1) // 2
+            self.sent_messages += messages
+            self.sent_times.append((now, messages))
+        if moving:
+            self.tick_handle = self.loop.call_later(self.tick, self._tick)
+
+    def message_rate(self, window=1.0):
+        """
+        :param window: averaging period in seconds
+        :return: CC messages sent per second during the last window
+        """
+        limit = time.perf_counter() - window
+        return sum(messages for sent, messages in self.sent_times if sent >= limit) / window
+
+    def close(self):
+        if self.tick_handle is not None:
+            self.tick_handle.cancel()
+            self.tick_handle = None
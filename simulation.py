@@ -0,0 +1,258 @@
+"""
+Simulated devices, so that the control panel runs and can be measured on a development computer:
+
+- SimulatedSMBus stands for the I2C bus of the RW1063 LCD and models its display RAM
+- use_mock_pins() installs gpiozero's mock pin factory; turn(), press() and release() operate the inputs
+- SimulatedArduino is a pseudo-terminal sending drawbar lines like the drawbars Arduino
+
+Run the panel with: python3 rpi_up_ctrl_panel.py --simulate
+"""
+import os
+import threading
+import time
+import tty
+
+from drawbars_state import NUM_DRAWBARS, DRAWBAR_CC_FIRST, MIDI_MAX
+from i2c_lcd import (Lcd, I2C_CTRL_DATA, I2C_CTRL_CMD_CONTINUED, LCD_CLEAR_DISPLAY, LCD_RETURN_HOME,
+                     LCD_SET_CGRAM_ADDR, LCD_SET_DDRAM_ADDR)
+
+DDRAM_SIZE = 0x80
+CGRAM_SIZE = 0x40
+
+
+class SimulatedSMBus:
+    """
+    SMBus-like object modelling the RW1063 controller behind it.
+    Control bytes are decoded as the controller does (Co and RS bits), so the display RAM
+    shows what the real LCD would. Every transaction is counted and can be given a duration.
+    """
+    def __init__(self, latency=0.0, byte_time=0.0):
+        """
+        :param latency: duration of a transaction in seconds, start and address byte included
+        :param byte_time: additional duration of each control or data byte, e.g. 90e-6 at 100 kHz
+        """
+        self.latency = latency
+        self.byte_time = byte_time
+        self.lock = threading.Lock()
+        self.ddram = bytearray(b' ' * DDRAM_SIZE)
+        self.cgram = bytearray(CGRAM_SIZE)
+        self.address = 0
+        self.in_cgram = False  # True after a CGRAM address command, until a DDRAM one
+        self.transactions = 0
+        self.bytes = 0  # control and data bytes, the address byte of each transaction excluded
+        self.commands = 0
+        self.busy = 0.0  # simulated bus time, in seconds
+
+    def write_quick(self, addr):
+        with self.lock:
+            self.transactions += 1
+            self.busy += self.latency
+
+    def write_byte_data(self, addr, control, value):
+        self._transfer(control, (value,))
+
+    def write_i2c_block_data(self, addr, control, data):
+        if len(data) > 32:
+            raise OSError('SMBus block transfers carry at most 32 bytes')
+        self._transfer(control, data)
+
+    def _transfer(self, control, data):
+        duration = self.latency + self.byte_time * (1 + len(data))
+        with self.lock:
+            self.transactions += 1
+            self.bytes += 1 + len(data)
+            self.busy += duration
+            i = 0
+            while i < len(data):
+                if control & I2C_CTRL_CMD_CONTINUED:
+                    # a single byte follows, then another control byte
+                    self._receive(control & I2C_CTRL_DATA, data[i])
+                    i += 1
+                    if i < len(data):
+                        control = data[i]
+                        i += 1
+                else:
+                    for byte in data[i:]:
+                        self._receive(control & I2C_CTRL_DATA, byte)
+                    break
+        if duration:
+            time.sleep(duration)
+
+    def _receive(self, data_mode, byte):
+        if data_mode:
+            if self.in_cgram:
+                self.cgram[self.address % CGRAM_SIZE] = byte
+                self.address = (self.address + 1) % CGRAM_SIZE
+            else:
+                self.ddram[self.address % DDRAM_SIZE] = byte
+                self.address = (self.address + 1) % DDRAM_SIZE
+            return
+        self.commands += 1
+        if byte & LCD_SET_DDRAM_ADDR:
+            self.address = byte & 0x7F
+            self.in_cgram = False
+        elif byte & LCD_SET_CGRAM_ADDR:
+            self.address = byte & 0x3F
+            self.in_cgram = True
+        elif byte == LCD_CLEAR_DISPLAY:
+            self.ddram[:] = b' ' * DDRAM_SIZE
+            self.address = 0
+            self.in_cgram = False
+        elif byte == LCD_RETURN_HOME:
+            self.address = 0
+            self.in_cgram = False
+
+    def row(self, row, cols=16):
+        """
+        :param row: character row
+        :param cols: number of columns of the display
+        :return: characters displayed on the row, as bytes
+        """
+        start = Lcd.row_offsets[row]
+        with self.lock:
+            return bytes(self.ddram[start:start + cols])
+
+    def glyph(self, code):
+        """
+        :param code: user-defined character code, 0 to 7
+        :return: the 8 pixel rows of the glyph
+        """
+        with self.lock:
+            return bytes(self.cgram[code * 8:code * 8 + 8])
+
+    def reset_counters(self):
+        with self.lock:
+            self.transactions = self.bytes = self.commands = 0
+            self.busy = 0.0
+
+
+def use_mock_pins():
+    """
+    Makes gpiozero create mock pins, which the functions below can drive.
+    Must be called before any gpiozero device is created.
+    """
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory
+    Device.pin_factory = MockFactory()
+
+
+# gpiozero inputs are pulled up: a pin is active when driven low
+_CLOCKWISE = ('a', 'b', 'a', 'b')  # A falls, B falls, A rises, B rises
+_COUNTER_CLOCKWISE = ('b', 'a', 'b', 'a')
+
+
+def turn(encoder, detents, interval=0.0):
+    """
+    Turns a RotaryEncoder created with mock pins.
+    :param encoder: gpiozero RotaryEncoder
+    :param detents: positive clockwise, negative counter-clockwise
+    :param interval: delay between two pin edges in seconds; must exceed the encoder bounce time
+    """
+    sequence = _CLOCKWISE if detents > 0 else _COUNTER_CLOCKWISE
+    for _ in range(abs(detents)):
+        low = set()
+        for name in sequence:
+            pin = getattr(encoder, name).pin
+            if name in low:
+                pin.drive_high()
+                low.discard(name)
+            else:
+                pin.drive_low()
+                low.add(name)
+            if interval:
+                time.sleep(interval)
+
+
+def press(button):
+    """
+    :param button: gpiozero Button created with mock pins
+    """
+    button.pin.drive_low()
+
+
+def release(button):
+    """
+    :param button: gpiozero Button created with mock pins
+    """
+    button.pin.drive_high()
+
+
+class SimulatedArduino:
+    """
+    Stand-in for the drawbars Arduino: a pseudo-terminal whose port can be opened by pyserial.
+    It sends drawbar lines in the text protocol and keeps what the panel sends it;
+    the binary protocol proposal is left unanswered, so the link stays in text mode.
+    """
+    def __init__(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.received = bytearray()
+        self.sent_lines = 0
+        self.stream_thread = None
+        self.streaming = threading.Event()
+
+    def send_drawbar(self, drawbar, value):
+        """
+        :param drawbar: drawbar index, 0 to NUM_DRAWBARS - 1
+        :param value: MIDI value, 0 to MIDI_MAX
+        """
+        os.write(self.master, b'%d %d\n' % (DRAWBAR_CC_FIRST + drawbar, value))
+        self.sent_lines += 1
+
+    def sweep(self, drawbar, start, stop, step=1, interval=0.0):
+        """
+        Moves a drawbar from start to stop, both included, one line per step.
+        :param interval: delay between two lines in seconds
+        """
+        step = abs(step) if stop >= start else -abs(step)
+        for value in range(start, stop + step // abs(step), step):
+            self.send_drawbar(drawbar, value)
+            if interval:
+                time.sleep(interval)
+
+    def start_stream(self, rate=200.0):
+        """
+        Sends drawbar lines in a background thread until stop_stream(): every drawbar in turn
+        sweeps its whole range up and down.
+        :param rate: lines per second
+        """
+        self.streaming.set()
+        self.stream_thread = threading.Thread(target=self._stream, args=(1.0 / rate,), daemon=True)
+        self.stream_thread.start()
+
+    def _stream(self, interval):
+        while self.streaming.is_set():
+            for drawbar in range(NUM_DRAWBARS):
+                for start, stop in ((0, MIDI_MAX), (MIDI_MAX, 0)):
+                    self.sweep(drawbar, start, stop, 4, interval)
+                    if not self.streaming.is_set():
+                        return
+
+    def stop_stream(self):
+        self.streaming.clear()
+        if self.stream_thread is not None:
+            self.stream_thread.join()
+            self.stream_thread = None
+
+    def read_commands(self):
+        """
+        :return: bytes sent by the panel since the last call
+        """
+        os.set_blocking(self.master, False)
+        try:
+            while True:
+                chunk = os.read(self.master, 1024)
+                if not chunk:
+                    break
+                self.received += chunk
+        except BlockingIOError:
+            pass
+        data = bytes(self.received)
+        self.received.clear()
+        return data
+
+    def close(self):
+        self.stop_stream()
+        os.close(self.master)
+        os.close(self.slave)
@@ -0,0 +1,317 @@
+"""
+State bus between the control panels of the organ: the upper panel publishes its registration, volume,
+reverb and drawbar values on a UDP multicast group, the lower manual and pedal panels subscribe to it.
+
+Each datagram is a header followed by (key, value) byte pairs:
+
+- SNAPSHOT: the whole state, sent on start, every snapshot_interval seconds and when a node joins
+- DELTA: only the values changed within a batch interval, several changes of a key keep the latest
+- JOIN: sent by a subscriber to get a snapshot, on start and after a lost delta
+
+Deltas are numbered, so that a subscriber detects a lost one; the values are absolute,
+so the next snapshot repairs the state. Each message carries the wall clock time of its oldest change:
+the propagation latency measured by subscribers is exact on one computer and as good as the clock
+synchronization (NTP) between computers.
+
+Subscribe and print the state and the latency: python3 state_bus.py [--interface 127.0.0.1]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import time
+
+from drawbars_state import NUM_REGISTRATIONS, NUM_DRAWBARS
+from telemetry import LatencyStats
+
+STATE_BUS_GROUP = '239.255.66.3'  # organization-local scope
+STATE_BUS_PORT = 5866
+
+MAGIC = b'B3'
+VERSION = 1
+# magic, version, message type, publisher session, sequence number, wall clock time, number of entries
+HEADER = struct.Struct('<2sBBIIdB')
+ENTRY = struct.Struct('<BB')  # key, value
+
+# message types
+SNAPSHOT = 0
+DELTA = 1
+JOIN = 2
+
+# keys; values are 0-255
+REGISTRATION = 0  # active registration, 0 or 1
+VOLUME = 1
+REVERB = 2
+DRAWBAR_FIRST = 16  # then one key per drawbar of each registration, see drawbar_key()
+KEY_NAMES = dict([(REGISTRATION, 'registration'), (VOLUME, 'volume'), (REVERB, 'reverb')] +
+                 [(DRAWBAR_FIRST + r * NUM_DRAWBARS + d, 'drawbar %d.%d' % (r + 1, d + 1))
+                  for r in range(NUM_REGISTRATIONS) for d in range(NUM_DRAWBARS)])
+
+
+def drawbar_key(registration, drawbar):
+    """
+    :param registration: 0 or 1
+    :param drawbar: drawbar index 0-8
+    :return: state key of the drawbar
+    """
+    return DRAWBAR_FIRST + registration * NUM_DRAWBARS + drawbar
+
+
+def encode(message_type, session, sequence, stamp, entries):
+    """
+    :param entries: iterable of (key, value)
+    :return: datagram
+    """
+    entries = list(entries)
+    return HEADER.pack(MAGIC, VERSION, message_type, session, sequence, stamp, len(entries)) + \
+        b''.join(ENTRY.pack(key, value) for key, value in entries)
+
+
+def decode(data):
+    """
+    :param data: datagram
+    :return: (message type, session, sequence, wall clock time, list of (key, value)), or None if it is not one
+    """
+    if len(data) < HEADER.size:
+        return None
+    magic, version, message_type, session, sequence, stamp, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + count * ENTRY.size:
+        return None
+    return message_type, session, sequence, stamp, [ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+                                                    for i in range(count)]
+
+
+def multicast_socket(group, port, interface):
+    """
+    :param group: multicast group address
+    :param port: UDP port
+    :param interface: address of the local interface to use, e.g. '127.0.0.1'; '0.0.0.0' follows the routes
+    :return: UDP socket bound to the port and member of the group; several nodes of a computer can share it
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', port))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                    socket.inet_aton(group) + socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)  # never leaves the local network
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)  # nodes of the same computer
+    sock.setblocking(False)
+    return sock
+
+
+class StatePublisher(asyncio.DatagramProtocol):
+    """
+    Publishes the panel state. set() is called in the event loop thread; it costs a dictionary update,
+    the datagram is sent once per batch interval.
+    """
+    def __init__(self, loop, group=STATE_BUS_GROUP, port=STATE_BUS_PORT, interface='0.0.0.0',
+                 batch_interval=0.002, snapshot_interval=1.0):
+        """
+        :param loop: event loop
+        :param group: multicast group address
+        :param port: UDP port
+        :param interface: address of the local interface, see multicast_socket()
+        :param batch_interval: seconds changes are held to be sent together
+        :param snapshot_interval: seconds between two periodic snapshots, which also tell the publisher is alive
+        """
+        self.loop = loop
+        self.destination = (group, port)
+        self.interface = interface
+        self.batch_interval = batch_interval
+        self.snapshot_interval = snapshot_interval
+        self.session = int.from_bytes(os.urandom(4), 'little')  # tells subscribers the publisher restarted
+        self.sequence = 0  # of the last delta
+        self.state = {}
+        self.pending = {}  # changes of the current batch
+        self.pending_since = 0.0  # wall clock time of the oldest pending change
+        self.flush_handle = None
+        self.snapshot_handle = None
+        self.transport = None
+        self.messages = 0
+        self.bytes_sent = 0
+        self.changes = 0
+        self.send_errors = 0
+
+    async def start(self):
+        """
+        Joins the group, then sends a first snapshot.
+        :raise OSError: if the network does not allow it
+        """
+        await self.loop.create_datagram_endpoint(
+            lambda: self, sock=multicast_socket(self.destination[0], self.destination[1], self.interface))
+        self.send_snapshot()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def set(self, key, value):
+        """
+        :param key: state key, e.g. VOLUME or drawbar_key(0, 2)
+        :param value: 0-255
+        """
+        if self.state.get(key) == value:
+            return
+        self.state[key] = value
+        self.changes += 1
+        if not self.pending:
+            self.pending_since = time.time()
+        self.pending[key] = value
+        if self.flush_handle is None and self.transport is not None:
+            self.flush_handle = self.loop.call_later(self.batch_interval, self.flush)
+
+    def flush(self):
+        """
+        Sends the pending changes.
+        """
+        self.flush_handle = None
+        if not self.pending:
+            return
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        self._send(encode(DELTA, self.session, self.sequence, self.pending_since, self.pending.items()))
+        self.pending.clear()
+
+    def send_snapshot(self):
+        # a snapshot includes the pending changes: they need no delta anymore
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        stamp = self.pending_since if self.pending else time.time()
+        self.pending.clear()
+        self._send(encode(SNAPSHOT, self.session, self.sequence, stamp, self.state.items()))
+        if self.snapshot_handle is not None:
+            self.snapshot_handle.cancel()
+        self.snapshot_handle = self.loop.call_later(self.snapshot_interval, self.send_snapshot)
+
+    def _send(self, data):
+        try:
+            self.transport.sendto(data, self.destination)
+        except OSError:
+            self.send_errors += 1  # e.g. the network is down; the next snapshot catches up
+            return
+        self.messages += 1
+        self.bytes_sent += len(data)
+
+    def datagram_received(self, data, addr):
+        # the group also brings back the publisher's own messages
+        message = decode(data)
+        if message is not None and message[0] == JOIN:
+            self.send_snapshot()
+
+    def error_received(self, exc):
+        self.send_errors += 1
+
+    def close(self):
+        for handle in (self.flush_handle, self.snapshot_handle):
+            if handle is not None:
+                handle.cancel()
+        self.flush_handle = self.snapshot_handle = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None  # changes set() afterwards, e.g. while shutting down, are not sent
+
+
+class StateSubscriber(asyncio.DatagramProtocol):
+    """
+    Mirrors the state of a publisher and measures the propagation latency.
+    """
+    def __init__(self, loop, on_change=None, group=STATE_BUS_GROUP, port=STATE_BUS_PORT, interface='0.0.0.0'):
+        """
+        :param loop: event loop
+        :param on_change: called as on_change(key, value) for each value which changed
+        :param group: multicast group address
+        :param port: UDP port
+        :param interface: address of the local interface, see multicast_socket()
+        """
+        self.loop = loop
+        self.on_change = on_change
+        self.destination = (group, port)
+        self.interface = interface
+        self.state = {}
+        self.session = None  # of the publisher whose state is mirrored
+        self.sequence = None  # of the last delta applied, None until a snapshot is received
+        self.transport = None
+        self.latency = LatencyStats()  # oldest change published to message applied, in seconds
+        self.messages = 0
+        self.snapshots = 0
+        self.gaps = 0  # lost or reordered deltas
+
+    async def start(self):
+        """
+        Joins the group and asks for a snapshot.
+        :raise OSError: if the network does not allow it
+        """
+        await self.loop.create_datagram_endpoint(
+            lambda: self, sock=multicast_socket(self.destination[0], self.destination[1], self.interface))
+        self.join()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def join(self):
+        try:
+            self.transport.sendto(encode(JOIN, 0, 0, time.time(), ()), self.destination)
+        except OSError:
+            pass  # the periodic snapshots are received anyway
+
+    def datagram_received(self, data, addr):
+        message = decode(data)
+        if message is None:
+            return
+        message_type, session, sequence, stamp, entries = message
+        if message_type == SNAPSHOT:
+            # a snapshot older than the deltas already applied is ignored
+            if session == self.session and self.sequence is not None and \
+                    (sequence - self.sequence) & 0xFFFFFFFF > 0x7FFFFFFF:
+                return
+            self.session = session
+            self.sequence = sequence
+            self.snapshots += 1
+        elif message_type == DELTA:
+            if session != self.session or self.sequence is None:
+                self.join()  # publisher unknown or restarted: its full state is needed first
+                return
+            ahead = (sequence - self.sequence) & 0xFFFFFFFF
+            if ahead == 0 or ahead > 0x7FFFFFFF:
+                return  # duplicate or late
+            if ahead > 1:
+                self.gaps += 1
+                self.join()
+            self.sequence = sequence
+        else:
+            return
+        now = time.time()
+        self.messages += 1
+        self.latency.add(max(0.0, now - stamp))
+        for key, value in entries:
+            if self.state.get(key) != value:
+                self.state[key] = value
+                if self.on_change is not None:
+                    self.on_change(key, value)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+async def monitor(interface, period=5.0):
+    subscriber = StateSubscriber(asyncio.get_running_loop(), lambda key, value: print(
+        '%s = %d' % (KEY_NAMES.get(key, 'key %d' % key), value)), interface=interface)
+    await subscriber.start()
+    while True:
+        await asyncio.sleep(period)
+        percentiles = subscriber.latency.percentiles((50, 95, 99))
+        if percentiles:
+            print('%d messages, %d gaps, latency p50/p95/p99 %s ms' % (
+                subscriber.messages, subscriber.gaps, '/'.join('%.2f' % (1000 * p) for p in percentiles)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prints the state published by the upper control panel.')
+    parser.add_argument('--interface', default='0.0.0.0', help='address of the local interface to listen on')
+    args = parser.parse_args()
+    try:
+        asyncio.run(monitor(args.interface))
+    except KeyboardInterrupt:
+        pass
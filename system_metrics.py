@@ -0,0 +1,169 @@
+import asyncio
+import socket
+import struct
+import time
+
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+PROC_NET_WIRELESS = '/proc/net/wireless'
+PROC_NET_ROUTE = '/proc/net/route'
+SOC_TEMPERATURE = '/sys/class/thermal/thermal_zone0/temp'
+
+WIFI_INTERFACE = 'wlan0'
+
+# metric name: refresh period in seconds
+DEFAULT_INTERVALS = {
+    'cpu': 1.0,
+    'ram': 2.0,
+    'temperature': 2.0,
+    'signal': 2.0,
+    'ssid': 10.0,
+    'internet': 10.0,
+}
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+class SystemMetrics:
+    """
+    Samples system metrics in the background, each one at its own rate,
+    and caches their latest values so that menus can display them instantly.
+    Metrics are read from /proc and /sys; the few external commands run as
+    asyncio subprocesses, never blocking the event loop.
+    """
+    def __init__(self, intervals=None):
+        """
+        :param intervals: dictionary {metric name: refresh period in seconds} overriding DEFAULT_INTERVALS
+        """
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.values = {}  # {metric name: (text, time.monotonic() of the sample)}
+        self.previous_cpu_times = None
+        self.tasks = []
+
+    def get(self, name, default='...'):
+        """
+        :param name: metric name
+        :param default: text returned until the metric is sampled for the first time
+        :return: latest text value of the metric
+        """
+        value = self.values.get(name)
+        return default if value is None else value[0]
+
+    def age(self, name):
+        """
+        :param name: metric name
+        :return: seconds since the metric was last sampled, None if it never was
+        """
+        value = self.values.get(name)
+        return None if value is None else time.monotonic() - value[1]
+
+    def start(self):
+        """
+        Starts one sampling task per metric in the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        for name, interval in self.intervals.items():
+            self.tasks.append(loop.create_task(self._sample_forever(name, interval)))
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    async def _sample_forever(self, name, interval):
+        sampler = getattr(self, 'sample_' + name)
+        while True:
+            try:
+                value = await sampler()
+            except (OSError, ValueError, IndexError) as exc:
+                if self.get(name) != 'n/a':
+                    print('metric ' + name + ' failed: ' + repr(exc))
+                value = 'n/a'
+            self.values[name] = (value, time.monotonic())
+            await asyncio.sleep(interval)
+
+    async def sample_cpu(self):
+        """
+        :return: CPU usage since the previous sample, from /proc/stat
+        """
+        fields = [int(field) for field in read_file(PROC_STAT).split('\n', 1)[0].split()[1:]]
+        idle = fields[3] + fields[4]  # idle + iowait
+        total = sum(fields)
+        previous = self.previous_cpu_times
+        self.previous_cpu_times = (idle, total)
+        if previous is None or total == previous[1]:
+            return '...'
+        busy = 1.0 - (idle - previous[0]) / (total - previous[1])
+        return '%.1f%%' % (100.0 * busy)
+
+    async def sample_ram(self):
+        """
+        :return: percentage of used memory, from /proc/meminfo
+        """
+        info = {}
+        for line in read_file(PROC_MEMINFO).splitlines():
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0])
+        used = 1.0 - info['MemAvailable'] / info['MemTotal']
+        return '%.1f%% used' % (100.0 * used)
+
+    async def sample_temperature(self):
+        """
+        :return: SoC temperature, formatted as vcgencmd does
+        """
+        return "%.1f'C" % (int(read_file(SOC_TEMPERATURE)) / 1000.0)
+
+    async def sample_signal(self):
+        """
+        :return: Wi-Fi signal level in dBm, from /proc/net/wireless
+        """
+        for line in read_file(PROC_NET_WIRELESS).splitlines()[2:]:
+            fields = line.split()
+            if fields[0].rstrip(':') == WIFI_INTERFACE:
+                return fields[3].rstrip('.') + ' dBm'
+        return 'no Wi-Fi'
+
+    async def sample_ssid(self):
+        """
+        :return: SSID of the Wi-Fi network
+        """
+        return (await run_command('iwgetid', '-r', WIFI_INTERFACE)).strip() or 'none'
+
+    async def sample_internet(self):
+        """
+        :return: 'ok' if the default gateway answers a ping, else 'error'
+        """
+        gateway = default_gateway()
+        if gateway is None:
+            return 'error'
+        process = await asyncio.create_subprocess_exec(
+            'ping', '-q', '-w', '1', '-c', '1', gateway,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        return 'ok' if await process.wait() == 0 else 'error'
+
+
+def default_gateway():
+    """
+    :return: IPv4 address of the default gateway, from /proc/net/route, or None
+    """
+    for line in read_file(PROC_NET_ROUTE).splitlines()[1:]:
+        fields = line.split()
+        if fields[1] == '00000000' and int(fields[3], 16) & 2:  # default route with RTF_GATEWAY
+            return socket.inet_ntoa(struct.pack('<L', int(fields[2], 16)))
+    return None
+
+
+async def run_command(*args):
+    """
+    Runs a command without a shell.
+    :return: its standard output
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    stdout, _ = await process.communicate()
+    return stdout.decode(errors='replace')
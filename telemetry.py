@@ -0,0 +1,129 @@
+import asyncio
+import os
+from collections import deque
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyStats:
+    """
+    Keeps the most recent latency samples, in seconds, and the count and sum of all of them.
+    """
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, latency):
+        self.samples.append(latency)
+        self.count += 1
+        self.total += latency
+
+    def percentile(self, p):
+        """
+        :param p: percentile, 0-100
+        :return: latency in seconds, None without samples
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def percentiles(self, ps):
+        """
+        :param ps: percentiles, 0-100
+        :return: list of latencies in seconds, sorting the samples once; empty without samples
+        """
+        ordered = sorted(self.samples)
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in ps] if ordered else []
+
+
+class Registry:
+    """
+    Metrics exposed in the Prometheus text format.
+    Nothing is recorded here: each metric reads a counter or a LatencyStats the instrumented
+    objects already keep, when the metrics are scraped, so the hot paths pay nothing more.
+    """
+    def __init__(self):
+        self.metrics = []  # (name, type, help, read callable or LatencyStats, labels)
+
+    def counter(self, name, help_text, read, labels=''):
+        """
+        :param name: metric name, ending with _total
+        :param help_text: description
+        :param read: callable without argument returning the count
+        :param labels: Prometheus labels of the series, e.g. 'knob="volume"'
+        """
+        self.metrics.append((name, 'counter', help_text, read, labels))
+
+    def gauge(self, name, help_text, read, labels=''):
+        """
+        :param name: metric name
+        :param help_text: description
+        :param read: callable without argument returning the current value
+        :param labels: Prometheus labels of the series
+        """
+        self.metrics.append((name, 'gauge', help_text, read, labels))
+
+    def latency(self, name, help_text, stats: LatencyStats, labels=''):
+        """
+        Exposes latency percentiles as a summary.
+        :param name: metric name, ending with _seconds
+        :param help_text: description
+        :param stats: latency samples
+        :param labels: Prometheus labels of the series, e.g. 'priority="interactive"'
+        """
+        self.metrics.append((name, 'summary', help_text, stats, labels))
+
+    def render(self):
+        """
+        :return: all the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        described = set()
+        for name, metric_type, help_text, source, labels in self.metrics:
+            if name not in described:
+                described.add(name)
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s %s' % (name, metric_type))
+            suffix = '{%s}' % labels if labels else ''
+            if metric_type != 'summary':
+                lines.append('%s%s %s' % (name, suffix, source()))
+                continue
+            separator = ',' if labels else ''
+            for quantile, value in zip(QUANTILES, source.percentiles([100 * q for q in QUANTILES])):
+                lines.append('%s{%s%squantile="%s"} %.6f' % (name, labels, separator, quantile, value))
+            lines.append('%s_sum%s %.6f' % (name, suffix, source.total))
+            lines.append('%s_count%s %d' % (name, suffix, source.count))
+        return '\n'.join(lines) + '\n'
+
+
+async def serve(registry: Registry, port=None, path=None):
+    """
+    Starts a minimal HTTP server answering GET /metrics, e.g. for
+    curl localhost:<port>/metrics or curl --unix-socket <path> localhost/metrics.
+    :param registry: metrics to expose
+    :param port: TCP port, bound to the loopback interface only
+    :param path: Unix socket path, used instead of a TCP port if given
+    :return: asyncio server
+    """
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5.0)
+            if request.split(b' ', 2)[1:2] == [b'/metrics']:
+                status, body = '200 OK', registry.render().encode()
+            else:
+                status, body = '404 Not Found', b'metrics are served at /metrics\n'
+            writer.write(('HTTP/1.0 %s\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                          'Content-Length: %d\r\n\r\n' % (status, len(body))).encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if path is not None:
+        if os.path.exists(path):
+            os.unlink(path)
+        return await asyncio.start_unix_server(handle, path=path)
+    return await asyncio.start_server(handle, host='127.0.0.1', port=port)
@@ -0,0 +1,138 @@
+"""
+Binary protocol negotiation and connection losses of the Arduino link: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arduino_link  # noqa: E402
+import arduino_protocol as protocol  # noqa: E402
+from arduino_link import ArduinoLink  # noqa: E402
+from drawbars_state import DrawbarsState  # noqa: E402
+
+
+class FakeSerial:
+    @property
+    def rts(self):
+        return False
+
+    @rts.setter
+    def rts(self, value):
+        raise OSError(25, 'Inappropriate ioctl for device')  # as on a pseudo-terminal
+
+
+class FakeTransport:
+    def __init__(self):
+        self.serial = FakeSerial()
+        self.written = bytearray()
+
+    def write(self, data):
+        self.written += data
+
+    def get_write_buffer_size(self):
+        return 0
+
+
+class NegotiationTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.state = DrawbarsState()
+        self.link = ArduinoLink(self.state, self.loop)
+        self.transport = FakeTransport()
+        self.link.connection_made(self.transport)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_hello_sent(self):
+        self.assertTrue(self.transport.written.startswith(protocol.hello_line()))
+        self.assertTrue(self.link.negotiating)
+
+    def test_acknowledgement_split_across_reads(self):
+        ack = protocol.encode_frame(protocol.HELLO_ACK, bytes((protocol.PROTOCOL_VERSION,)))
+        self.link.data_received(b'72 100\n' + ack[:2])
+        self.link.data_received(ack[2:])
+        self.assertTrue(self.link.binary)
+        self.assertFalse(self.link.negotiating)
+        self.assertEqual(self.state.registration()[2], 100)
+        self.link.data_received(protocol.encode_frame(protocol.DRAWBARS, bytes((3, 64))))
+        self.assertEqual(self.state.registration()[3], 64)
+
+    def test_text_kept_after_timeout(self):
+        self.link.data_received(bytes((protocol.FRAME_START,)))
+        self.link._negotiation_timeout()
+        self.assertFalse(self.link.binary)
+        self.link.data_received(b'72 90\n')
+        self.assertEqual(self.state.registration()[2], 90)
+
+    @mock.patch.object(arduino_link, 'HELLO_INTERVAL', 0.05)
+    @mock.patch.object(arduino_link, 'NEGOTIATION_TIMEOUT', 0.2)
+    def test_reconnection_during_negotiation(self):
+        link = ArduinoLink(DrawbarsState(), self.loop)
+        link.connection_made(FakeTransport())
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        link.connection_lost(None)
+        transport = FakeTransport()
+        link.connection_made(transport)
+        # past the deadline of the first connection, before the one of the second
+        self.loop.run_until_complete(asyncio.sleep(0.15))
+        self.assertTrue(link.negotiating)
+        self.assertLessEqual(transport.written.count(protocol.hello_line()), 4)
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertFalse(link.negotiating)
+
+
+class ConnectionLostTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.link = ArduinoLink(DrawbarsState(), self.loop)
+        self.losses = []
+        self.link.on_lost = self.losses.append
+        self.link.connection_made(FakeTransport())
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_loop_kept_running(self):
+        error = OSError(5, 'Input/output error')
+        self.loop.call_soon(self.link.connection_lost, error)
+        self.loop.run_until_complete(asyncio.sleep(0.01))  # raises if the loop stops first
+        self.assertIsNone(self.link.transport)
+        self.assertEqual(self.losses, [error])
+
+    def test_commands_sent_after_reconnection(self):
+        self.link.connection_lost(None)
+        self.link._enqueue(b'L\n')
+        self.assertEqual(list(self.link.outgoing), [b'L\n'])
+        transport = FakeTransport()
+        self.link.connection_made(transport)
+        self.assertTrue(self.link.negotiating)
+        self.assertTrue(transport.written.endswith(b'L\n'))
+        self.assertFalse(self.link.outgoing)
+
+    def test_reconnection_negotiates_from_clean_state(self):
+        ack = protocol.encode_frame(protocol.HELLO_ACK, bytes((protocol.PROTOCOL_VERSION,)))
+        self.link.data_received(ack)
+        self.assertTrue(self.link.binary)
+        self.link.data_received(protocol.encode_frame(protocol.DRAWBARS, bytes((3, 64)))[:3])  # partial frame
+        self.link.connection_lost(OSError(5, 'Input/output error'))
+        self.assertFalse(self.link.binary)
+        self.assertFalse(self.link.decoder.buf)
+        transport = FakeTransport()
+        self.link.connection_made(transport)
+        self.assertTrue(self.link.negotiating)
+        self.assertFalse(self.link.binary)
+        self.assertTrue(transport.written.startswith(protocol.hello_line()))
+        self.link.data_received(b'72 100\n')  # text until the new acknowledgement
+        self.assertEqual(self.link.state.registration()[2], 100)
+        self.link.data_received(ack)
+        self.assertTrue(self.link.binary)
+        self.assertFalse(self.link.negotiating)
+
+
+if __name__ == '__main__':
+    unittest.main()
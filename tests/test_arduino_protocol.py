@@ -0,0 +1,55 @@
+"""
+Frame decoding of the Arduino binary protocol: python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arduino_protocol as protocol  # noqa: E402
+
+FRAME = protocol.encode_frame(protocol.DRAWBARS, bytes((2, 100)))
+
+
+class FrameDecoderTest(unittest.TestCase):
+    def setUp(self):
+        self.frames = []
+        self.decoder = protocol.FrameDecoder(
+            lambda frame_type, payload: self.frames.append((frame_type, bytes(payload))))
+
+    def test_frame(self):
+        self.decoder.feed(b'noise' + FRAME)
+        self.assertEqual(self.frames, [(protocol.DRAWBARS, bytes((2, 100)))])
+        self.assertEqual(self.decoder.errors, 0)
+        self.assertFalse(self.decoder.buf)
+
+    def test_bad_crc(self):
+        self.decoder.feed(FRAME[:-1] + bytes((FRAME[-1] ^ 0xFF,)))
+        self.assertEqual(self.frames, [])
+        self.assertEqual(self.decoder.errors, 1)
+
+    def test_oversized_length(self):
+        self.decoder.feed(bytes((protocol.FRAME_START, protocol.MAX_PAYLOAD + 1, protocol.DRAWBARS, 0)))
+        self.assertEqual(self.frames, [])
+        self.assertEqual(self.decoder.errors, 1)
+
+    def test_resync_on_next_start_byte(self):
+        # a truncated frame: its length swallows the start of the next one, whose CRC then fails
+        self.decoder.feed(FRAME[:3] + FRAME + FRAME)
+        self.assertEqual(self.frames, [(protocol.DRAWBARS, bytes((2, 100)))] * 2)
+        self.assertEqual(self.decoder.errors, 1)
+
+    def test_frame_split_across_reads(self):
+        for i in range(len(FRAME)):
+            self.decoder.feed(FRAME[i:i + 1])
+        self.assertEqual(self.frames, [(protocol.DRAWBARS, bytes((2, 100)))])
+
+    def test_encoded_command(self):
+        self.assertEqual(protocol.encode_command(False, protocol.REGISTRATION, 2), b'2\n')
+        self.assertEqual(protocol.encode_command(True, protocol.REGISTRATION, 2),
+                         protocol.encode_frame(protocol.REGISTRATION, b'\x02'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Drawbar ADC noise filter: python3 -m unittest discover tests
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbar_filter import DrawbarFilter  # noqa: E402
+from drawbars_state import MIDI_MAX  # noqa: E402
+
+
+class DrawbarFilterTest(unittest.TestCase):
+    def test_idle_noise_filtered(self):
+        noise = random.Random(1)
+        drawbar_filter = DrawbarFilter()
+        emitted = [drawbar_filter.feed(2, 64 + noise.randint(-2, 2)) for _ in range(1000)]
+        self.assertIsNotNone(emitted[0])
+        self.assertEqual([value for value in emitted[1:] if value is not None], [])
+
+    def test_ends_reachable(self):
+        drawbar_filter = DrawbarFilter()
+        values = [drawbar_filter.feed(0, value) for value in range(60, MIDI_MAX + 1)]
+        self.assertEqual([value for value in values if value is not None][-1], MIDI_MAX)
+        values = [drawbar_filter.feed(0, value) for value in range(MIDI_MAX, -1, -1)]
+        self.assertEqual([value for value in values if value is not None][-1], 0)
+
+    def test_end_within_deadband(self):
+        drawbar_filter = DrawbarFilter(smoothing=False)
+        self.assertEqual(drawbar_filter.feed(0, MIDI_MAX - 1), MIDI_MAX - 1)
+        self.assertEqual(drawbar_filter.feed(0, MIDI_MAX), MIDI_MAX)
+
+    def test_quantize_hysteresis(self):
+        drawbar_filter = DrawbarFilter(smoothing=False, quantize=True, hysteresis=0.2)
+        self.assertEqual(drawbar_filter.feed(0, 64), 64)  # position 4
+        self.assertIsNone(drawbar_filter.feed(0, 73))  # position 4.6: past the boundary, within the margin
+        self.assertEqual(drawbar_filter.feed(0, 76), 79)  # position 4.79: position 5
+        self.assertIsNone(drawbar_filter.feed(0, 73))  # back to 4.6: stays on position 5
+        self.assertEqual(drawbar_filter.feed(0, 67), 64)  # position 4.22
+
+    def test_reset(self):
+        drawbar_filter = DrawbarFilter()
+        drawbar_filter.feed(0, 64)
+        drawbar_filter.reset()
+        self.assertEqual(drawbar_filter.feed(0, 65), 65)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Drawbar lines framing in the serial reader: python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbars_pos_reader import DrawbarsAsyncReader, MAX_LINE_LENGTH  # noqa: E402
+from drawbars_state import DrawbarsState  # noqa: E402
+
+
+class DrawbarsAsyncReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.state = DrawbarsState()
+        self.changes = []
+        self.state.subscribe(lambda registration, drawbar, value: self.changes.append((drawbar, value)))
+        self.reader = DrawbarsAsyncReader(self.state)
+
+    def test_line_split_across_chunks(self):
+        for chunk in (b'7', b'2 1', b'00\n74 ', b'3\n7'):
+            self.reader.data_received(chunk)
+        self.assertEqual(self.changes, [(2, 100), (4, 3)])
+        self.assertEqual(bytes(self.reader.buf), b'7')
+
+    def test_overlong_line_resync(self):
+        garbage = b'x' * (MAX_LINE_LENGTH + 8)
+        self.reader.data_received(garbage)
+        self.assertTrue(self.reader.resync)
+        self.reader.data_received(b'72 5')  # end of the overlong line: skipped, not parsed
+        self.reader.data_received(b'0\n73 60\n')
+        self.assertEqual(self.changes, [(3, 60)])
+        self.assertFalse(self.reader.resync)
+        self.assertEqual(self.reader.garbage_bytes, len(garbage) + len(b'72 50'))
+
+    def test_overlong_line_with_newline(self):
+        self.reader.data_received(b'9' * (MAX_LINE_LENGTH + 1) + b'\n72 1\n')
+        self.assertEqual(self.changes, [(2, 1)])
+        self.assertEqual(self.reader.garbage_bytes, MAX_LINE_LENGTH + 1)
+
+    def test_crlf_endings(self):
+        self.reader.data_received(b'72 100\r\n73 20\r')
+        self.reader.data_received(b'\n')
+        self.assertEqual(self.changes, [(2, 100), (3, 20)])
+        self.assertEqual(self.reader.garbage_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
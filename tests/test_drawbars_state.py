@@ -0,0 +1,41 @@
+"""
+Arduino drawbar lines parsing and drawbars state: python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbars_state import DrawbarsState, parse_drawbar_line, DRAWBAR_CC_FIRST, DRAWBAR_CC_LAST  # noqa: E402
+
+
+class ParseDrawbarLineTest(unittest.TestCase):
+    def test_drawbar_cc(self):
+        self.assertEqual(parse_drawbar_line(b'72 127'), (2, 127))
+        self.assertEqual(parse_drawbar_line(bytearray(b' 70\t0 ')), (0, 0))
+        self.assertEqual(parse_drawbar_line(b'78 64\r'), (8, 64))
+
+    def test_not_drawbar_cc(self):
+        for line in (b'', b'72', b'72 100 5', b'72 1x0', b'72 -1', b'72 128',
+                     b'%d 10' % (DRAWBAR_CC_FIRST - 1), b'%d 10' % (DRAWBAR_CC_LAST + 1)):
+            self.assertIsNone(parse_drawbar_line(line), line)
+
+
+class DrawbarsStateTest(unittest.TestCase):
+    def test_changes_notified_once(self):
+        state = DrawbarsState()
+        changes = []
+        state.subscribe(lambda *change: changes.append(change))
+        self.assertTrue(state.feed_line(b'72 100'))
+        self.assertFalse(state.feed_line(b'72 100'))
+        self.assertFalse(state.feed_line(b'garbage'))
+        state.select_registration(1)
+        self.assertTrue(state.feed_line(b'72 100'))
+        self.assertEqual(changes, [(0, 2, 100), (1, 2, 100)])
+        self.assertEqual(state.take_dirty(), (1 << 2) | (1 << 11))
+        self.assertEqual(state.take_dirty(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Rotary encoder detents coalescing and acceleration: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoder_input import EncoderAccumulator  # noqa: E402
+
+
+class FakeRotary:
+    when_rotated_clockwise = None
+    when_rotated_counter_clockwise = None
+
+
+class EncoderAccumulatorTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.rotary = FakeRotary()
+        self.deltas = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def accumulator(self, **kwargs):
+        return EncoderAccumulator(self.rotary, self.deltas.append, self.loop, frame=0.01, **kwargs)
+
+    def test_frame_detents_coalesced(self):
+        accumulator = self.accumulator(threshold=1000.0)
+        for _ in range(5):
+            self.rotary.when_rotated_clockwise()
+        self.rotary.when_rotated_counter_clockwise()
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(self.deltas, [4])
+        self.assertEqual((accumulator.detents, accumulator.frames), (6, 1))
+
+    def test_acceleration_capped(self):
+        accumulator = self.accumulator(threshold=100.0, max_factor=3.0)
+        self.assertEqual(accumulator.accelerate(1), 1)  # 100 detents per second: not accelerated
+        self.assertEqual(accumulator.accelerate(2), 4)  # twice the threshold
+        self.assertEqual(accumulator.accelerate(-2), -4)
+        self.assertEqual(accumulator.accelerate(10), 30)  # 10 times the threshold, capped
+        for _ in range(10):
+            self.rotary.when_rotated_clockwise()
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(self.deltas, [30])
+
+    def test_menu_never_scaled(self):
+        accumulator = self.accumulator(threshold=1.0, max_factor=1)
+        for delta in (1, 5, -20, 100):
+            self.assertEqual(accumulator.accelerate(delta), delta)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Input event traces, recorded then read back and replayed: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arduino_protocol as protocol  # noqa: E402
+import event_trace  # noqa: E402
+from arduino_link import ArduinoLink  # noqa: E402
+from drawbars_state import DrawbarsState  # noqa: E402
+from event_trace import TraceRecorder, read_trace, replay, START, SERIAL, DETENTS, BUTTON  # noqa: E402
+
+LONG_WAIT = 5000.0  # seconds, more than a record delta holds: written with a WAIT record
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'panel.trace')
+
+    def record_session(self, times, events):
+        """
+        :param times: time.monotonic() values: at creation, then at each event
+        :param events: callables taking the recorder
+        """
+        with mock.patch.object(event_trace.time, 'monotonic', side_effect=times):
+            recorder = TraceRecorder(self.path)
+            for event in events:
+                event(recorder)
+            recorder.close()
+
+    def test_round_trip(self):
+        self.record_session([100.0, 100.0, 100.5, 100.5 + LONG_WAIT], [
+            lambda recorder: recorder.serial(b'72 100\n'),
+            lambda recorder: recorder.detents('volume', -3),
+        ])
+        self.record_session([7.0, 7.0, 7.25], [lambda recorder: recorder.button('menu_push')])
+        events = read_trace(self.path)
+        self.assertEqual([(elapsed, event_type) for elapsed, event_type, _ in events], [
+            (0.0, START), (0.5, SERIAL), (0.5 + LONG_WAIT, DETENTS),  # the WAIT record is folded in
+            (0.0, START), (0.25, BUTTON),
+        ])
+        self.assertEqual(events[1][2], b'72 100\n')
+        self.assertEqual(event_trace.DETENTS_PAYLOAD.unpack(events[2][2]), (event_trace.INPUTS.index('volume'), -3))
+        self.assertEqual(events[4][2], bytes((event_trace.INPUTS.index('menu_push'),)))
+
+    def test_long_serial_chunk_split(self):
+        self.record_session([0.0, 0.0, 0.0, 0.0], [lambda recorder: recorder.serial(bytes(300))])
+        events = read_trace(self.path)
+        self.assertEqual([len(payload) for _, event_type, payload in events if event_type == SERIAL],
+                         [event_trace.MAX_PAYLOAD, 300 - event_trace.MAX_PAYLOAD])
+
+    def test_not_a_trace(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'something else')
+        with self.assertRaises(ValueError):
+            read_trace(self.path)
+
+    def test_replay(self):
+        self.record_session([0.0, 0.0, 0.1, 0.2, 0.3], [
+            lambda recorder: recorder.serial(b'72 100\n'),
+            lambda recorder: recorder.detents('reverb', 2),
+            lambda recorder: recorder.button('power_held'),  # no handler: skipped
+        ])
+        fed = []
+
+        async def reverb(detents):
+            fed.append(('reverb', detents))
+
+        loop = asyncio.new_event_loop()
+        try:
+            result = loop.run_until_complete(replay(read_trace(self.path), {
+                'serial': lambda data: fed.append(('serial', data)), 'reverb': reverb}, realtime=False))
+            loop.run_until_complete(asyncio.sleep(0))
+        finally:
+            loop.close()
+        self.assertEqual(result['events'], 2)
+        self.assertEqual(fed, [('serial', b'72 100\n'), ('reverb', 2)])
+
+    def test_replay_binary_handshake(self):
+        ack = protocol.encode_frame(protocol.HELLO_ACK, bytes((protocol.PROTOCOL_VERSION,)))
+        self.record_session([0.0, 0.0, 0.1, 0.2], [
+            lambda recorder: recorder.serial(b'72 100\n' + ack),
+            lambda recorder: recorder.serial(protocol.encode_frame(protocol.DRAWBARS, bytes((3, 64)))),
+        ])
+        loop = asyncio.new_event_loop()
+        state = DrawbarsState()
+        link = ArduinoLink(state, loop)
+        link.negotiating = True  # as the panel does on replay, without a serial connection nor proposals
+        try:
+            result = loop.run_until_complete(replay(read_trace(self.path), {'serial': link.data_received},
+                                                    realtime=False))
+        finally:
+            loop.close()
+        self.assertEqual(result['events'], 2)
+        self.assertTrue(link.binary)
+        self.assertEqual(state.registration()[2:4].tolist(), [100, 64])
+
+
+if __name__ == '__main__':
+    unittest.main()
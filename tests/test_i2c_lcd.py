@@ -0,0 +1,84 @@
+"""
+LCD block writes and their fallback to byte writes: python3 -m unittest discover tests
+"""
+import errno
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from i2c_lcd import Lcd  # noqa: E402
+from simulation import SimulatedSMBus  # noqa: E402
+
+TEXT = 'Hammond B3 Clone'
+
+
+class FailingSMBus(SimulatedSMBus):
+    """
+    Simulated bus whose block writes raise error, if set, before anything is transferred.
+    """
+    def __init__(self):
+        super().__init__()
+        self.error = None
+        self.block_attempts = 0
+
+    def write_i2c_block_data(self, addr, control, data):
+        self.block_attempts += 1
+        if self.error is not None:
+            raise self.error
+        super().write_i2c_block_data(addr, control, data)
+
+
+class BlockWriteFallbackTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.bus = FailingSMBus()
+        cls.lcd = Lcd(bus=cls.bus, addr=0x3c)  # the init sequence waits for the controller: done once
+
+    def setUp(self):
+        self.lcd.clear()
+        self.lcd.block_write_supported = True
+        self.bus.error = None
+        self.bus.reset_counters()
+        self.bus.block_attempts = 0
+
+    def test_block_write(self):
+        self.lcd.print_at(1, 0, TEXT)
+        self.assertEqual(self.bus.row(1), TEXT.encode())
+        self.assertEqual(self.bus.transactions, 1)
+
+    def assert_byte_writes(self):
+        self.lcd.print_at(1, 0, TEXT)
+        self.assertEqual(self.bus.row(1), TEXT.encode())
+        # the DDRAM address command, then one transaction per character
+        self.assertEqual(self.bus.transactions, 1 + len(TEXT))
+        self.assertEqual(self.bus.commands, 1)
+
+    def test_not_implemented_turns_block_writes_off(self):
+        self.bus.error = NotImplementedError()
+        self.assert_byte_writes()
+        self.assertFalse(self.lcd.block_write_supported)
+        self.lcd.print_at(0, 0, TEXT)
+        self.assertEqual(self.bus.block_attempts, 1)
+
+    def test_unsupported_adapter_turns_block_writes_off(self):
+        for code in (errno.EOPNOTSUPP, errno.EINVAL):
+            self.setUp()
+            self.bus.error = OSError(code, os.strerror(code))
+            self.assert_byte_writes()
+            self.assertFalse(self.lcd.block_write_supported)
+
+    def test_transient_error_keeps_block_writes(self):
+        self.bus.error = OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))  # e.g. a NACK
+        self.assert_byte_writes()
+        self.assertTrue(self.lcd.block_write_supported)
+        self.bus.error = None
+        self.bus.reset_counters()
+        self.lcd.print_at(0, 0, TEXT)
+        self.assertEqual(self.bus.row(0), TEXT.encode())
+        self.assertEqual(self.bus.transactions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+LCD frame buffer dirty runs and flushes: python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from i2c_lcd import Lcd  # noqa: E402
+from lcd_framebuffer import LcdFrameBuffer, MERGE_GAP  # noqa: E402
+from simulation import SimulatedSMBus  # noqa: E402
+
+
+class FrameBufferTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.bus = SimulatedSMBus()
+        cls.lcd = Lcd(bus=cls.bus, addr=0x3c)  # the init sequence waits for the controller: done once
+
+    def setUp(self):
+        self.lcd.clear()
+        self.screen = LcdFrameBuffer(self.lcd)
+        self.screen.write_line(0, 'Volume')
+        self.screen.write_line(1, 'Reverb')
+        self.screen.flush()
+        self.bus.reset_counters()
+
+    def test_unchanged_screen(self):
+        self.screen.write_line(0, 'Volume')
+        self.assertEqual(self.screen.flush(), 0)
+        self.assertEqual(self.bus.transactions, 0)
+
+    def test_one_cell_change(self):
+        self.screen.write(1, 3, 'X')
+        self.assertEqual(self.screen.dirty_runs(1), [(3, 4)])
+        self.assertEqual(self.screen.flush(), 1)
+        self.assertEqual(self.bus.transactions, 1)
+        self.assertEqual(self.bus.row(1), b'RevXrb'.ljust(16))
+
+    def test_close_runs_merged(self):
+        self.screen.write(0, 0, 'A')
+        self.screen.write(0, 1 + MERGE_GAP, 'B')
+        self.assertEqual(self.screen.dirty_runs(0), [(0, 2 + MERGE_GAP)])
+
+    def test_distant_runs_kept_apart(self):
+        self.screen.write(0, 0, 'A')
+        self.screen.write(0, 2 + MERGE_GAP, 'B')
+        self.assertEqual(self.screen.dirty_runs(0), [(0, 1), (2 + MERGE_GAP, 3 + MERGE_GAP)])
+        self.assertEqual(self.screen.flush(), 2)
+        self.assertEqual(self.bus.transactions, 2)
+
+    def test_invalidate_rewrites_everything(self):
+        self.screen.invalidate()
+        self.assertEqual(self.screen.dirty_runs(0), [(0, 16)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+LCD writer thread priorities, coalescing and queue bound: python3 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lcd_writer import LcdWriter, INTERACTIVE, BACKGROUND  # noqa: E402
+
+
+class FakeScreen:
+    def __init__(self):
+        self.drawn = []
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+def drawing(name):
+    return lambda screen: screen.drawn.append(name)
+
+
+class LcdWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.screen = FakeScreen()
+        self.writer = LcdWriter(self.screen, max_pending=4)
+
+    def test_interactive_served_first(self):
+        # queued before the thread starts, so that the order only depends on the priorities
+        self.writer.submit(drawing('status'), BACKGROUND)
+        self.writer.submit(drawing('volume'), INTERACTIVE)
+        self.writer.submit(drawing('clock'), BACKGROUND)
+        self.writer.submit(drawing('menu'), INTERACTIVE)
+        self.writer.start()
+        self.writer.stop()
+        self.assertEqual(self.screen.drawn, ['volume', 'menu', 'status', 'clock'])
+        self.assertEqual(self.screen.flushes, 4)
+
+    def test_same_key_coalesced_across_priorities(self):
+        self.writer.submit(drawing('old'), BACKGROUND, key='menu', since=1.0)
+        self.writer.submit(drawing('new'), INTERACTIVE, key='menu', since=2.0)
+        self.assertEqual(self.writer.depth(), 1)
+        self.assertEqual(self.writer.coalesced, 1)
+        self.assertFalse(self.writer.pending[BACKGROUND])
+        draw, priority, since = self.writer.pending[INTERACTIVE]['menu']
+        self.assertEqual((priority, since), (INTERACTIVE, 1.0))  # latency counted from the oldest event
+        self.writer.start()
+        self.writer.stop()
+        self.assertEqual(self.screen.drawn, ['new'])
+
+    def test_oldest_background_dropped_first(self):
+        self.writer.submit(drawing('volume'), INTERACTIVE)
+        self.writer.submit(drawing('status 1'), BACKGROUND)
+        self.writer.submit(drawing('status 2'), BACKGROUND)
+        self.writer.submit(drawing('reverb'), INTERACTIVE)
+        self.writer.submit(drawing('menu'), INTERACTIVE)  # beyond max_pending
+        self.assertEqual(self.writer.dropped, 1)
+        self.assertEqual(self.writer.depth(), 4)
+        self.writer.start()
+        self.writer.stop()
+        self.assertEqual(self.screen.drawn, ['volume', 'reverb', 'menu', 'status 2'])
+
+    def test_pending_drawn_on_stop(self):
+        self.writer.start()
+        with self.writer.condition:
+            # queued while the thread waits for the condition, stop() is requested before it wakes up
+            self.writer.submit(drawing('clear'), INTERACTIVE, key='menu')
+            self.writer.submit(drawing('bye'), BACKGROUND)
+            self.writer.running = False
+        self.writer.stop()
+        self.assertFalse(self.writer.is_alive())
+        self.assertEqual(self.screen.drawn, ['clear', 'bye'])
+
+
+if __name__ == '__main__':
+    unittest.main()
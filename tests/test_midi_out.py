@@ -0,0 +1,59 @@
+"""
+Drawbar changes forwarded to setBfree as MIDI CCs: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbars_state import DrawbarsState, DRAWBAR_CC_FIRST  # noqa: E402
+from midi_out import DrawbarMidiForwarder, LoopbackMidiBackend, open_midi_backend  # noqa: E402
+
+
+class DrawbarMidiForwarderTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.state = DrawbarsState()
+        self.backend = open_midi_backend('loopback')
+        self.forwarder = DrawbarMidiForwarder(self.state, self.backend, self.loop, channel=1, tick=0.005)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def sent(self):
+        return [data for _, data in self.backend.sent]
+
+    def test_loopback_backend(self):
+        self.assertIsInstance(self.backend, LoopbackMidiBackend)
+
+    def test_tick_coalesced(self):
+        for value in (10, 20, 30):
+            self.state.update(0, value)
+        self.state.update(4, 127)
+        self.state.update(5, 64, registration=1)  # not the active registration
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        # one running status burst with the latest value of each moved drawbar
+        self.assertEqual(self.sent(), [bytes((0xB1, DRAWBAR_CC_FIRST, 30, DRAWBAR_CC_FIRST + 4, 127))])
+        self.assertEqual(self.forwarder.coalesced, 2)
+        self.assertEqual(self.forwarder.sent_messages, 2)
+
+    def test_recall_sends_burst(self):
+        self.state.update(0, 10)
+        burst = bytes((0xB1, DRAWBAR_CC_FIRST, 100, DRAWBAR_CC_FIRST + 1, 90))
+        self.forwarder.recall(burst)
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertEqual(self.sent(), [burst])  # the pending change is superseded by the registration
+
+    def test_close_flushes_and_unsubscribes(self):
+        self.state.update(2, 50)
+        self.forwarder.close()
+        self.assertEqual(self.sent(), [bytes((0xB1, DRAWBAR_CC_FIRST + 2, 50))])
+        self.state.update(2, 60)
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertEqual(len(self.sent()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Registration presets file and MIDI bursts: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drawbars_state import DrawbarsState, DRAWBAR_CC_FIRST, NUM_DRAWBARS, MIDI_MAX  # noqa: E402
+from presets import PresetStore, HEADER, RECORD, PRESETS_MAGIC, PRESETS_VERSION  # noqa: E402
+
+
+class PresetStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'presets.bin')
+
+    def tearDown(self):
+        self.loop.close()
+        self.directory.cleanup()
+
+    def test_defaults_without_file(self):
+        state = DrawbarsState()
+        store = PresetStore(self.path, state, self.loop)
+        self.assertEqual(bytes(state.values), bytes(len(state.values)))
+        self.assertEqual(store.burst(1), bytes((0xB0,)) + b''.join(
+            bytes((DRAWBAR_CC_FIRST + drawbar, 0)) for drawbar in range(NUM_DRAWBARS)))
+
+    def test_saved_and_loaded(self):
+        state = DrawbarsState()
+        store = PresetStore(self.path, state, self.loop, save_delay=0.01)
+        state.update(2, 100, registration=1)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        store.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(HEADER.unpack_from(data), (PRESETS_MAGIC, PRESETS_VERSION, 2))
+        self.assertEqual(len(data), HEADER.size + 2 * RECORD.size)
+        loaded = DrawbarsState()
+        PresetStore(self.path, loaded, self.loop)
+        self.assertEqual(bytes(loaded.registration(1)), bytes((0, 0, 100, 0, 0, 0, 0, 0, 0)))
+        self.assertEqual(bytes(loaded.registration(0)), bytes(NUM_DRAWBARS))
+
+    def test_invalid_file_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(PRESETS_MAGIC, PRESETS_VERSION + 1, 2) + bytes(2 * RECORD.size))
+        state = DrawbarsState()
+        PresetStore(self.path, state, self.loop)
+        self.assertEqual(bytes(state.values), bytes(len(state.values)))
+
+    def test_wrong_size_ignored(self):
+        # records followed by 7 more bytes each, as written by an earlier layout with the same version
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(PRESETS_MAGIC, PRESETS_VERSION, 2) + bytes(16) + bytes(range(100, 109)) + bytes(7))
+        state = DrawbarsState()
+        PresetStore(self.path, state, self.loop)
+        self.assertEqual(bytes(state.values), bytes(len(state.values)))
+
+    def test_out_of_range_value_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(PRESETS_MAGIC, PRESETS_VERSION, 2) + bytes(RECORD.size) + bytes((MIDI_MAX + 1,) * 9))
+        state = DrawbarsState()
+        store = PresetStore(self.path, state, self.loop)
+        self.assertEqual(bytes(state.values), bytes(len(state.values)))
+        self.assertTrue(all(byte < 0x80 for byte in store.burst(1)[1:]))
+
+    def test_burst_follows_drawbars(self):
+        state = DrawbarsState()
+        store = PresetStore(self.path, state, self.loop, channel=2)
+        state.update(8, 127, registration=0)
+        burst = store.burst(0)
+        self.assertEqual(burst[0], 0xB2)  # one running status burst on the upper manual channel
+        self.assertEqual(len(burst), 1 + 2 * NUM_DRAWBARS)
+        self.assertEqual(burst[-2:], bytes((DRAWBAR_CC_FIRST + 8, 127)))
+        self.assertEqual(store.burst(1)[-1], 0)
+        store.close()
+        self.assertTrue(os.path.exists(self.path))  # pending save written on close
+
+
+if __name__ == '__main__':
+    unittest.main()
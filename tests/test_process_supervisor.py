@@ -0,0 +1,116 @@
+"""
+CPU isolation of the panel and setBfree, and supervision of a stand-in child process:
+python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import signal
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process_supervisor  # noqa: E402
+
+PANEL_PID = 100
+SETBFREE_PID = 200
+THREADS = {PANEL_PID: (100, 101, 102), SETBFREE_PID: (200, 201)}
+
+
+class IsolationTest(unittest.TestCase):
+    def setUp(self):
+        # a 4-core computer; the scheduler calls act on a table of thread affinities
+        self.affinity = {tid: {0, 1, 2, 3} for tids in THREADS.values() for tid in tids}
+        patches = (
+            mock.patch.object(process_supervisor, 'AVAILABLE_CPUS', frozenset({0, 1, 2, 3})),
+            mock.patch('os.getpid', return_value=PANEL_PID),
+            mock.patch('os.listdir', side_effect=lambda path: [str(tid) for tid in THREADS[int(path.split('/')[2])]]),
+            mock.patch('os.sched_getaffinity', side_effect=self.get_affinity),
+            mock.patch('os.sched_setaffinity', side_effect=self.set_affinity),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get_affinity(self, tid):
+        return set(self.affinity[PANEL_PID if tid == 0 else tid])
+
+    def set_affinity(self, tid, cpus):
+        self.affinity[tid] = set(cpus)
+
+    def test_disjoint_cores(self):
+        self.assertEqual(process_supervisor.isolate(0, {0}), [])
+        # setBfree is forked by the isolated panel and inherits its core
+        for tid in THREADS[SETBFREE_PID]:
+            self.affinity[tid] = {0}
+        self.assertEqual(process_supervisor.isolate(SETBFREE_PID, {1, 2, 3}), [])
+        for tid in THREADS[PANEL_PID]:
+            self.assertEqual(self.affinity[tid], {0})
+        for tid in THREADS[SETBFREE_PID]:
+            self.assertEqual(self.affinity[tid], {1, 2, 3})
+
+    def test_missing_cpus_ignored(self):
+        process_supervisor.isolate(SETBFREE_PID, {2, 3, 4, 5})
+        self.assertEqual(self.affinity[200], {2, 3})
+
+    def test_no_cpu_left(self):
+        process_supervisor.isolate(SETBFREE_PID, {6, 7})
+        self.assertEqual(self.affinity[200], {0, 1, 2, 3})
+
+
+class SupervisorTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def supervisor(self, command):
+        supervisor = process_supervisor.ProcessSupervisor(command, self.loop, check_interval=0.05, restart_delay=0.05,
+                                                          max_restart_delay=0.2)
+        supervisor.start()
+        self.addCleanup(lambda: self.loop.run_until_complete(supervisor.stop()))
+        return supervisor
+
+    def wait_for(self, condition, timeout=5.0):
+        async def poll():
+            deadline = self.loop.time() + timeout
+            while not condition():
+                self.assertLess(self.loop.time(), deadline, 'timed out')
+                await asyncio.sleep(0.01)
+        self.loop.run_until_complete(poll())
+
+    def test_failing_child_restarted_with_backoff(self):
+        delays = []
+        sleep = asyncio.sleep
+
+        def recording_sleep(delay, *args):
+            delays.append(delay)
+            return sleep(delay, *args)
+
+        with mock.patch.object(process_supervisor.asyncio, 'sleep', recording_sleep):
+            supervisor = self.supervisor(['sh', '-c', 'exit 3'])
+            self.wait_for(lambda: supervisor.restarts >= 4)
+        # the test's own polling sleeps are 0.01 s long
+        self.assertEqual([delay for delay in delays if delay != 0.01][:4], [0.05, 0.1, 0.2, 0.2])
+
+    def test_stopped_child_killed(self):
+        supervisor = self.supervisor(['sleep', '30'])
+        self.wait_for(lambda: supervisor.process is not None)
+        stopped = supervisor.process
+        os.kill(stopped.pid, signal.SIGSTOP)
+        self.wait_for(lambda: stopped.returncode is not None)
+        self.assertEqual(stopped.returncode, -signal.SIGKILL)
+        self.wait_for(lambda: supervisor.process is not stopped)  # restarted
+
+    def test_stop_terminates_child(self):
+        supervisor = self.supervisor(['sleep', '30'])
+        self.wait_for(lambda: supervisor.process is not None)
+        self.loop.run_until_complete(supervisor.stop())
+        self.assertEqual(supervisor.process.returncode, -signal.SIGTERM)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(supervisor.task.done())
+        self.assertEqual(supervisor.restarts, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+setBfree configuration and program bank catalog: python3 -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from setbfree_catalog import SetBfreeCatalog, parse_config, parse_programs  # noqa: E402
+
+CONFIG = """# setBfree configuration
+osc.tuning=440
+osc.temperament = gear60   # comment
+whirl.horn.brakepos=0.0
+midi.upper.channel=1
+"""
+
+PROGRAMS = """# program bank
+1 { name="Jazz", drawbars="88 8000 000", vibrato=c3, perc=on }
+2 { name = "Rock"
+    vibrato=v1 perc=off rotaryspeed=fast }
+"""
+
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.config = os.path.join(directory.name, 'default.cfg')
+        self.programs = os.path.join(directory.name, 'default.pgm')
+        self.cache = os.path.join(directory.name, 'catalog.cache')
+        with open(self.config, 'w') as f:
+            f.write(CONFIG)
+        with open(self.programs, 'w') as f:
+            f.write(PROGRAMS)
+
+    def catalog(self):
+        catalog = SetBfreeCatalog(self.config, self.programs, self.cache)
+        catalog.load()
+        return catalog
+
+    def test_parse(self):
+        self.assertEqual(parse_config(self.config), {
+            'osc.tuning': '440', 'osc.temperament': 'gear60', 'whirl.horn.brakepos': '0.0', 'midi.upper.channel': '1'})
+        self.assertEqual(parse_programs(self.programs), [
+            (1, 'Jazz', {'drawbars': '88 8000 000', 'vibrato': 'c3', 'perc': 'on'}),
+            (2, 'Rock', {'vibrato': 'v1', 'perc': 'off', 'rotaryspeed': 'fast'}),
+        ])
+
+    def test_categories(self):
+        catalog = self.catalog()
+        self.assertFalse(catalog.from_cache)
+        self.assertEqual([key for key, _, _ in catalog.categories['Tuning']], ['osc.temperament', 'osc.tuning'])
+        self.assertEqual(catalog.categories['Leslie'], [
+            ('rotaryspeed', 'rotaryspeed', 'stop|slow|fast'), ('whirl.horn.brakepos', 'horn.brakepos', '0.0')])
+        self.assertEqual(catalog.categories['Analog Model'], [])
+        self.assertEqual(catalog.value('vibrato'), 'v1|v2|v3|c1|c2|c')
+        self.assertEqual(catalog.value('midi.upper.channel'), 'not set')  # in no category
+
+    def test_cache(self):
+        self.catalog()
+        cached = self.catalog()
+        self.assertTrue(cached.from_cache)
+        self.assertEqual(cached.categories['Tuning'][1], ('osc.tuning', 'tuning', '440'))
+        with open(self.config, 'a') as f:
+            f.write('osc.tuning=442\n')
+        changed = self.catalog()
+        self.assertFalse(changed.from_cache)
+        self.assertEqual(changed.value('osc.tuning'), '442')
+        self.assertTrue(self.catalog().from_cache)
+
+    def test_modification_time_invalidates_cache(self):
+        self.catalog()
+        stat = os.stat(self.programs)
+        os.utime(self.programs, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))  # touched, same size
+        self.assertFalse(self.catalog().from_cache)
+
+    def test_missing_files(self):
+        catalog = SetBfreeCatalog(self.config + '.missing', self.programs + '.missing', self.cache)
+        catalog.load()
+        self.assertEqual(catalog.categories['Tuning'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Rate-limited volume and reverb control of setBfree: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from midi_out import LoopbackMidiBackend  # noqa: E402
+from setbfree_control import SetBfreeControl, VOLUME_CC, REVERB_CC  # noqa: E402
+
+
+class SetBfreeControlTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.backend = LoopbackMidiBackend()
+        self.control = SetBfreeControl(self.backend, self.loop, tick=0.002, max_step=8)
+
+    def tearDown(self):
+        self.control.close()
+        self.loop.close()
+
+    def run_for(self, seconds):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def values(self, controller):
+        """
+        :return: values sent for a controller, in order
+        """
+        values = []
+        for _, burst in self.backend.sent:
+            self.assertEqual(burst[0], 0xB0)
+            values += [burst[i + 1] for i in range(1, len(burst), 2) if burst[i] == controller]
+        return values
+
+    def test_fast_spin_bounded(self):
+        self.control.set('volume', 0, 100)
+        self.run_for(0.01)
+        for value in range(1, 101):  # a whole turn of the knob within a tick
+            self.control.set('volume', value, 100)
+        self.run_for(0.2)
+        values = self.values(VOLUME_CC)
+        self.assertEqual(values[0], 0)
+        self.assertEqual(values[-1], 127)
+        self.assertLessEqual(len(values), 1 + -(-127 // 8))
+        self.assertTrue(all(abs(b - a) <= 8 for a, b in zip(values, values[1:])))
+        self.assertEqual(self.values(REVERB_CC), [0])  # unknown until then: sent once with the first tick
+        self.assertEqual(self.control.sent_messages, len(values) + 1)
+        self.assertGreater(self.control.message_rate(), 0)
+
+    def test_retargeted_during_ramp(self):
+        self.control.tick = 0.02  # a whole ramp takes about 0.3 s
+        self.control.set('reverb', 0)
+        self.run_for(0.03)
+        self.control.set('reverb', 127)
+        self.run_for(0.05)  # part of the way up
+        self.control.set('reverb', 20)
+        self.run_for(0.5)
+        values = self.values(REVERB_CC)
+        self.assertEqual(values[-1], 20)
+        self.assertLess(max(values), 127)
+        self.assertTrue(all(abs(b - a) <= 8 for a, b in zip(values, values[1:])))
+
+    def test_latency_sampled_per_request(self):
+        self.control.set('volume', 10)
+        self.control.set('reverb', 10)
+        self.run_for(0.01)
+        self.assertEqual(len(self.backend.sent), 1)  # both parameters in one burst
+        self.control.set('volume', 10)  # already sent: nothing to do
+        self.run_for(0.01)
+        self.assertEqual(len(self.backend.sent), 1)
+        self.assertEqual(self.control.latency.count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+State bus messages and subscriber sequencing: python3 -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import state_bus  # noqa: E402
+
+SESSION = 0x12345678
+
+
+class FakeTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append(state_bus.decode(data))
+
+
+class EncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        entries = [(state_bus.VOLUME, 20), (state_bus.drawbar_key(1, 8), 127)]
+        data = state_bus.encode(state_bus.DELTA, SESSION, 7, 1234.5, entries)
+        self.assertEqual(state_bus.decode(data), (state_bus.DELTA, SESSION, 7, 1234.5, entries))
+
+    def test_invalid_datagrams(self):
+        data = state_bus.encode(state_bus.SNAPSHOT, SESSION, 0, 0.0, [(state_bus.REVERB, 3)])
+        self.assertIsNone(state_bus.decode(data[:-1]))
+        self.assertIsNone(state_bus.decode(b'XX' + data[2:]))
+        self.assertIsNone(state_bus.decode(b''))
+
+
+class SubscriberTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.changes = []
+        self.subscriber = state_bus.StateSubscriber(self.loop, lambda key, value: self.changes.append((key, value)))
+        self.transport = FakeTransport()
+        self.subscriber.connection_made(self.transport)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def receive(self, message_type, sequence, entries):
+        self.subscriber.datagram_received(
+            state_bus.encode(message_type, SESSION, sequence, 0.0, entries), ('127.0.0.1', state_bus.STATE_BUS_PORT))
+
+    def joins(self):
+        return [message for message in self.transport.sent if message[0] == state_bus.JOIN]
+
+    def test_deltas_applied_in_sequence(self):
+        self.receive(state_bus.SNAPSHOT, 4, [(state_bus.VOLUME, 10)])
+        self.receive(state_bus.DELTA, 5, [(state_bus.VOLUME, 11)])
+        self.receive(state_bus.DELTA, 5, [(state_bus.VOLUME, 99)])  # duplicate
+        self.assertEqual(self.changes, [(state_bus.VOLUME, 10), (state_bus.VOLUME, 11)])
+        self.assertEqual(self.subscriber.gaps, 0)
+        self.assertEqual(self.joins(), [])
+
+    def test_gap_asks_for_snapshot(self):
+        self.receive(state_bus.SNAPSHOT, 4, [(state_bus.VOLUME, 10)])
+        self.receive(state_bus.DELTA, 7, [(state_bus.REVERB, 5)])
+        self.assertEqual(self.subscriber.gaps, 1)
+        self.assertEqual(len(self.joins()), 1)
+        self.assertEqual(self.subscriber.state[state_bus.REVERB], 5)  # values are absolute
+
+    def test_delta_before_snapshot_asks_for_it(self):
+        self.receive(state_bus.DELTA, 1, [(state_bus.VOLUME, 11)])
+        self.assertEqual(self.changes, [])
+        self.assertEqual(len(self.joins()), 1)
+
+    def test_stale_snapshot_ignored(self):
+        self.receive(state_bus.SNAPSHOT, 4, [(state_bus.VOLUME, 10)])
+        self.receive(state_bus.DELTA, 5, [(state_bus.VOLUME, 11)])
+        self.receive(state_bus.SNAPSHOT, 4, [(state_bus.VOLUME, 10)])
+        self.assertEqual(self.subscriber.state[state_bus.VOLUME], 11)
+
+
+
+class PublisherTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.publisher = state_bus.StatePublisher(self.loop, batch_interval=0.001)
+        self.transport = FakeTransport()
+        self.transport.close = lambda: None
+        self.publisher.connection_made(self.transport)
+
+    def tearDown(self):
+        self.publisher.close()
+        self.loop.close()
+
+    def test_changes_batched(self):
+        self.publisher.set(state_bus.VOLUME, 10)
+        self.publisher.set(state_bus.VOLUME, 12)
+        self.publisher.set(state_bus.REVERB, 3)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual([(message[0], message[2], message[4]) for message in self.transport.sent],
+                         [(state_bus.DELTA, 1, [(state_bus.VOLUME, 12), (state_bus.REVERB, 3)])])
+
+    def test_nothing_sent_once_closed(self):
+        self.publisher.close()
+        self.publisher.set(state_bus.VOLUME, 10)
+        self.assertIsNone(self.publisher.flush_handle)
+        self.assertEqual(self.publisher.state[state_bus.VOLUME], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()